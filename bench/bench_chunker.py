@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+bench_chunker.py
+Micro-benchmark: original split/join chunk_text vs the streaming ChunkedText (ingestion/chunking.py).
+ - checks both produce identical chunks
+ - wall time (best of --repeat) and peak traced allocation (tracemalloc) for
+   a) building the full chunk list and b) streaming the chunks once (how the pipeline uses them)
+Usage:
+python bench/bench_chunker.py --mb 5 --repeat 3
+python bench/bench_chunker.py --file /path/to/extracted_policy_manual.txt
+"""
+import argparse, random, sys, time, tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from ingestion.chunking import ChunkedText
+
+CHUNK_SIZE_WORDS = 400
+CHUNK_OVERLAP = 80
+
+def chunk_text_legacy(text, chunk_size=CHUNK_SIZE_WORDS, overlap=CHUNK_OVERLAP):
+    # verbatim copy of pipeline.chunk_text before ChunkedText
+    words = text.split()
+    if not words:
+        return []
+    step = max(1, chunk_size - overlap)
+    out = []
+    for i in range(0, len(words), step):
+        chunk = " ".join(words[i:i+chunk_size])
+        if chunk.strip():
+            out.append(chunk)
+    return out
+
+def synthetic_text(mb, seed=7):
+    rnd = random.Random(seed)
+    vocab = ["USCIS", "petition", "beneficiary", "H-1B", "employer", "status", "Form", "I-129",
+             "the", "of", "and", "to", "a", "in", "nonimmigrant", "adjudication", "policy", "§"]
+    seps = [" "] * 12 + ["\n", "  ", "\n\n", "\t"]
+    parts, size = [], 0
+    while size < mb * 1024 * 1024:
+        w = rnd.choice(vocab) + rnd.choice(seps)
+        parts.append(w)
+        size += len(w)
+    return "".join(parts)
+
+def measure(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+def consume(chunks):
+    n = 0
+    for c in chunks:
+        n += len(c)
+    return n
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--file', help='text file to chunk (default: synthetic text)')
+    parser.add_argument('--mb', type=float, default=5.0, help='size of synthetic text in MB')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    text = Path(args.file).read_text(encoding="utf-8", errors="replace") if args.file else synthetic_text(args.mb)
+    print(f"Input: {len(text) / 1e6:.2f} M chars, {len(ChunkedText(text, CHUNK_SIZE_WORDS, CHUNK_OVERLAP))} chunks")
+
+    legacy = chunk_text_legacy(text)
+    chunked = list(ChunkedText(text, CHUNK_SIZE_WORDS, CHUNK_OVERLAP))
+    if legacy != chunked:
+        raise SystemExit("MISMATCH: ChunkedText output differs from legacy chunk_text")
+    print("Outputs identical: yes")
+    del legacy, chunked
+
+    cases = [
+        ("legacy  list   ", lambda: chunk_text_legacy(text)),
+        ("chunked list  ", lambda: list(ChunkedText(text, CHUNK_SIZE_WORDS, CHUNK_OVERLAP))),
+        ("legacy  stream ", lambda: consume(chunk_text_legacy(text))),
+        ("chunked stream", lambda: consume(ChunkedText(text, CHUNK_SIZE_WORDS, CHUNK_OVERLAP))),
+    ]
+    print(f"{'case':<16}{'best s':>10}{'peak MB':>12}")
+    for name, fn in cases:
+        secs, peak = measure(fn, args.repeat)
+        print(f"{name:<16}{secs:>10.3f}{peak / 1e6:>12.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+bench_html_extract.py
+Benchmark: the original BeautifulSoup(html.parser) extraction vs the streaming lxml engine
+(ingestion/html_extract.py) on a saved corpus of pages.
+ - checks both engines produce the same {"title", "text"} for every page and lists the ones that differ
+ - wall time (best of --repeat), pages/s and MB/s per engine
+Build a corpus once from real URLs (one per line), then benchmark it offline:
+python bench/bench_html_extract.py --save-urls urls.txt --corpus bench/html_corpus
+python bench/bench_html_extract.py --corpus bench/html_corpus --repeat 3
+python bench/bench_html_extract.py --synthetic 200   # no corpus: generated USCIS-like pages
+"""
+import argparse, hashlib, random, sys, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from ingestion.html_extract import ENGINES, etree, extract_html
+
+MIN_TEXT_WORDS = 20  # same as pipeline.py
+
+def save_corpus(urls_file, corpus):
+    import requests
+    corpus.mkdir(parents=True, exist_ok=True)
+    headers = {"User-Agent": "ImmigrationRAGBot/1.0 (+https://yourdomain.example)"}
+    for url in [u.strip() for u in open(urls_file) if u.strip() and not u.startswith("#")]:
+        try:
+            resp = requests.get(url, headers=headers, timeout=20)
+        except Exception as e:
+            print(f"skip {url}: {e}")
+            continue
+        if resp.status_code >= 400 or "text/html" not in resp.headers.get("Content-Type", ""):
+            print(f"skip {url}: {resp.status_code} {resp.headers.get('Content-Type')}")
+            continue
+        name = hashlib.sha1(url.encode()).hexdigest()[:16]
+        # first line keeps the URL (titles fall back to its host); the page text follows
+        (corpus / f"{name}.html").write_text(f"<!-- {url} -->\n{resp.text}", encoding="utf-8")
+    print(f"saved corpus to {corpus}")
+
+def synthetic_pages(n, seed=11):
+    rnd = random.Random(seed)
+    vocab = ["USCIS", "petition", "beneficiary", "H-1B", "employer", "status", "Form", "I-129", "the", "of",
+             "and", "to", "a", "in", "&amp;", "&nbsp;", "policy", "officer", "evidence", "visa"]
+    words = lambda k: " ".join(rnd.choice(vocab) for _ in range(k))
+    pages = []
+    for i in range(n):
+        nav = "".join(f"<li><a href='/p{j}'>{words(3)}</a></li>" for j in range(80))
+        body = "".join(f"<h2>{words(5)}</h2><p>{words(120)} <b>{words(4)}</b> {words(60)}</p>"
+                       f"<!-- section {j} --><ul>{''.join(f'<li>{words(12)}</li>' for _ in range(6))}</ul>"
+                       for j in range(rnd.randint(10, 40)))
+        scripts = "".join(f"<script>window.a{j} = {{x: '{words(30)}'}};</script>" for j in range(15))
+        pages.append((f"synthetic-{i}", f"https://www.uscis.gov/p{i}",
+                      f"<!doctype html><html><head><title>{words(6)}</title><style>.x{{color:red}}</style>{scripts}</head>"
+                      f"<body><header><nav><ul>{nav}</ul></nav></header><div class='cookie-banner'>{words(20)}</div>"
+                      f"<div class='main-content'><div class='sidebar'>{words(40)}</div>{body}</div>"
+                      f"<footer>{words(50)}</footer></body></html>"))
+    return pages
+
+def load_corpus(corpus):
+    pages = []
+    for path in sorted(list(corpus.glob("*.html")) + list(corpus.glob("*.htm"))):
+        html = path.read_text(encoding="utf-8", errors="replace")
+        first = html.split("\n", 1)[0]
+        url = first[4:-3].strip() if first.startswith("<!--") and first.endswith("-->") else "https://example.invalid/"
+        pages.append((path.name, url, html))
+    return pages
+
+def run(engine, pages, repeat):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = [extract_html(html, url, MIN_TEXT_WORDS, engine=engine) for _, url, html in pages]
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--corpus", type=Path, help="directory of saved .html pages")
+    ap.add_argument("--save-urls", help="download these URLs (one per line) into --corpus first")
+    ap.add_argument("--synthetic", type=int, default=0, help="benchmark N generated pages instead of a corpus")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+    if etree is None:
+        raise SystemExit("lxml is not installed (pip install lxml)")
+    if args.save_urls:
+        if not args.corpus:
+            raise SystemExit("--save-urls needs --corpus")
+        save_corpus(args.save_urls, args.corpus)
+    pages = load_corpus(args.corpus) if args.corpus else synthetic_pages(args.synthetic or 100)
+    if not pages:
+        raise SystemExit(f"no .html pages in {args.corpus}")
+    mb = sum(len(html.encode("utf-8")) for _, _, html in pages) / 2 ** 20
+    print(f"{len(pages)} pages, {mb:.1f} MB")
+
+    results = {}
+    for engine in ENGINES:
+        secs, out = run(engine, pages, args.repeat)
+        results[engine] = out
+        print(f"{engine:5s}: {secs:.3f}s  {len(pages) / secs:8.1f} pages/s  {mb / secs:6.2f} MB/s")
+    ref = results["bs4"]
+    diff = [name for (name, _, _), a, b in zip(pages, results["lxml"], ref) if a != b]
+    print(f"identical output: {len(pages) - len(diff)}/{len(pages)}")
+    for name in diff[:10]:
+        i = [p[0] for p in pages].index(name)
+        a, b = results["lxml"][i]["text"], ref[i]["text"]
+        at = next((k for k in range(min(len(a), len(b))) if a[k] != b[k]), min(len(a), len(b)))
+        print(f"  differs: {name} at char {at}: lxml {a[at:at + 60]!r} vs bs4 {b[at:at + 60]!r}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+bench_vector_storage.py
+Recall vs latency vs size of embedding storage formats, before (or after) scripts/migrate_embeddings.py:
+ - every --configs entry (storage:dims) gets a scratch copy of the stored vectors, shortened in SQL the
+   same way the migration does it (subvector + l2_normalize, cast to vector/halfvec), with an HNSW
+   index (--index none for exact scans)
+ - queries: the eval set's questions (embedded once, needs OPENAI_API_KEY; cached like the pipeline)
+   plus --sample stored chunks used as queries; each is shortened to the config's dimensions
+ - ground truth: exact top-k on the full-precision column (documents.embedding_full after a migration)
+Reports recall@k per query set, query latency p50/p95 (client round trip, same for every config),
+table and index size and index build time. Scratch tables (bench_vec_*) are dropped afterwards.
+Usage:
+python bench/bench_vector_storage.py --configs vector:1536,halfvec:1536,halfvec:768,halfvec:512,halfvec:256
+python bench/bench_vector_storage.py --k 20 --sample 500 --index none --out vector_storage.json
+"""
+import argparse, json, os, statistics, sys, time
+from pathlib import Path
+
+import psycopg2
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+from ingestion import vectors
+
+EMBEDDING_MODEL = "text-embedding-3-small"  # same as pipeline.py / the retriever
+
+def literal(vec):
+    return "[" + ",".join(f"{v:.7g}" for v in vec) + "]"
+
+def eval_queries(path, dims):
+    if not os.getenv("OPENAI_API_KEY"):
+        print("OPENAI_API_KEY not set: skipping the eval questions")
+        return []
+    from ingestion.embed_cache import EmbeddingCache
+    from ingestion.embeddings import EmbeddingScheduler
+    questions = [json.loads(line)["question"] for line in open(path, encoding="utf-8") if line.strip()]
+    cache_dir = os.getenv("EMBED_CACHE_DIR", str(ROOT / ".cache" / "embeddings"))
+    embedder = EmbeddingScheduler(EMBEDDING_MODEL, dims, api_key=os.getenv("OPENAI_API_KEY"),
+                                  cache=EmbeddingCache(cache_dir) if cache_dir else None)
+    try:
+        return embedder.embed(questions)
+    finally:
+        embedder.close()
+
+def sample_queries(conn, table, column, n):
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT {column}::text FROM {table} WHERE {column} IS NOT NULL ORDER BY random() LIMIT %s", (n,))
+        out = [json.loads(r[0]) for r in cur.fetchall()]
+    conn.commit()
+    return out
+
+def top_k(conn, table, column, cast, queries, k, exact=False):
+    """(ids per query, seconds per query)."""
+    ids, secs = [], []
+    with conn.cursor() as cur:
+        if exact:
+            cur.execute("SET LOCAL enable_indexscan = off")
+        for q in queries:
+            started = time.perf_counter()
+            cur.execute(f"SELECT id FROM {table} ORDER BY {column} <=> %s::{cast} LIMIT %s", (literal(q), k))
+            ids.append([r[0] for r in cur.fetchall()])
+            secs.append(time.perf_counter() - started)
+    conn.commit()
+    return ids, secs
+
+def recall(found, truth, k):
+    if not truth:
+        return None
+    return round(sum(len(set(f) & set(t)) for f, t in zip(found, truth)) / (k * len(truth)), 4)
+
+def build(conn, table, column, source_dims, storage, dims, index):
+    name = f"bench_vec_{storage}_{dims}"
+    expr = column if dims == source_dims else f"l2_normalize(subvector({column}, 1, {dims}))"
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {name}")
+        cur.execute(f"CREATE UNLOGGED TABLE {name} AS SELECT id, ({expr})::{storage}({dims}) AS emb "
+                    f"FROM {table} WHERE {column} IS NOT NULL")
+        conn.commit()
+        started = time.perf_counter()
+        if index == "hnsw":
+            cur.execute(f"CREATE INDEX {name}_idx ON {name} USING hnsw (emb {storage}_cosine_ops)")
+        build_s = time.perf_counter() - started
+        cur.execute(f"ANALYZE {name}")
+        cur.execute("SELECT pg_table_size(%s), coalesce(pg_relation_size(to_regclass(%s)), 0)", (name, f"{name}_idx"))
+        table_bytes, index_bytes = cur.fetchone()
+    conn.commit()
+    return name, build_s, table_bytes, index_bytes
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--db", default=os.getenv("POSTGRES_URL"), help="database holding the embeddings (env POSTGRES_URL)")
+    ap.add_argument("--table", default="documents")
+    ap.add_argument("--column", help="full-precision column (default: embedding_full if a migration kept it, else embedding)")
+    ap.add_argument("--configs", default="vector:1536,halfvec:1536,halfvec:768,halfvec:512,vector:512,halfvec:256",
+                    help="comma-separated storage:dims to compare")
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--queries", default=str(ROOT / "eval" / "eval.jsonl"), help="JSONL with a question field")
+    ap.add_argument("--sample", type=int, default=200, help="stored chunks used as extra queries")
+    ap.add_argument("--index", choices=("hnsw", "none"), default="hnsw")
+    ap.add_argument("--ef-search", type=int, default=40, help="hnsw.ef_search for the queries")
+    ap.add_argument("--keep", action="store_true", help="keep the bench_vec_* scratch tables")
+    ap.add_argument("--out", help="write the results as JSON")
+    args = ap.parse_args()
+    if not args.db:
+        raise SystemExit("Set POSTGRES_URL (or --db)")
+
+    conn = psycopg2.connect(args.db)
+    column = args.column or ("embedding_full" if vectors.column_type(conn, args.table, "embedding_full")[0]
+                             else "embedding")
+    source_type, source_dims = vectors.column_type(conn, args.table, column)
+    if source_dims is None:
+        raise SystemExit(f"{args.table}.{column} has no declared dimension")
+    configs = []
+    for spec in args.configs.split(","):
+        storage, _, dims = spec.strip().partition(":")
+        if storage not in vectors.STORAGE_TYPES or not dims or int(dims) > source_dims:
+            raise SystemExit(f"bad config {spec!r}: storage must be one of {vectors.STORAGE_TYPES}, dims <= {source_dims}")
+        configs.append((storage, int(dims)))
+
+    query_sets = {"eval": eval_queries(args.queries, source_dims) if args.queries else [],
+                  "sample": sample_queries(conn, args.table, column, args.sample)}
+    cast = f"{source_type}({source_dims})"
+    truth = {name: top_k(conn, args.table, column, cast, qs, args.k, exact=True)[0] for name, qs in query_sets.items()}
+    print(f"{args.table}.{column} {cast}: {len(query_sets['eval'])} eval + {len(query_sets['sample'])} sampled queries, "
+          f"k={args.k}, index={args.index}")
+
+    with conn.cursor() as cur:
+        cur.execute(f"SET hnsw.ef_search = {int(args.ef_search)}")  # session-wide
+    conn.commit()
+    results, scratch = [], []
+    try:
+        for storage, dims in configs:
+            name, build_s, table_bytes, index_bytes = build(conn, args.table, column, source_dims, storage, dims, args.index)
+            scratch.append(name)
+            row = {"storage": storage, "dims": dims, "table_mb": round(table_bytes / 2 ** 20, 2),
+                   "index_mb": round(index_bytes / 2 ** 20, 2), "index_build_s": round(build_s, 2)}
+            latencies = []
+            for qname, qs in query_sets.items():
+                short = [vectors.shorten(q, dims) for q in qs]
+                found, secs = top_k(conn, name, "emb", f"{storage}({dims})", short, args.k, exact=args.index == "none")
+                row[f"recall_{qname}"] = recall(found, truth[qname], args.k)
+                latencies.extend(secs)
+            if latencies:
+                latencies.sort()
+                row["p50_ms"] = round(statistics.median(latencies) * 1000, 2)
+                row["p95_ms"] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 2)
+            results.append(row)
+            print(json.dumps(row))
+    finally:
+        if not args.keep:
+            with conn.cursor() as cur:
+                for name in scratch:
+                    cur.execute(f"DROP TABLE IF EXISTS {name}")
+            conn.commit()
+        conn.close()
+
+    print(f"\n{'config':>14} {'recall eval':>11} {'recall smpl':>11} {'p50 ms':>8} {'p95 ms':>8} {'table MB':>9} {'index MB':>9}")
+    for r in results:
+        fmt = lambda v: "-" if v is None else f"{v:.3f}"
+        print(f"{r['storage'] + ':' + str(r['dims']):>14} {fmt(r['recall_eval']):>11} {fmt(r['recall_sample']):>11} "
+              f"{r.get('p50_ms', 0):8.2f} {r.get('p95_ms', 0):8.2f} {r['table_mb']:9.2f} {r['index_mb']:9.2f}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"table": args.table, "column": column, "k": args.k, "index": args.index, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""
+Shared helpers for the Python ingestion scripts (pipeline.py, scripts/ingest_md_to_neon.py).
+
+Modules here never read the pipeline's environment config at import time, so they are
+safe to import from worker processes and from scripts with different env requirements.
+"""
@@ -0,0 +1,118 @@
+"""
+chunking.py — streaming word-window chunker
+
+Produces exactly what the original list-based chunker did:
+
+    words = text.split()
+    for i in range(0, len(words), chunk_size - overlap):
+        yield " ".join(words[i:i + chunk_size])
+
+without ever materialising the word list for the whole text. The text is split in
+bounded segments (cut at whitespace, so no word straddles two segments), and only the
+current window of words is kept. Chunks are still joined with single spaces, because
+that is what the original output contains; a raw slice of the source text would keep
+its newlines and runs of spaces and change every chunk_hash.
+
+ChunkedText can be iterated more than once, so callers can take a cheap hashing pass
+before the embedding pass without holding every chunk in memory.
+
+StreamChunker is the same windowing fed piece by piece (e.g. one PDF page range at a
+time), so a document that never exists as one string chunks exactly as if it did: the
+chunks of "\n".join(pieces) in the same order, with the same hashes. Its carry-over (the
+words of the next, unfinished chunk) can be saved and restored to resume mid-document.
+"""
+
+import re
+from typing import Iterator, List, Optional
+
+_WHITESPACE = re.compile(r"\s")
+
+SEGMENT_CHARS = 64 * 1024
+
+
+def _iter_segment_words(text: str, segment_chars: int = SEGMENT_CHARS) -> Iterator[List[str]]:
+    """Words of `text`, one list per ~segment_chars slice, cut only at whitespace."""
+    pos, n = 0, len(text)
+    while pos < n:
+        end = pos + segment_chars
+        if end < n:
+            m = _WHITESPACE.search(text, end)  # finish the word we landed in
+            end = m.start() if m else n
+        else:
+            end = n
+        yield text[pos:end].split()
+        pos = end
+
+
+class ChunkedText:
+    """Re-iterable, lazily built chunks of `text` (chunk_size words, overlapping by `overlap`)."""
+
+    def __init__(self, text: str, chunk_size: int, overlap: int):
+        self.text = text
+        self.chunk_size = chunk_size
+        self.step = max(1, chunk_size - overlap)
+        self._word_count: Optional[int] = None
+
+    @property
+    def word_count(self) -> int:
+        if self._word_count is None:
+            self._word_count = sum(len(words) for words in _iter_segment_words(self.text))
+        return self._word_count
+
+    def __len__(self) -> int:
+        return (self.word_count + self.step - 1) // self.step
+
+    def __bool__(self) -> bool:
+        return bool(self.text) and not self.text.isspace()
+
+    def __iter__(self) -> Iterator[str]:
+        chunker = StreamChunker(self.chunk_size, self.chunk_size - self.step)
+        for words in _iter_segment_words(self.text):
+            yield from chunker.feed_words(words)
+        yield from chunker.finish()
+
+
+class StreamChunker:
+    """Incremental ChunkedText: feed() text pieces in order, then finish() for the tail chunks."""
+
+    def __init__(self, chunk_size: int, overlap: int):
+        self.chunk_size = chunk_size
+        self.step = max(1, chunk_size - overlap)
+        self.word_count = 0
+        self._window: List[str] = []
+        self._start = 0  # index in the window of the next chunk's first word
+
+    def feed(self, text: str) -> List[str]:
+        """Chunks completed by this piece (pieces are word-separated, like pages joined by newlines)."""
+        out: List[str] = []
+        for words in _iter_segment_words(text):
+            out.extend(self.feed_words(words))
+        return out
+
+    def feed_words(self, words: List[str]) -> Iterator[str]:
+        size, step = self.chunk_size, self.step
+        self.word_count += len(words)
+        window = self._window
+        if self._start:
+            del window[:self._start]
+            self._start = 0
+        window.extend(words)
+        while len(window) - self._start >= size:
+            yield " ".join(window[self._start:self._start + size])
+            self._start += step
+
+    def finish(self) -> List[str]:
+        """Tail windows shorter than chunk_size, as range(0, len(words), step) produced."""
+        out = []
+        while self._start < len(self._window):
+            out.append(" ".join(self._window[self._start:self._start + self.chunk_size]))
+            self._start += self.step
+        return out
+
+    def carry(self) -> str:
+        """The words not yet covered by an emitted chunk's start: all restore() needs to continue."""
+        return " ".join(self._window[self._start:])
+
+    def restore(self, carry: str, word_count: int = 0):
+        self._window, self._start, self.word_count = carry.split(), 0, word_count
+
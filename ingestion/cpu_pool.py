@@ -0,0 +1,87 @@
+"""
+cpu_pool.py — the shared process pool for CPU-bound extraction
+
+PDF page ranges and HTML parsing both run here so the pipeline's threads never hold the
+GIL parsing documents. The pool uses the spawn context: the pipeline forks from a process
+with many live threads. Spawned workers still re-import the main script (pipeline.py, as
+__mp_main__) to unpickle their state, so that script must keep its import-time work light:
+the embedder, HTTP session and host limiter are built in its main(). Functions submitted
+live in ingestion/ modules (see pdf_extract.py, html_extract.py).
+
+A worker that dies (MuPDF can segfault on a malformed PDF) breaks the whole executor: every
+pending and later future raises BrokenProcessPool. submit() / result() replace a broken pool
+and resubmit the task once, so one bad document fails at most its own URL.
+"""
+
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional, Tuple
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_size = 0
+_pool_lock = threading.Lock()
+
+
+def get_pool(processes: int) -> ProcessPoolExecutor:
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is None or _pool_size != processes:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"))
+            _pool_size = processes
+        return _pool
+
+
+def _discard(pool: ProcessPoolExecutor):
+    """Drop a broken pool so the next get_pool() builds a fresh one (other threads may already have)."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def submit(processes: int, fn: Callable, *args) -> Tuple[ProcessPoolExecutor, Future]:
+    """(pool, future) for fn(*args); a pool found broken at submit time is replaced first."""
+    pool = get_pool(processes)
+    try:
+        return pool, pool.submit(fn, *args)
+    except BrokenProcessPool:
+        _discard(pool)
+        pool = get_pool(processes)
+        return pool, pool.submit(fn, *args)
+
+
+def result(processes: int, pool: ProcessPoolExecutor, future: Future, fn: Callable, *args):
+    """
+    future.result() for a submit(); if a worker died, the pool is rebuilt and fn(*args) run
+    once more on it. A second death raises BrokenProcessPool for this task only.
+    """
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        _discard(pool)
+    pool, future = submit(processes, fn, *args)
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        _discard(pool)
+        raise
+
+
+def run(processes: int, fn: Callable, *args):
+    """fn(*args) on the pool and wait for it; processes <= 1 runs it in the calling thread."""
+    if processes <= 1:
+        return fn(*args)
+    return result(processes, *submit(processes, fn, *args), fn, *args)
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
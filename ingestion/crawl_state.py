@@ -0,0 +1,107 @@
+"""
+crawl_state.py — per-URL crawl bookkeeping used for conditional re-crawls
+
+One row per source URL with the validators the server gave us last time (ETag,
+Last-Modified), a hash of the raw content we processed and when it was last ingested.
+pipeline.py loads the whole table once per run, sends If-None-Match / If-Modified-Since
+and skips extract -> chunk -> embed when the server answers 304 or the content hash is
+unchanged.
+"""
+
+import hashlib
+from typing import Dict, Optional
+
+CRAWL_STATE_DDL = """
+CREATE TABLE IF NOT EXISTS crawl_state (
+  source_url TEXT PRIMARY KEY,
+  etag TEXT,
+  last_modified TEXT,
+  content_hash TEXT,
+  last_status TEXT,
+  last_checked_at TIMESTAMPTZ,
+  last_ingested_at TIMESTAMPTZ
+)
+"""
+
+
+def ensure_table(conn):
+    with conn.cursor() as cur:
+        cur.execute(CRAWL_STATE_DDL)
+    conn.commit()
+
+
+def load_all(conn) -> Dict[str, Dict]:
+    """Return {source_url: {etag, last_modified, content_hash, last_status}} for every known URL."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT source_url, etag, last_modified, content_hash, last_status FROM crawl_state")
+        rows = cur.fetchall()
+    return {
+        r[0]: {"etag": r[1], "last_modified": r[2], "content_hash": r[3], "last_status": r[4]}
+        for r in rows
+    }
+
+
+def content_hash(data) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def conditional_headers(state: Optional[Dict]) -> Dict[str, str]:
+    """If-None-Match / If-Modified-Since headers for a previously seen URL (empty if unknown)."""
+    headers = {}
+    if not state:
+        return headers
+    if state.get("etag"):
+        headers["If-None-Match"] = state["etag"]
+    if state.get("last_modified"):
+        headers["If-Modified-Since"] = state["last_modified"]
+    return headers
+
+
+def validators_from_response(resp) -> Dict[str, Optional[str]]:
+    return {
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+    }
+
+
+def record_checked(conn, url: str, status: str):
+    """Note that the URL was checked this run without (re)ingesting it."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO crawl_state (source_url, last_status, last_checked_at)
+            VALUES (%s, %s, now())
+            ON CONFLICT (source_url) DO UPDATE SET
+              last_status = EXCLUDED.last_status,
+              last_checked_at = now()
+            """,
+            (url, status),
+        )
+    conn.commit()
+
+
+def record_processed(conn, url: str, status: str, etag=None, last_modified=None,
+                     content_hash=None, ingested: bool = False):
+    """
+    Store the validators and content hash of content we fully processed.
+    last_ingested_at only moves when chunks were actually written (ingested=True).
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO crawl_state
+              (source_url, etag, last_modified, content_hash, last_status, last_checked_at, last_ingested_at)
+            VALUES (%s, %s, %s, %s, %s, now(), CASE WHEN %s THEN now() END)
+            ON CONFLICT (source_url) DO UPDATE SET
+              etag = EXCLUDED.etag,
+              last_modified = EXCLUDED.last_modified,
+              content_hash = EXCLUDED.content_hash,
+              last_status = EXCLUDED.last_status,
+              last_checked_at = now(),
+              last_ingested_at = COALESCE(EXCLUDED.last_ingested_at, crawl_state.last_ingested_at)
+            """,
+            (url, etag, last_modified, content_hash, status, ingested),
+        )
+    conn.commit()
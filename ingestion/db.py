@@ -0,0 +1,179 @@
+"""
+db.py — pooled Postgres connections for pipeline.py and scripts/ingest_md_to_neon.py
+
+A small thread-safe pool of psycopg2 connections (psycopg2.pool only keeps `minconn` idle
+connections and raises instead of waiting when it runs out). Threads block for a free
+connection, idle ones are reused, and there is what a Neon database needs:
+- connects are retried with backoff: a compute waking from suspend (cold start) or a brief
+  network drop delays the run instead of ending it
+- a connection that was closed while idle (Neon drops them when it suspends) or that broke
+  mid-query is discarded on return and replaced on the next checkout
+- run() executes one unit of work in a transaction and, after a connection error or a
+  deadlock, retries it on a fresh connection
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "16"))
+DB_RETRIES = int(os.getenv("DB_RETRIES", "5"))  # connect attempts / run() retries after the first
+DB_RETRY_BACKOFF = float(os.getenv("DB_RETRY_BACKOFF", "1.0"))  # seconds, doubled per attempt (capped at 30)
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "15"))
+DB_PING_IDLE_SECONDS = 60.0  # connections idle longer than this are checked with SELECT 1 on checkout
+
+
+def is_transient(e: Exception) -> bool:
+    """Errors worth retrying on another connection: dropped connections, deadlocks, serialization failures."""
+    import psycopg2
+    from psycopg2.extensions import TransactionRollbackError
+
+    return isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError, TransactionRollbackError))
+
+
+def backoff(attempt: int) -> float:
+    return min(30.0, DB_RETRY_BACKOFF * 2 ** attempt)
+
+
+class Pool:
+    def __init__(self, dsn: str, maxconn: int = DB_POOL_MAX, retries: int = DB_RETRIES,
+                 connect_timeout: int = DB_CONNECT_TIMEOUT):
+        self.dsn = dsn
+        self.maxconn = max(1, maxconn)
+        self.retries = retries
+        # keepalives notice a dead server in ~a minute instead of waiting on TCP timeouts
+        self._connect_kwargs = {"connect_timeout": connect_timeout, "keepalives": 1, "keepalives_idle": 30,
+                                "keepalives_interval": 10, "keepalives_count": 3}
+        self._slots = threading.BoundedSemaphore(self.maxconn)
+        self._idle: List = []  # (connection, returned at) pairs, most recent last
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = {"connects": 0, "checkouts": 0, "connect_retries": 0, "discarded": 0, "run_retries": 0}
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _connect(self):
+        import psycopg2
+
+        attempt = 0
+        while True:
+            try:
+                conn = psycopg2.connect(self.dsn, **self._connect_kwargs)
+                self._count("connects")
+                return conn
+            except psycopg2.OperationalError as e:
+                if attempt >= self.retries:
+                    raise
+                self._count("connect_retries")
+                print(f"[db] connect failed ({str(e).strip()}); retrying in {backoff(attempt):.1f}s", flush=True)
+                time.sleep(backoff(attempt))
+                attempt += 1
+
+    @staticmethod
+    def _alive(conn, idle_since: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < DB_PING_IDLE_SECONDS:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def getconn(self):
+        """A live connection (blocks while all maxconn are checked out); give it back with putconn()."""
+        self._slots.acquire()
+        try:
+            while True:
+                with self._lock:
+                    conn, idle_since = self._idle.pop() if self._idle else (None, 0.0)
+                if conn is None:
+                    conn = self._connect()
+                elif not self._alive(conn, idle_since):
+                    self._discard(conn)  # dropped while idle, e.g. the compute was suspended
+                    continue
+                self._count("checkouts")
+                return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _discard(self, conn):
+        self._count("discarded")
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def putconn(self, conn):
+        from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+        try:
+            if not conn.closed and conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except Exception:
+                    conn.close()
+            with self._lock:
+                keep = not conn.closed and not self._closed
+                if keep:
+                    self._idle.append((conn, time.monotonic()))
+            if not keep:
+                self._discard(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def run(self, fn: Callable, retries: Optional[int] = None):
+        """
+        fn(conn) in one transaction, committed; its result is returned. After a transient error
+        the transaction is rolled back and fn is run again on another connection, so fn must be
+        safe to repeat (the pipeline's writes all are: ON CONFLICT DO NOTHING / upserts).
+        """
+        retries = self.retries if retries is None else retries
+        attempt = 0
+        while True:
+            conn = self.getconn()
+            try:
+                result = fn(conn)
+                conn.commit()
+                return result
+            except Exception as e:
+                if not conn.closed:
+                    try:
+                        conn.rollback()
+                    except Exception:
+                        pass
+                if not is_transient(e) or attempt >= retries:
+                    raise
+                self._count("run_retries")
+                print(f"[db] {type(e).__name__}: {str(e).strip()}; retrying in {backoff(attempt):.1f}s", flush=True)
+            finally:
+                self.putconn(conn)
+            time.sleep(backoff(attempt))
+            attempt += 1
+
+    def closeall(self):
+        """Close the idle connections; connections still checked out are closed when returned."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
@@ -0,0 +1,182 @@
+"""
+embed_cache.py — on-disk embedding cache keyed by (model, dimension, sha256 of text)
+
+Layout under the cache directory:
+  index.sqlite      key -> (dimension, slot, last_used) plus per-dimension slot counters
+  vectors_<dim>.f32 fixed-size float32 records, memory-mapped; record N is slot N
+
+Vectors are stored as raw native-endian float32 (4 bytes per dimension, no per-float
+formatting) and read straight out of the mmap. When the live entries exceed max_bytes the
+least recently used ones are evicted and their slots reused, so the blob files stop
+growing at roughly the configured size.
+
+Safe to share between threads; slot allocation happens inside an IMMEDIATE sqlite
+transaction, so two processes using the same directory won't hand out the same slot.
+"""
+
+import hashlib
+import mmap
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional, Sequence
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+  key TEXT PRIMARY KEY,
+  dim INTEGER NOT NULL,
+  slot INTEGER NOT NULL,
+  last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+CREATE TABLE IF NOT EXISTS free_slots (dim INTEGER NOT NULL, slot INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS blobs (dim INTEGER PRIMARY KEY, next_slot INTEGER NOT NULL);
+"""
+
+
+def cache_key(model: str, dimension: int, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{dimension}\0{text}".encode("utf-8")).hexdigest()
+
+
+class _Blob:
+    """Growable memory-mapped file of fixed-size float32 records."""
+
+    def __init__(self, path: str, dimension: int):
+        self.record = dimension * 4
+        self.dimension = dimension
+        self.file = open(path, "a+b")
+        self.map: Optional[mmap.mmap] = None
+        self._remap()
+
+    def _remap(self, min_size: int = 0):
+        size = os.fstat(self.file.fileno()).st_size
+        if size < min_size:
+            # grow geometrically so appends don't remap every time
+            size = max(min_size, size * 2, self.record * 1024)
+            self.file.truncate(size)
+        if self.map is not None:
+            self.map.close()
+        self.map = mmap.mmap(self.file.fileno(), size) if size else None
+
+    def read(self, slot: int) -> List[float]:
+        end = (slot + 1) * self.record
+        if self.map is None or end > len(self.map):
+            self._remap()  # another process may have grown the file
+        arr = array("f")
+        arr.frombytes(self.map[end - self.record:end])
+        return arr.tolist()
+
+    def write(self, slot: int, values: Sequence[float]):
+        end = (slot + 1) * self.record
+        if self.map is None or end > len(self.map):
+            self._remap(end)
+        self.map[end - self.record:end] = array("f", values).tobytes()
+
+    def close(self):
+        if self.map is not None:
+            self.map.flush()
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+
+class EmbeddingCache:
+    def __init__(self, directory: str, max_bytes: int = 2 * 1024 ** 3):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._db = sqlite3.connect(os.path.join(directory, "index.sqlite"), timeout=30,
+                                   check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self._blobs: Dict[int, _Blob] = {}
+        self._lock = threading.Lock()
+
+    def _blob(self, dimension: int) -> _Blob:
+        blob = self._blobs.get(dimension)
+        if blob is None:
+            blob = _Blob(os.path.join(self.directory, f"vectors_{dimension}.f32"), dimension)
+            self._blobs[dimension] = blob
+        return blob
+
+    def get_many(self, model: str, dimension: int, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Cached vectors for `texts` (None where missing), refreshing their LRU timestamps."""
+        keys = [cache_key(model, dimension, t) for t in texts]
+        out: List[Optional[List[float]]] = [None] * len(texts)
+        with self._lock:
+            slots: Dict[str, int] = {}
+            for i in range(0, len(keys), 500):  # stay under sqlite's bound-parameter limit
+                part = keys[i:i + 500]
+                rows = self._db.execute(
+                    f"SELECT key, slot FROM entries WHERE dim = ? AND key IN ({','.join('?' * len(part))})",
+                    [dimension, *part],
+                ).fetchall()
+                slots.update(rows)
+            if not slots:
+                return out
+            blob = self._blob(dimension)
+            for i, key in enumerate(keys):
+                if key in slots:
+                    out[i] = blob.read(slots[key])
+            now = time.time()
+            self._db.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(now, k) for k in slots])
+        return out
+
+    def put_many(self, model: str, dimension: int, texts: Sequence[str], vecs: Sequence[Sequence[float]]):
+        now = time.time()
+        with self._lock:
+            blob = self._blob(dimension)
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for text, vec in zip(texts, vecs):
+                    key = cache_key(model, dimension, text)
+                    row = self._db.execute("SELECT slot FROM entries WHERE key = ?", (key,)).fetchone()
+                    slot = row[0] if row else self._allocate_slot(dimension)
+                    blob.write(slot, vec)
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO entries (key, dim, slot, last_used) VALUES (?, ?, ?, ?)",
+                        (key, dimension, slot, now),
+                    )
+                self._evict()
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _allocate_slot(self, dimension: int) -> int:
+        row = self._db.execute("SELECT rowid, slot FROM free_slots WHERE dim = ? LIMIT 1", (dimension,)).fetchone()
+        if row:
+            self._db.execute("DELETE FROM free_slots WHERE rowid = ?", (row[0],))
+            return row[1]
+        row = self._db.execute("SELECT next_slot FROM blobs WHERE dim = ?", (dimension,)).fetchone()
+        slot = row[0] if row else 0
+        self._db.execute("INSERT OR REPLACE INTO blobs (dim, next_slot) VALUES (?, ?)", (dimension, slot + 1))
+        return slot
+
+    def size_bytes(self) -> int:
+        row = self._db.execute("SELECT COALESCE(SUM(dim * 4), 0) FROM entries").fetchone()
+        return int(row[0])
+
+    def _evict(self):
+        """Drop least recently used entries until live vectors fit in max_bytes (caller holds the txn)."""
+        excess = self.size_bytes() - self.max_bytes
+        while excess > 0:
+            victims = self._db.execute(
+                "SELECT key, dim, slot FROM entries ORDER BY last_used LIMIT 1000").fetchall()
+            if not victims:
+                return
+            for key, dim, slot in victims:
+                self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._db.execute("INSERT INTO free_slots (dim, slot) VALUES (?, ?)", (dim, slot))
+                excess -= dim * 4
+                if excess <= 0:
+                    break
+
+    def close(self):
+        with self._lock:
+            for blob in self._blobs.values():
+                blob.close()
+            self._blobs.clear()
+            self._db.close()
@@ -0,0 +1,278 @@
+"""
+embeddings.py — rate-limit-aware OpenAI embedding scheduler shared by the ingestion scripts
+
+EmbeddingScheduler.embed(texts) packs texts into requests up to a token budget (and the
+API's 2048-inputs cap), keeps several requests in flight on a small thread pool, and
+paces them with requests/minute and tokens/minute buckets. The buckets are corrected
+from the x-ratelimit-* response headers, so we run as fast as the account tier allows.
+A 429 pauses every request (for as long as the server asks); connection errors and 5xx
+are retried by the failing request after a capped exponential sleep, and anything else
+(bad request, auth) is raised.
+
+One scheduler is meant to be shared by every thread in a process so the limits are
+global, not per caller. With an EmbeddingCache attached, texts embedded before (by
+either ingestion script, into any table) are served from disk and never reach the API.
+
+A dimension below the model's native size is requested with the API's `dimensions`
+parameter (text-embedding-3 models return the vector shortened and re-normalized).
+"""
+
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+import openai
+
+from ingestion.embed_cache import EmbeddingCache
+
+try:  # exact token counts when tiktoken is installed, a conservative estimate otherwise
+    import tiktoken
+except ImportError:  # pragma: no cover - optional dependency
+    tiktoken = None
+
+MAX_INPUTS_PER_REQUEST = 2048  # OpenAI embeddings API limit
+NATIVE_DIMENSIONS = {"text-embedding-3-small": 1536, "text-embedding-3-large": 3072, "text-embedding-ada-002": 1536}
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_reset(value: Optional[str]) -> Optional[float]:
+    """Seconds from an x-ratelimit-reset-* value such as '20ms', '1s' or '6m0s'."""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(n) * _DURATION_UNITS[u] for n, u in parts)
+
+
+class _Bucket:
+    """Per-minute budget refilled continuously; `level` may go negative after over-use."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    def wait_for(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 if it already is); requires a fresh refill()."""
+        need = min(amount, self.capacity) - self.level
+        return 0.0 if need <= 0 else need * 60.0 / self.capacity
+
+
+class RateLimiter:
+    """Thread-safe requests/minute + tokens/minute limiter with a global pause for 429s."""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = _Bucket(requests_per_minute)
+        self.tokens = _Bucket(tokens_per_minute)
+        self.paused_until = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self, tokens: int):
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self.requests.refill(now)
+                self.tokens.refill(now)
+                wait = max(self.paused_until - now, self.requests.wait_for(1), self.tokens.wait_for(tokens))
+                if wait <= 0:
+                    self.requests.level -= 1
+                    self.tokens.level -= tokens
+                    return
+                self._cond.wait(timeout=wait)
+
+    def refund(self, tokens: int):
+        """Give back tokens reserved by acquire() but not used (negative = charge extra)."""
+        with self._cond:
+            self.tokens.level = min(self.tokens.capacity, self.tokens.level + tokens)
+            self._cond.notify_all()
+
+    def pause(self, seconds: float):
+        with self._cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def update_from_headers(self, headers):
+        """Sync the buckets with what the API reports for this key (x-ratelimit-* headers)."""
+        with self._cond:
+            now = time.monotonic()
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                limit = headers.get(f"x-ratelimit-limit-{kind}")
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                bucket.refill(now)
+                if limit and limit.isdigit():
+                    bucket.capacity = float(limit)
+                if remaining and remaining.isdigit():
+                    bucket.level = min(bucket.level, float(remaining))
+                    if int(remaining) == 0:
+                        reset = parse_reset(headers.get(f"x-ratelimit-reset-{kind}"))
+                        if reset:
+                            self.paused_until = max(self.paused_until, now + reset)
+            self._cond.notify_all()
+
+
+def _retry_after(err) -> Optional[float]:
+    headers = getattr(getattr(err, "response", None), "headers", None) or {}
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000.0
+        except ValueError:
+            pass
+    for name in ("retry-after", "x-ratelimit-reset-requests", "x-ratelimit-reset-tokens"):
+        seconds = parse_reset(headers.get(name))
+        if seconds:
+            return seconds
+    return None
+
+
+def _backoff(attempt: int) -> float:
+    return min(60.0, 2.0 ** attempt)
+
+
+class EmbeddingScheduler:
+    def __init__(self, model: str, dimension: int, requests_per_minute: float = 3000,
+                 tokens_per_minute: float = 1_000_000, max_in_flight: int = 4,
+                 max_request_tokens: int = 60_000, max_retries: int = 8,
+                 client: Optional[openai.OpenAI] = None, api_key: Optional[str] = None,
+                 cache: Optional[EmbeddingCache] = None):
+        self.model = model
+        self.dimension = dimension
+        # only sent when shortening: ada-002 rejects the parameter altogether
+        self._request_args = {"dimensions": dimension} if dimension != NATIVE_DIMENSIONS.get(model, dimension) else {}
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_request_tokens = max_request_tokens
+        self.max_retries = max_retries
+        # the client's own retry/backoff is disabled: 429 handling lives here
+        self.client = client or openai.OpenAI(api_key=api_key, max_retries=0)
+        self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.cache = cache
+        self.stats: Dict[str, int] = {"requests": 0, "inputs": 0, "tokens": 0, "rate_limited": 0, "retries": 0,
+                                      "cache_hits": 0}
+        self._stats_lock = threading.Lock()
+        self._in_flight = threading.BoundedSemaphore(self.max_in_flight)  # across all calling threads
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.encoding_for_model(model)
+            except Exception:
+                self._encoding = None
+
+    # ---- packing ----
+    def count_tokens(self, text: str) -> int:
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        # ~4 chars/token for English; 3 keeps us on the safe side of the budget
+        return len(text) // 3 + 1
+
+    def pack(self, texts: Sequence[str]) -> List[List[int]]:
+        """Indexes of `texts` grouped into requests under the token and input-count budgets."""
+        groups: List[List[int]] = []
+        current: List[int] = []
+        budget = 0
+        for i, text in enumerate(texts):
+            tokens = self.count_tokens(text)
+            if current and (budget + tokens > self.max_request_tokens or len(current) >= MAX_INPUTS_PER_REQUEST):
+                groups.append(current)
+                current, budget = [], 0
+            current.append(i)
+            budget += tokens
+        if current:
+            groups.append(current)
+        return groups
+
+    # ---- requests ----
+    def _bump(self, **counts):
+        with self._stats_lock:
+            for k, v in counts.items():
+                self.stats[k] += v
+
+    def _request(self, batch: List[str]) -> List[List[float]]:
+        estimate = sum(self.count_tokens(t) for t in batch)
+        attempt = 0
+        while True:
+            self.limiter.acquire(estimate)
+            try:
+                with self._in_flight:
+                    raw = self.client.embeddings.with_raw_response.create(
+                        model=self.model, input=batch, **self._request_args)
+            except openai.RateLimitError as e:
+                attempt += 1
+                self._bump(rate_limited=1)
+                if attempt > self.max_retries:
+                    raise
+                self.limiter.pause(_retry_after(e) or _backoff(attempt))
+                continue
+            except (openai.APIConnectionError, openai.InternalServerError):
+                attempt += 1
+                self._bump(retries=1)
+                if attempt > self.max_retries:
+                    raise
+                time.sleep(_backoff(attempt))
+                continue
+            self.limiter.update_from_headers(raw.headers)
+            resp = raw.parse()
+            used = getattr(getattr(resp, "usage", None), "total_tokens", None) or estimate
+            self.limiter.refund(estimate - used)
+            self._bump(requests=1, inputs=len(batch), tokens=used)
+            data = sorted(resp.data, key=lambda d: d.index)
+            if len(data) != len(batch):
+                raise RuntimeError(f"embedding count mismatch: sent {len(batch)}, got {len(data)}")
+            for d in data:
+                if len(d.embedding) != self.dimension:
+                    raise RuntimeError("embedding dim mismatch")
+            return [d.embedding for d in data]
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="embed")
+            return self._pool
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        """
+        Embeddings for `texts`, in order. Cached texts are read from disk; the rest are sent
+        as packed requests running concurrently up to max_in_flight, then cached.
+        """
+        if not texts:
+            return []
+        if self.cache is None:
+            return self._embed_uncached(texts)
+        out = self.cache.get_many(self.model, self.dimension, texts)
+        missing = [i for i, vec in enumerate(out) if vec is None]
+        self._bump(cache_hits=len(texts) - len(missing))
+        if missing:
+            fresh = self._embed_uncached([texts[i] for i in missing])
+            self.cache.put_many(self.model, self.dimension, [texts[i] for i in missing], fresh)
+            for i, vec in zip(missing, fresh):
+                out[i] = vec
+        return out
+
+    def _embed_uncached(self, texts: Sequence[str]) -> List[List[float]]:
+        groups = self.pack(texts)
+        if len(groups) == 1:
+            return self._request(list(texts))
+        futures = [self._executor().submit(self._request, [texts[i] for i in g]) for g in groups]
+        out: List[List[float]] = []
+        for fut in futures:
+            out.extend(fut.result())
+        return out
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
@@ -0,0 +1,109 @@
+"""
+gdocs.py — Google Docs / Drive helpers for the pipeline
+
+- doc_text(): the text of a documents.get() body, including tables (one line per row, cells
+  joined with " | ") and the table of contents, not just top-level paragraphs.
+- list_folder(): every Google Doc under a Drive folder (recursively), with its modifiedTime.
+- modified_times(): Drive modifiedTime for many doc ids, 100 per HTTP batch request, so
+  unchanged docs are skipped before any documents.get() call.
+
+Docs themselves are still fetched one documents.get() each (the Docs API has no multi-get);
+the pipeline runs those concurrently on its fetch threads, one service object per thread.
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional
+
+DOC_MIME = "application/vnd.google-apps.document"
+FOLDER_MIME = "application/vnd.google-apps.folder"
+DRIVE_BATCH_SIZE = 100  # Drive's limit for calls per batch request
+
+_DOC_ID = re.compile(r"/document/d/([a-zA-Z0-9\-_]+)")
+_FOLDER_ID = re.compile(r"/folders/([a-zA-Z0-9\-_]+)")
+
+
+def doc_id(url: str) -> Optional[str]:
+    m = _DOC_ID.search(url)
+    return m.group(1) if m else None
+
+
+def folder_id(url: str) -> Optional[str]:
+    m = _FOLDER_ID.search(url) if "drive.google.com" in url.lower() else None
+    return m.group(1) if m else None
+
+
+def doc_url(doc_id: str) -> str:
+    return f"https://docs.google.com/document/d/{doc_id}/edit"
+
+
+def _paragraph_text(paragraph: Dict) -> str:
+    return "".join(e.get("textRun", {}).get("content", "") for e in paragraph.get("elements", []))
+
+
+def _content_text(content: Iterable[Dict], out: List[str]):
+    for el in content:
+        if "paragraph" in el:
+            out.append(_paragraph_text(el["paragraph"]))
+        elif "table" in el:
+            for row in el["table"].get("tableRows", []):
+                cells = []
+                for cell in row.get("tableCells", []):
+                    parts: List[str] = []
+                    _content_text(cell.get("content", []), parts)
+                    cells.append(" ".join("".join(parts).split()))
+                if any(cells):
+                    out.append(" | ".join(cells) + "\n")
+        elif "tableOfContents" in el:
+            _content_text(el["tableOfContents"].get("content", []), out)
+
+
+def doc_text(document: Dict) -> str:
+    out: List[str] = []
+    _content_text(document.get("body", {}).get("content", []), out)
+    return "".join(out).strip()
+
+
+def list_folder(drive, folder: str) -> List[Dict]:
+    """[{id, name, modifiedTime}] of the Google Docs in a folder and its subfolders."""
+    docs, pending, seen = [], [folder], set()
+    while pending:
+        parent = pending.pop()
+        if parent in seen:
+            continue
+        seen.add(parent)
+        token = None
+        while True:
+            resp = drive.files().list(
+                q=f"'{parent}' in parents and trashed = false "
+                  f"and (mimeType = '{DOC_MIME}' or mimeType = '{FOLDER_MIME}')",
+                fields="nextPageToken, files(id, name, mimeType, modifiedTime)",
+                pageSize=1000, pageToken=token,
+                supportsAllDrives=True, includeItemsFromAllDrives=True,
+            ).execute()
+            for f in resp.get("files", []):
+                if f["mimeType"] == FOLDER_MIME:
+                    pending.append(f["id"])
+                else:
+                    docs.append({"id": f["id"], "name": f.get("name"), "modifiedTime": f.get("modifiedTime")})
+            token = resp.get("nextPageToken")
+            if not token:
+                break
+    return docs
+
+
+def modified_times(drive, ids: Iterable[str], batch_size: int = DRIVE_BATCH_SIZE) -> Dict[str, str]:
+    """{doc id: modifiedTime} via batched files.get; ids Drive can't read are left out."""
+    ids = list(dict.fromkeys(ids))
+    out: Dict[str, str] = {}
+
+    def on_response(request_id, response, exception):
+        if exception is None and response:
+            out[request_id] = response.get("modifiedTime")
+
+    for i in range(0, len(ids), batch_size):
+        batch = drive.new_batch_http_request(callback=on_response)
+        for file_id in ids[i:i + batch_size]:
+            batch.add(drive.files().get(fileId=file_id, fields="id, modifiedTime", supportsAllDrives=True),
+                      request_id=file_id)
+        batch.execute()
+    return out
@@ -0,0 +1,163 @@
+"""
+hosts.py — per-host politeness for the pipeline's HTTP fetches
+
+HostLimiter gives every host its own concurrency cap (a semaphore) and request rate
+(a minimum spacing between request starts), so a sheet full of uscis.gov links doesn't
+have every fetch thread hitting one server at once. A 429/503 doubles that host's spacing
+and pauses it for Retry-After; successes ease the spacing back to the configured rate.
+Other hosts are unaffected, and nothing sleeps inside urllib3's Retry backoff.
+
+Per-host request counts, errors, throttles, retries and latency percentiles are kept for
+the end-of-run report.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+THROTTLE_STATUSES = (429, 503)
+
+
+def host_of(url: str) -> str:
+    return (urlparse(url).netloc or url).lower()
+
+
+def parse_host_limits(spec: str) -> Dict[str, Tuple[int, float]]:
+    """'www.uscis.gov=2/1.5,travel.state.gov=4/4' -> {host: (max_concurrency, requests_per_second)}."""
+    limits = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        host, _, value = item.partition("=")
+        concurrency, _, rps = value.partition("/")
+        limits[host.strip().lower()] = (int(concurrency), float(rps) if rps else 0.0)
+    return limits
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds or an HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def interleave_by_host(urls: Iterable[str]) -> List[str]:
+    """Round-robin URLs across hosts so workers aren't all queued on one host's limit."""
+    by_host: Dict[str, List[str]] = {}
+    for url in urls:
+        by_host.setdefault(host_of(url), []).append(url)
+    queues = list(by_host.values())
+    out = []
+    for i in range(max((len(q) for q in queues), default=0)):
+        out.extend(q[i] for q in queues if i < len(q))
+    return out
+
+
+class _Host:
+    def __init__(self, concurrency: int, rps: float):
+        self.semaphore = threading.BoundedSemaphore(max(1, concurrency))
+        self.lock = threading.Lock()
+        self.base_interval = 1.0 / rps if rps > 0 else 0.0
+        self.interval = self.base_interval
+        self.next_at = 0.0
+        self.stats = {"requests": 0, "errors": 0, "throttled": 0, "retries": 0, "wait_seconds": 0.0}
+        self.latencies: List[float] = []
+
+
+class HostLimiter:
+    def __init__(self, max_concurrency: int = 4, requests_per_second: float = 4.0,
+                 overrides: Optional[Dict[str, Tuple[int, float]]] = None, max_interval: float = 30.0):
+        self.default = (max(1, max_concurrency), requests_per_second)
+        self.overrides = overrides or {}
+        self.max_interval = max_interval
+        self._hosts: Dict[str, _Host] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def max_concurrency(self) -> int:
+        """Largest per-host concurrency: the keep-alive pool size each host needs."""
+        return max([self.default[0]] + [c for c, _ in self.overrides.values()])
+
+    def _host(self, host: str) -> _Host:
+        with self._lock:
+            h = self._hosts.get(host)
+            if h is None:
+                h = self._hosts[host] = _Host(*self.overrides.get(host, self.default))
+            return h
+
+    @contextmanager
+    def hold(self, url: str):
+        """Occupy one of the host's concurrency slots (re-entrant within a thread)."""
+        host = host_of(url)
+        held = self._local.__dict__.setdefault("held", set())
+        if host in held:
+            yield
+            return
+        h = self._host(host)
+        started = time.monotonic()
+        h.semaphore.acquire()
+        held.add(host)
+        try:
+            with h.lock:
+                h.stats["wait_seconds"] += time.monotonic() - started
+            yield
+        finally:
+            held.discard(host)
+            h.semaphore.release()
+
+    @contextmanager
+    def request(self, url: str):
+        """hold() plus the host's rate: waits for this request's turn before yielding."""
+        with self.hold(url):
+            h = self._host(host_of(url))
+            with h.lock:
+                now = time.monotonic()
+                start = max(now, h.next_at)
+                h.next_at = start + h.interval
+                h.stats["wait_seconds"] += start - now
+            if start > now:
+                time.sleep(start - now)
+            yield
+
+    def record(self, url: str, status: Optional[int], seconds: float, retry_after: Optional[str] = None,
+               retries: int = 0):
+        """Account one response (status None = connection error) and adapt the host's pace."""
+        h = self._host(host_of(url))
+        with h.lock:
+            h.stats["requests"] += 1
+            h.stats["retries"] += retries
+            h.latencies.append(seconds)
+            if status is None or status >= 400:
+                h.stats["errors"] += 1
+            if status in THROTTLE_STATUSES:
+                h.stats["throttled"] += 1
+                h.interval = min(self.max_interval, max(h.interval * 2, h.base_interval, 0.5))
+                pause = parse_retry_after(retry_after)
+                h.next_at = max(h.next_at, time.monotonic() + (pause if pause is not None else h.interval))
+            elif status is not None and status < 400 and h.interval > h.base_interval:
+                h.interval = max(h.base_interval, h.interval * 0.9)
+
+    def report(self) -> Dict[str, Dict]:
+        """host -> requests, errors, throttled, retries, wait seconds and latency p50/p95/max (seconds)."""
+        out = {}
+        with self._lock:
+            hosts = dict(self._hosts)
+        for host, h in hosts.items():
+            with h.lock:
+                lat = sorted(h.latencies)
+                row = {k: round(v, 3) if isinstance(v, float) else v for k, v in h.stats.items()}
+            if lat:
+                row.update(p50=round(lat[len(lat) // 2], 3), p95=round(lat[min(len(lat) - 1, int(len(lat) * 0.95))], 3),
+                           max=round(lat[-1], 3))
+            out[host] = row
+        return out
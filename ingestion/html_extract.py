@@ -0,0 +1,189 @@
+"""
+html_extract.py — main-content text from an HTML page
+
+Two engines produce the same {"title", "text"}:
+- "lxml": one streaming pass with lxml's parser target interface. No tree is built; text is
+  routed as it is parsed. Strings inside script/style/template/rt/rp are dropped. The first
+  main-content container (same selectors as below) collects its own text, minus nav/header/
+  footer/sidebar/cookie boilerplate inside it. The whole-page text, minus that boilerplate,
+  is collected alongside for the fallback.
+- "bs4": the original BeautifulSoup(html.parser) + select_one/decompose/get_text path, kept
+  as the reference and used when lxml isn't installed.
+
+Runs on the extraction process pool (see cpu_pool.py), so it never imports pipeline.py.
+"""
+
+import os
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+from bs4 import BeautifulSoup
+
+try:  # fast path; the bs4 engine is the fallback
+    from lxml import etree
+except ImportError:  # pragma: no cover - optional dependency
+    etree = None
+
+MAIN_SELECTORS = "article, div.main-content, div.content, div#main, div[role='main']"
+BOILERPLATE_SELECTORS = "nav, header, footer, script, style, .sidebar, .nav, .cookie-consent, .cookie-banner"
+
+# bs4 (>= 4.10) files strings inside these tags under types get_text() skips
+_SKIP_TAGS = frozenset(("script", "style", "template", "rt", "rp"))
+_BOILERPLATE_TAGS = frozenset(("nav", "header", "footer", "script", "style"))
+_BOILERPLATE_CLASSES = frozenset(("sidebar", "nav", "cookie-consent", "cookie-banner"))
+
+ENGINES = ("lxml", "bs4")
+DEFAULT_ENGINE = os.getenv("HTML_EXTRACT_ENGINE") or ("lxml" if etree is not None else "bs4")
+
+
+def _is_main(tag: str, attrib) -> bool:
+    if tag == "article":
+        return True
+    if tag != "div":
+        return False
+    classes = (attrib.get("class") or "").split()
+    return ("main-content" in classes or "content" in classes
+            or attrib.get("id") == "main" or attrib.get("role") == "main")
+
+
+def _is_boilerplate(tag: str, attrib) -> bool:
+    return tag in _BOILERPLATE_TAGS or not _BOILERPLATE_CLASSES.isdisjoint((attrib.get("class") or "").split())
+
+
+class _TextCollector:
+    """lxml parser target: routes each text run to the main-container and/or whole-page lists."""
+
+    def __init__(self):
+        self.stack: List[tuple] = []  # per open element: (skip, main, boilerplate, title) it switched on
+        self.skip = 0        # depth inside script/style/template/rt/rp
+        self.boiler = 0      # depth inside boilerplate within the main container
+        self.main_open = False
+        self.main_seen = False
+        self.title_open = False
+        self.title_seen = False
+        self.title_parts: List[str] = []
+        self.title_children = 0
+        self.buf: List[str] = []
+        self.main_text: List[str] = []
+        self.page_text: List[str] = []
+
+    def _flush(self):
+        # consecutive data events are one string to bs4; a tag or comment ends it
+        if not self.buf:
+            return
+        s = "".join(self.buf).strip()
+        self.buf = []
+        if not s or self.skip or self.boiler:
+            return
+        self.page_text.append(s)
+        if self.main_open:
+            self.main_text.append(s)
+
+    def start(self, tag, attrib):
+        self._flush()
+        if self.title_open:
+            self.title_children += 1
+        flags = [False, False, False, False]
+        if tag in _SKIP_TAGS:
+            self.skip += 1
+            flags[0] = True
+        if self.main_open and not self.boiler and _is_boilerplate(tag, attrib):
+            self.boiler += 1
+            flags[2] = True
+        elif not self.main_seen and _is_main(tag, attrib):
+            self.main_seen = self.main_open = True
+            flags[1] = True
+        elif self.boiler:
+            self.boiler += 1
+            flags[2] = True
+        if tag == "title" and not self.title_seen:
+            self.title_seen = self.title_open = True
+            flags[3] = True
+        self.stack.append(tuple(flags))
+
+    def end(self, tag):
+        if self.title_open and self.stack and self.stack[-1][3]:
+            self.title_parts = self.buf[:]
+        self._flush()
+        if not self.stack:
+            return
+        skip, main, boiler, title = self.stack.pop()
+        if skip:
+            self.skip -= 1
+        if main:
+            self.main_open = False
+        if boiler:
+            self.boiler -= 1
+        if title:
+            self.title_open = False
+
+    def data(self, text):
+        self.buf.append(text)
+
+    def comment(self, text):
+        self._flush()
+        if self.title_open:
+            self.title_children += 1
+
+    def pi(self, target, data=None):
+        self._flush()
+
+    def close(self):
+        self._flush()
+        return self
+
+    def title(self) -> Optional[str]:
+        # soup.title.string: the title's only child string, None if empty or mixed content
+        if self.title_children or not self.title_parts:
+            return None
+        return "".join(self.title_parts)
+
+
+def _finish(title: Optional[str], main: Optional[str], page: str, url: str, min_words: int) -> Dict:
+    title = title.strip() if title else urlparse(url).netloc
+    text = main
+    if main is None or not main or len(main.split()) < min_words:
+        # fallback to all text
+        text = page
+    if not text or len(text.split()) < min_words:
+        return {"title": title, "text": "", "note": "extracted text too small"}
+    return {"title": title, "text": text}
+
+
+def _extract_lxml(html: str, url: str, min_words: int) -> Dict:
+    collector = _TextCollector()
+    parser = etree.HTMLParser(target=collector)
+    if isinstance(html, str) and html.lstrip().startswith("<?xml"):
+        html = html.encode("utf-8")  # lxml rejects str input carrying an encoding declaration
+    parser.feed(html or " ")
+    parser.close()
+    main = "\n".join(collector.main_text) if collector.main_seen else None
+    return _finish(collector.title(), main, "\n".join(collector.page_text), url, min_words)
+
+
+def _extract_bs4(html: str, url: str, min_words: int) -> Dict:
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.string if soup.title and soup.title.string else None
+    # try to find main content containers
+    main = soup.select_one(MAIN_SELECTORS)
+    main_text = None
+    if main:
+        for bad in main.select(BOILERPLATE_SELECTORS):
+            bad.decompose()
+        main_text = main.get_text(separator="\n", strip=True)
+        if main_text and len(main_text.split()) >= min_words:
+            return _finish(title, main_text, "", url, min_words)
+    return _finish(title, main_text, soup.get_text(separator="\n", strip=True), url, min_words)
+
+
+def extract_html(html: str, url: str, min_words: int = 20, engine: Optional[str] = None) -> Dict:
+    """{"title", "text"} of a page, or an empty text plus a note when too little is left."""
+    engine = engine or DEFAULT_ENGINE
+    if engine not in ENGINES:
+        raise ValueError(f"unknown HTML engine: {engine}")
+    if engine == "lxml" and etree is not None:
+        try:
+            return _extract_lxml(html, url, min_words)
+        except (etree.ParserError, ValueError):
+            pass  # markup libxml2 gives up on; the reference parser is more forgiving
+    return _extract_bs4(html, url, min_words)
@@ -0,0 +1,205 @@
+"""
+indexes.py — pgvector ANN indexes on the columns the app searches with `<=>`
+
+The retriever and the gold-answer search order by cosine distance on documents.embedding and
+gold_answers.question_embedding / answer_embedding; without an index each chat request scans
+every vector. These helpers create, drop, rebuild and report those indexes:
+- HNSW by default (no training step, fine on an empty or growing table); IVFFlat on request,
+  with lists sized from the row count it is built on
+- build parameters and maintenance_work_mem are picked from the row count, so the graph is
+  built in memory rather than spilling
+- CREATE / DROP INDEX CONCURRENTLY, so searches and ingestion keep running during a build; an
+  interrupted concurrent build leaves an INVALID index, which is dropped before rebuilding
+- the operator class follows the column type (vector_cosine_ops / halfvec_cosine_ops, see
+  scripts/migrate_embeddings.py)
+
+pgvector can index vector columns up to 2000 dimensions and halfvec up to 4000.
+"""
+
+import math
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from ingestion import vectors
+
+TARGETS = [("documents", "embedding"), ("gold_answers", "question_embedding"), ("gold_answers", "answer_embedding")]
+METHODS = ("hnsw", "ivfflat")
+MAX_INDEX_DIMS = {"vector": 2000, "halfvec": 4000}
+
+# upper bound for the build's maintenance_work_mem (Neon computes have less RAM than a laptop)
+INDEX_MAINTENANCE_WORK_MEM_MB = int(os.getenv("INDEX_MAINTENANCE_WORK_MEM_MB", "1024"))
+INDEX_PARALLEL_WORKERS = int(os.getenv("INDEX_PARALLEL_WORKERS", "2"))  # max_parallel_maintenance_workers
+IVFFLAT_MIN_ROWS = 10000  # below this IVFFlat's centroids are poor; HNSW is the better choice
+
+
+def index_name(table: str, column: str, method: str) -> str:
+    # an index lives in its table's schema, so the name itself is never qualified
+    return f"{table.rsplit('.', 1)[-1]}_{column}_{method}_idx"
+
+
+def _qualified(table: str, name: str) -> str:
+    # DROP INDEX and to_regclass look the name up in the table's schema, not search_path
+    return f"{table.rsplit('.', 1)[0]}.{name}" if "." in table else name
+
+
+def build_params(method: str, rows: int) -> Dict[str, int]:
+    """
+    WITH (...) parameters for a table of `rows` vectors. HNSW keeps pgvector's defaults
+    (m=16, ef_construction=64) for small tables and raises them as the graph grows, so
+    recall at the default hnsw.ef_search (40) holds; IVFFlat uses rows/1000 lists up to 1M
+    rows and sqrt(rows) beyond (pgvector's guidance).
+    """
+    if method == "ivfflat":
+        return {"lists": max(1, rows // 1000 if rows <= 1_000_000 else int(math.sqrt(rows)))}
+    if rows < 100_000:
+        return {"m": 16, "ef_construction": 64}
+    if rows < 1_000_000:
+        return {"m": 16, "ef_construction": 128}
+    return {"m": 24, "ef_construction": 200}
+
+
+def estimated_bytes(method: str, rows: int, storage: str, dims: int, params: Dict[str, int]) -> int:
+    """Rough index size: the vectors plus, for HNSW, two layers' worth of neighbour links."""
+    per_vector = (2 if storage == "halfvec" else 4) * dims + 8
+    if method == "hnsw":
+        per_vector += params["m"] * 2 * 8 + 32
+    return rows * per_vector
+
+
+def maintenance_work_mem_mb(estimate: int) -> int:
+    return max(64, min(INDEX_MAINTENANCE_WORK_MEM_MB, math.ceil(estimate * 1.25 / 2 ** 20)))
+
+
+@contextmanager
+def _autocommit(conn):
+    # CREATE / DROP INDEX CONCURRENTLY can't run inside a transaction block
+    conn.commit()
+    previous = conn.autocommit
+    conn.autocommit = True
+    try:
+        yield conn
+    finally:
+        conn.autocommit = previous
+
+
+def row_count(conn, table: str, column: str) -> int:
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT count(*) FROM {table} WHERE {column} IS NOT NULL")
+        n = cur.fetchone()[0]
+    conn.commit()
+    return n
+
+
+def list_indexes(conn, table: str, column: str) -> List[Dict]:
+    """[{name, method, valid, bytes, definition}] for the ANN indexes on exactly this column."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT i.relname, am.amname, x.indisvalid, pg_relation_size(i.oid), pg_get_indexdef(i.oid)
+            FROM pg_index x
+            JOIN pg_class i ON i.oid = x.indexrelid
+            JOIN pg_am am ON am.oid = i.relam
+            JOIN pg_attribute a ON a.attrelid = x.indrelid AND a.attnum = ANY(x.indkey)
+            WHERE x.indrelid = to_regclass(%s) AND a.attname = %s AND am.amname IN ('hnsw', 'ivfflat')
+            ORDER BY i.relname
+            """,
+            (table, column),
+        )
+        rows = cur.fetchall()
+    conn.commit()
+    return [{"name": r[0], "method": r[1], "valid": r[2], "bytes": r[3], "definition": r[4]} for r in rows]
+
+
+def drop_indexes(conn, table: str, column: str, concurrently: bool = True) -> List[Dict]:
+    """Drop every ANN index on the column; returns what was dropped (see recreate())."""
+    dropped = list_indexes(conn, table, column)
+    with _autocommit(conn), conn.cursor() as cur:
+        for idx in dropped:
+            cur.execute(f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}IF EXISTS {_qualified(table, idx['name'])}")
+    return dropped
+
+
+def create_index(conn, table: str, column: str, method: str = "hnsw", params: Optional[Dict[str, int]] = None,
+                 concurrently: bool = True) -> Optional[Dict]:
+    """
+    Build the column's ANN index unless a valid one already exists. Returns {name, method,
+    params, rows, seconds, bytes}, or None when nothing was built.
+    """
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}")
+    storage, dims = vectors.column_type(conn, table, column)
+    if storage is None:
+        return None
+    if storage not in MAX_INDEX_DIMS or dims is None:
+        raise ValueError(f"{table}.{column} is {storage}{f'({dims})' if dims else ''}; "
+                         f"ANN indexes need vector(N) or halfvec(N)")
+    if dims > MAX_INDEX_DIMS[storage]:
+        raise ValueError(f"{table}.{column} has {dims} dims; pgvector indexes {storage} up to "
+                         f"{MAX_INDEX_DIMS[storage]} (shorten or convert it with scripts/migrate_embeddings.py)")
+    existing = list_indexes(conn, table, column)
+    if any(idx["valid"] for idx in existing):
+        return None
+    rows = row_count(conn, table, column)
+    params = params or build_params(method, rows)
+    name = index_name(table, column, method)
+    with_clause = ", ".join(f"{k} = {int(v)}" for k, v in params.items())
+    work_mem = maintenance_work_mem_mb(estimated_bytes(method, rows, storage, dims, params))
+    with _autocommit(conn), conn.cursor() as cur:
+        for idx in existing:  # left INVALID by an interrupted concurrent build
+            cur.execute(f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}IF EXISTS {_qualified(table, idx['name'])}")
+        cur.execute(f"SET maintenance_work_mem = '{work_mem}MB'")
+        cur.execute(f"SET max_parallel_maintenance_workers = {max(0, INDEX_PARALLEL_WORKERS)}")
+        started = time.perf_counter()
+        cur.execute(f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}{name} ON {table} "
+                    f"USING {method} ({column} {storage}_cosine_ops) WITH ({with_clause})")
+        seconds = time.perf_counter() - started
+        cur.execute("RESET maintenance_work_mem")
+        cur.execute("RESET max_parallel_maintenance_workers")
+        cur.execute("SELECT pg_relation_size(to_regclass(%s))", (_qualified(table, name),))
+        size = cur.fetchone()[0]
+    return {"name": name, "method": method, "params": params, "rows": rows, "seconds": round(seconds, 2),
+            "bytes": size, "maintenance_work_mem_mb": work_mem}
+
+
+def recreate(conn, table: str, column: str, dropped: Iterable[Dict], concurrently: bool = True) -> List[Dict]:
+    """Rebuild the methods drop_indexes() removed, with parameters for the table's new size."""
+    built = []
+    for method in dict.fromkeys(idx["method"] for idx in dropped):
+        result = create_index(conn, table, column, method, concurrently=concurrently)
+        if result:
+            built.append(result)
+    return built
+
+
+def analyze(conn, tables: Iterable[str]) -> Dict[str, float]:
+    """ANALYZE each table (planner statistics after bulk writes); {table: seconds}."""
+    out = {}
+    with conn.cursor() as cur:
+        for table in dict.fromkeys(tables):
+            cur.execute("SELECT to_regclass(%s)", (table,))
+            if cur.fetchone()[0] is None:
+                continue
+            started = time.perf_counter()
+            cur.execute(f"ANALYZE {table}")
+            out[table] = round(time.perf_counter() - started, 2)
+    conn.commit()
+    return out
+
+
+def status(conn, targets: Iterable[Tuple[str, str]] = TARGETS) -> List[Dict]:
+    """[{table, column, type, rows, table_bytes, indexes}] for each target column that exists."""
+    out = []
+    for table, column in targets:
+        storage, dims = vectors.column_type(conn, table, column)
+        if storage is None:
+            continue
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_table_size(to_regclass(%s))", (table,))
+            table_bytes = cur.fetchone()[0]
+        conn.commit()
+        out.append({"table": table, "column": column, "type": f"{storage}({dims})" if dims else storage,
+                    "rows": row_count(conn, table, column), "table_bytes": table_bytes,
+                    "indexes": list_indexes(conn, table, column)})
+    return out
@@ -0,0 +1,169 @@
+"""
+journal.py — checkpoint journal for resumable ingestion runs
+
+A small local sqlite file records, per run, how far each URL got:
+
+  probed -> extracted -> chunked -> embedded -> written     (or done: skipped/unchanged/large,
+                                                              or error)
+
+Embeddings that came back from the API but were not committed to Postgres yet are kept
+in the journal too (as packed float32), so a resumed run writes them without paying
+for them again. `pipeline.py --resume` reopens the latest unfinished run and skips every
+URL already written or done, so recovery time tracks the remaining work rather than the
+size of the sheet.
+
+PDFs streamed a page range at a time also get a checkpoint once each range is committed:
+the next page, the chunker's carry-over words and the file's content hash. A resumed run
+continues such a document from that page (if the file is unchanged) instead of page 0.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+STAGES = ("probed", "extracted", "chunked", "embedded", "written", "done", "error")
+COMPLETE_STAGES = ("written", "done")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+  run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  source TEXT,
+  started_at REAL NOT NULL,
+  finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS url_stages (
+  run_id INTEGER NOT NULL,
+  url TEXT NOT NULL,
+  stage TEXT NOT NULL,
+  detail TEXT,
+  updated_at REAL NOT NULL,
+  PRIMARY KEY (run_id, url)
+);
+CREATE TABLE IF NOT EXISTS pending_embeddings (
+  run_id INTEGER NOT NULL,
+  chunk_hash TEXT NOT NULL,
+  url TEXT NOT NULL,
+  vector BLOB NOT NULL,
+  PRIMARY KEY (run_id, chunk_hash)
+);
+CREATE TABLE IF NOT EXISTS stream_checkpoints (
+  run_id INTEGER NOT NULL,
+  url TEXT NOT NULL,
+  content_hash TEXT,
+  next_page INTEGER NOT NULL,
+  carry TEXT NOT NULL,
+  word_count INTEGER NOT NULL,
+  updated_at REAL NOT NULL,
+  PRIMARY KEY (run_id, url)
+);
+"""
+
+
+class RunJournal:
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self.run_id: Optional[int] = None
+        self.resumed = False
+
+    def start_run(self, source: str, resume: bool = False) -> int:
+        """Open a new run, or with resume=True the latest unfinished run for the same source."""
+        with self._lock:
+            if resume:
+                row = self._db.execute(
+                    "SELECT run_id FROM runs WHERE finished_at IS NULL AND source IS ? "
+                    "ORDER BY run_id DESC LIMIT 1", (source,)).fetchone()
+                if row:
+                    self.run_id, self.resumed = row[0], True
+                    return self.run_id
+            cur = self._db.execute("INSERT INTO runs (source, started_at) VALUES (?, ?)", (source, time.time()))
+            self.run_id, self.resumed = cur.lastrowid, False
+            return self.run_id
+
+    def completed_urls(self) -> Set[str]:
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT url FROM url_stages WHERE run_id = ? AND stage IN ({','.join('?' * len(COMPLETE_STAGES))})",
+                (self.run_id, *COMPLETE_STAGES)).fetchall()
+        return {r[0] for r in rows}
+
+    def stage_counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT stage, COUNT(*) FROM url_stages WHERE run_id = ? GROUP BY stage", (self.run_id,)).fetchall()
+        return dict(rows)
+
+    def mark(self, url: str, stage: str, detail: Optional[str] = None):
+        if stage not in STAGES:
+            raise ValueError(f"unknown stage: {stage}")
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO url_stages (run_id, url, stage, detail, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (self.run_id, url, stage, detail, time.time()))
+
+    # ---- embedded-but-unwritten chunks ----
+    def save_pending(self, url: str, hashes: Sequence[str], vecs: Sequence[Sequence[float]]):
+        rows = [(self.run_id, h, url, array("f", v).tobytes()) for h, v in zip(hashes, vecs)]
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "INSERT OR REPLACE INTO pending_embeddings (run_id, chunk_hash, url, vector) VALUES (?, ?, ?, ?)", rows)
+            self._db.execute("COMMIT")
+
+    def load_pending(self, hashes: Sequence[str]) -> Dict[str, List[float]]:
+        out: Dict[str, List[float]] = {}
+        with self._lock:
+            for i in range(0, len(hashes), 500):
+                part = list(hashes[i:i + 500])
+                rows = self._db.execute(
+                    f"SELECT chunk_hash, vector FROM pending_embeddings "
+                    f"WHERE run_id = ? AND chunk_hash IN ({','.join('?' * len(part))})",
+                    (self.run_id, *part)).fetchall()
+                for h, blob in rows:
+                    arr = array("f")
+                    arr.frombytes(blob)
+                    out[h] = arr.tolist()
+        return out
+
+    def clear_pending(self, hashes: Iterable[str]):
+        with self._lock:
+            self._db.executemany("DELETE FROM pending_embeddings WHERE run_id = ? AND chunk_hash = ?",
+                                 [(self.run_id, h) for h in hashes])
+
+    # ---- streamed documents ----
+    def save_checkpoint(self, url: str, content_hash: Optional[str], next_page: int, carry: str, word_count: int):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO stream_checkpoints "
+                "(run_id, url, content_hash, next_page, carry, word_count, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.run_id, url, content_hash, next_page, carry, word_count, time.time()))
+
+    def load_checkpoint(self, url: str, content_hash: Optional[str]) -> Optional[Dict]:
+        """{next_page, carry, word_count} saved for this file's content, or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT next_page, carry, word_count FROM stream_checkpoints "
+                "WHERE run_id = ? AND url = ? AND content_hash IS ?", (self.run_id, url, content_hash)).fetchone()
+        return {"next_page": row[0], "carry": row[1], "word_count": row[2]} if row else None
+
+    def clear_checkpoint(self, url: str):
+        with self._lock:
+            self._db.execute("DELETE FROM stream_checkpoints WHERE run_id = ? AND url = ?", (self.run_id, url))
+
+    def finish(self):
+        with self._lock:
+            self._db.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (time.time(), self.run_id))
+            self._db.execute("DELETE FROM pending_embeddings WHERE run_id = ?", (self.run_id,))
+            self._db.execute("DELETE FROM stream_checkpoints WHERE run_id = ?", (self.run_id,))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
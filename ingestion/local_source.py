@@ -0,0 +1,104 @@
+"""
+local_source.py — ingest files from disk instead of URLs
+
+A directory is walked recursively for .txt / .md / .pdf files, or a manifest lists one path
+per line (relative to the manifest). Each file becomes a local:///abs/path key (percent-encoded,
+so names with '#', '?' or '%' round-trip) so it shares crawl_state, the run journal and
+documents.source_url with the URL sources.
+
+A file is unchanged when its mtime + size signature matches the one recorded last time (no
+read at all), or when its content hash does. Text files are read through mmap: the hash and
+the UTF-8 decode both work on the mapping, so the file is never copied into a bytes object.
+PDFs are handed to the extraction pool by path.
+"""
+
+import mmap
+import os
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import quote, unquote, urlparse
+
+from ingestion import crawl_state
+
+SCHEME = "local://"
+TEXT_EXTENSIONS = (".txt", ".md")
+EXTENSIONS = TEXT_EXTENSIONS + (".pdf",)
+
+
+def is_local(url: str) -> bool:
+    return url.startswith(SCHEME)
+
+
+def local_url(path: str) -> str:
+    return SCHEME + quote(os.path.abspath(path).replace(os.sep, "/"), safe="/:")
+
+
+def path_of(url: str) -> str:
+    return unquote(urlparse(url).path)
+
+
+def _walk(root: str) -> Iterator[str]:
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for name in sorted(filenames):
+            if name.lower().endswith(EXTENSIONS) and not name.startswith("."):
+                yield os.path.join(dirpath, name)
+
+
+def local_urls(source: str) -> List[str]:
+    """local:// keys for a directory tree or a manifest file of paths (one per line, # comments)."""
+    if os.path.isdir(source):
+        return [local_url(p) for p in _walk(source)]
+    base = os.path.dirname(os.path.abspath(source))
+    urls = []
+    with open(source, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            path = os.path.join(base, os.path.expanduser(line))
+            if os.path.isdir(path):
+                urls.extend(local_url(p) for p in _walk(path))
+            else:
+                urls.append(local_url(path))
+    return list(dict.fromkeys(urls))  # a file listed twice is ingested once
+
+
+def signature(st: os.stat_result) -> str:
+    """Stored in crawl_state.last_modified: changes whenever the file is rewritten."""
+    return f"mtime_ns={st.st_mtime_ns} size={st.st_size}"
+
+
+def read_local(url: str, state: Optional[Dict] = None) -> Dict:
+    """
+    {"not_modified", "note", "validators"} for an unchanged file; {"path", "size", "validators"}
+    for a PDF; {"text", "validators", "size"} for a text file.
+    """
+    path = path_of(url)
+    st = os.stat(path)
+    validators = {"last_modified": signature(st)}
+    if state and state.get("last_modified") == validators["last_modified"]:
+        validators["content_hash"] = state.get("content_hash")
+        return {"not_modified": True, "note": "mtime-unchanged", "validators": validators}
+    if path.lower().endswith(".pdf"):
+        with open(path, "rb") as f:
+            validators["content_hash"] = _hash_file(f, st.st_size)
+        if state and state.get("content_hash") == validators["content_hash"]:
+            return {"not_modified": True, "note": "content-unchanged", "validators": validators}
+        return {"path": path, "size": st.st_size, "validators": validators}
+
+    with open(path, "rb") as f:
+        if st.st_size == 0:
+            return {"text": "", "size": 0, "note": "empty file", "validators": validators}
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            validators["content_hash"] = crawl_state.content_hash(mm)
+            if state and state.get("content_hash") == validators["content_hash"]:
+                return {"not_modified": True, "note": "content-unchanged", "validators": validators}
+            text = str(mm, "utf-8", errors="replace")
+    return {"text": text, "size": st.st_size, "validators": validators}
+
+
+def _hash_file(f, size: int) -> str:
+    if size == 0:
+        return crawl_state.content_hash(b"")
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return crawl_state.content_hash(mm)
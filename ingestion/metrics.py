@@ -0,0 +1,135 @@
+"""
+metrics.py — per-URL and per-run instrumentation for the ingestion pipeline
+
+Each URL carries a timings dict (phase -> seconds: probe, download, extract, chunk,
+dedupe, embed, insert) and a counters dict (bytes, chunks produced/new/skipped). When the
+URL finishes, RunMetrics folds them into run totals and appends one JSON line to the run
+log. At the end of the run it writes a Prometheus textfile (node_exporter textfile
+collector format, written atomically) and can list the slowest URLs.
+"""
+
+import heapq
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+PHASES = ("probe", "download", "extract", "chunk", "dedupe", "embed", "insert")
+
+
+@contextmanager
+def timed(timings: Dict[str, float], phase: str):
+    """Add the block's wall time to timings[phase]."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[phase] = timings.get(phase, 0.0) + time.perf_counter() - started
+
+
+def count(counters: Dict[str, float], name: str, n: float = 1):
+    counters[name] = counters.get(name, 0) + n
+
+
+class RunMetrics:
+    def __init__(self, log_path: Optional[str] = None, keep_slowest: int = 50):
+        self.started = time.time()
+        self.phases: Dict[str, List[float]] = {}  # phase -> [calls, seconds, max seconds]
+        self.counters: Dict[str, float] = {}
+        self.statuses: Dict[str, int] = {}
+        self.keep_slowest = keep_slowest
+        self._slow: List[tuple] = []  # min-heap of (elapsed, url, status, timings)
+        self._lock = threading.Lock()
+        self._log = None
+        if log_path:
+            os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+            self._log = open(log_path, "a", encoding="utf-8")
+
+    def event(self, event: str, **fields):
+        """Append one JSON line to the run log (no-op without a log)."""
+        if self._log is None:
+            return
+        line = json.dumps({"event": event, "ts": round(time.time(), 3), **fields}, default=str)
+        with self._lock:
+            self._log.write(line + "\n")
+            self._log.flush()
+
+    def url_done(self, url: str, status: str, timings: Dict[str, float], counters: Dict[str, float], elapsed: float):
+        with self._lock:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            for phase, seconds in timings.items():
+                agg = self.phases.setdefault(phase, [0, 0.0, 0.0])
+                agg[0] += 1
+                agg[1] += seconds
+                agg[2] = max(agg[2], seconds)
+            for name, n in counters.items():
+                self.counters[name] = self.counters.get(name, 0) + n
+            entry = (elapsed, url, status, dict(timings))
+            if len(self._slow) < self.keep_slowest:
+                heapq.heappush(self._slow, entry)
+            elif elapsed > self._slow[0][0]:
+                heapq.heapreplace(self._slow, entry)
+        self.event("url", url=url, status=status, elapsed_s=round(elapsed, 4),
+                   timings={k: round(v, 4) for k, v in timings.items()}, counters=counters)
+
+    def add_counters(self, counters: Dict[str, float]):
+        """Run-level counters that aren't attributable to one URL (retries, rate limits)."""
+        with self._lock:
+            for name, n in counters.items():
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    def slowest(self, n: int = 10) -> List[Dict]:
+        with self._lock:
+            top = sorted(self._slow, reverse=True)[:n]
+        return [{"url": url, "status": status, "elapsed_s": round(elapsed, 3),
+                 "timings": {k: round(v, 3) for k, v in sorted(timings.items(), key=lambda kv: -kv[1])}}
+                for elapsed, url, status, timings in top]
+
+    def summary(self) -> Dict:
+        with self._lock:
+            return {
+                "duration_s": round(time.time() - self.started, 3),
+                "urls": dict(self.statuses),
+                "phases": {p: {"calls": c, "seconds": round(s, 3), "max_s": round(m, 3)}
+                           for p, (c, s, m) in sorted(self.phases.items())},
+                "counters": dict(self.counters),
+            }
+
+    def prometheus(self, prefix: str = "ingest") -> str:
+        """Textfile-collector exposition of the last run (gauges; each run replaces the file)."""
+        s = self.summary()
+        lines = []
+
+        def gauge(name, help_text, samples):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            for labels, value in samples:
+                label_str = "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}" if labels else ""
+                lines.append(f"{prefix}_{name}{label_str} {value}")
+
+        gauge("run_duration_seconds", "Wall time of the last pipeline run.", [({}, s["duration_s"])])
+        gauge("run_finished_timestamp_seconds", "Unix time the last pipeline run finished.", [({}, round(time.time(), 3))])
+        gauge("run_urls", "URLs by outcome in the last run.", [({"status": k}, v) for k, v in sorted(s["urls"].items())])
+        gauge("run_phase_seconds", "Seconds spent per phase, summed over URLs.",
+              [({"phase": p}, v["seconds"]) for p, v in s["phases"].items()])
+        gauge("run_phase_calls", "URLs that went through each phase.",
+              [({"phase": p}, v["calls"]) for p, v in s["phases"].items()])
+        gauge("run_phase_max_seconds", "Slowest single URL per phase.",
+              [({"phase": p}, v["max_s"]) for p, v in s["phases"].items()])
+        for name, value in sorted(s["counters"].items()):
+            gauge(f"run_{name}", f"{name.replace('_', ' ')} in the last run.", [({}, value)])
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str, prefix: str = "ingest"):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus(prefix))
+        os.replace(tmp, path)  # the collector must never read a half-written file
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
@@ -0,0 +1,202 @@
+"""
+neardup.py — SimHash near-duplicate detection for chunks
+
+Government sites repeat blocks of almost identical text (disclaimers, navigation that
+survives extraction, versioned PDFs) whose chunk hashes all differ. Each chunk gets a
+64-bit SimHash over 3-word shingles, stored in documents.content_simhash. NearDupIndex
+splits fingerprints into 4 bands of 16 bits: two fingerprints within Hamming distance 3
+must agree on at least one band, so only same-band candidates are compared.
+
+A new chunk within max_distance of a stored chunk from a *different* URL is not embedded.
+A row in document_duplicates links it to the stored (canonical) chunk instead. Matches
+against the same URL are never linked: those are edits to that page and must be stored.
+Only committed chunks are added to the index (by the writer, after its commit), so a
+link never points at a chunk that a failed write left out of `documents`.
+"""
+
+import hashlib
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+BITS = 64
+BANDS = 4
+BAND_BITS = BITS // BANDS
+SHINGLE_WORDS = 3
+_MASK = (1 << BITS) - 1
+_LANE = 16  # bits per counter lane in the packed accumulator
+_LANE_MAX = (1 << _LANE) - 1  # features summed before the lanes are flushed
+_WORD = re.compile(r"\w+")
+
+# _SPREAD[k][v]: byte v of a feature at byte position k, one bit per 16-bit counter lane.
+# Summing these over all features counts, for every bit position, how many features set it.
+_SPREAD = [[sum(1 << (_LANE * (8 * k + i)) for i in range(8) if v >> i & 1) for v in range(256)] for k in range(8)]
+
+NEARDUP_DDL = """
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_simhash BIGINT;
+CREATE TABLE IF NOT EXISTS document_duplicates (
+  chunk_hash TEXT PRIMARY KEY,
+  canonical_chunk_hash TEXT NOT NULL,
+  source_url TEXT,
+  source_title TEXT,
+  source_type TEXT,
+  source_domain TEXT,
+  hamming_distance SMALLINT,
+  linked_at TIMESTAMPTZ DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS document_duplicates_canonical_idx ON document_duplicates (canonical_chunk_hash);
+"""
+
+LINK_COLUMNS = ("chunk_hash", "canonical_chunk_hash", "source_url", "source_title", "source_type",
+                "source_domain", "hamming_distance")
+
+
+def _features(text: str) -> List[int]:
+    words = _WORD.findall(text.lower())
+    if len(words) >= SHINGLE_WORDS:
+        words = [" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)]
+    return [int.from_bytes(hashlib.blake2b(w.encode("utf-8"), digest_size=8).digest(), "little") for w in words]
+
+
+def simhash(text: str) -> int:
+    """Unsigned 64-bit SimHash: bit j is set when most shingle hashes have bit j set."""
+    features = _features(text)
+    t0, t1, t2, t3, t4, t5, t6, t7 = _SPREAD
+    counts = [0] * BITS
+    for start in range(0, len(features), _LANE_MAX):
+        acc = 0
+        for f in features[start:start + _LANE_MAX]:
+            acc += (t0[f & 255] + t1[f >> 8 & 255] + t2[f >> 16 & 255] + t3[f >> 24 & 255]
+                    + t4[f >> 32 & 255] + t5[f >> 40 & 255] + t6[f >> 48 & 255] + t7[f >> 56])
+        for j in range(BITS):
+            counts[j] += (acc >> (_LANE * j)) & _LANE_MAX
+    out = 0
+    for j in range(BITS):
+        if 2 * counts[j] > len(features):
+            out |= 1 << j
+    return out
+
+
+def to_signed(h: int) -> int:
+    """Postgres BIGINT is signed."""
+    return h - (1 << BITS) if h >= 1 << (BITS - 1) else h
+
+
+def from_signed(h: int) -> int:
+    return h & _MASK
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class NearDupIndex:
+    def __init__(self, max_distance: int = 3):
+        if max_distance >= BANDS:
+            raise ValueError(f"{BANDS} bands only guarantee matches up to distance {BANDS - 1}")
+        self.max_distance = max_distance
+        self._bands: List[Dict[int, List[tuple]]] = [{} for _ in range(BANDS)]
+        self._url_ids: Dict[str, int] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def _add(self, h: int, chunk_hash: str, url: Optional[str]):
+        url_id = self._url_ids.setdefault(url, len(self._url_ids))
+        entry = (h, chunk_hash, url_id)
+        for b in range(BANDS):
+            self._bands[b].setdefault((h >> (b * BAND_BITS)) & 0xFFFF, []).append(entry)
+        self._size += 1
+
+    def _find(self, h: int, url: Optional[str]) -> Optional[Tuple[str, int]]:
+        url_id = self._url_ids.get(url)
+        best = None
+        for b in range(BANDS):
+            for other, chunk_hash, other_url in self._bands[b].get((h >> (b * BAND_BITS)) & 0xFFFF, ()):
+                if other_url == url_id:
+                    continue
+                d = hamming(h, other)
+                if d <= self.max_distance and (best is None or d < best[1]):
+                    best = (chunk_hash, d)
+        return best
+
+    def add(self, h: int, chunk_hash: str, url: Optional[str] = None):
+        with self._lock:
+            self._add(h, chunk_hash, url)
+
+    def add_many(self, entries: Iterable[Tuple[int, str, Optional[str]]]):
+        """Add (simhash, chunk_hash, url) entries, e.g. the rows a writer just committed."""
+        with self._lock:
+            for h, chunk_hash, url in entries:
+                self._add(h, chunk_hash, url)
+
+    def match(self, h: int, url: Optional[str]) -> Optional[Tuple[str, int]]:
+        """(canonical chunk_hash, distance) of the closest indexed chunk from another URL, or None."""
+        with self._lock:
+            return self._find(h, url)
+
+
+def ensure_schema(conn):
+    with conn.cursor() as cur:
+        cur.execute(NEARDUP_DDL)
+    conn.commit()
+
+
+def load_index(conn, index: NearDupIndex, batch_size: int = 50000) -> int:
+    """Fill the index from every stored chunk that has a fingerprint (server-side cursor)."""
+    n = 0
+    with conn.cursor(name="neardup_load") as cur:
+        cur.itersize = batch_size
+        cur.execute("SELECT content_simhash, chunk_hash, source_url FROM documents WHERE content_simhash IS NOT NULL")
+        for h, chunk_hash, url in cur:
+            index.add(from_signed(h), chunk_hash, url)
+            n += 1
+    conn.commit()
+    return n
+
+
+def count_missing(conn) -> int:
+    with conn.cursor() as cur:
+        cur.execute("SELECT count(*) FROM documents WHERE content_simhash IS NULL")
+        n = cur.fetchone()[0]
+    conn.commit()
+    return n
+
+
+def backfill(conn, batch_size: int = 1000) -> int:
+    """Compute content_simhash for stored rows that don't have one yet. Returns rows updated."""
+    from psycopg2.extras import execute_values
+
+    total = 0
+    while True:
+        with conn.cursor() as cur:
+            cur.execute("SELECT chunk_hash, content FROM documents WHERE content_simhash IS NULL AND chunk_hash IS NOT NULL "
+                        "LIMIT %s", (batch_size,))
+            rows = cur.fetchall()
+            if not rows:
+                break
+            execute_values(
+                cur,
+                "UPDATE documents d SET content_simhash = v.h FROM (VALUES %s) AS v(chunk_hash, h) "
+                "WHERE d.chunk_hash = v.chunk_hash",
+                [(chunk_hash, to_signed(simhash(content or ""))) for chunk_hash, content in rows],
+                template="(%s, %s::bigint)",
+            )
+        conn.commit()
+        total += len(rows)
+    return total
+
+
+def record_links(cur, links: Iterable[tuple]):
+    """Insert LINK_COLUMNS tuples into document_duplicates (inside the caller's transaction)."""
+    from psycopg2.extras import execute_values
+
+    links = sorted(links, key=lambda link: link[0])  # chunk_hash order, like the documents insert: no deadlocks between writers
+    if links:
+        execute_values(
+            cur,
+            f"INSERT INTO document_duplicates ({', '.join(LINK_COLUMNS)}) VALUES %s ON CONFLICT (chunk_hash) DO NOTHING",
+            links,
+        )
@@ -0,0 +1,120 @@
+"""
+pdf_extract.py — page-range text extraction for PDFs on disk, optionally on a process pool
+
+Large PDFs (USCIS policy manuals run to hundreds of pages) are split into contiguous page
+ranges; each worker process opens the same file itself, extracts its range and returns
+the page texts, and the ranges are reassembled in page order. Small documents go to the
+pool as a single range (or are extracted in-process below min_parallel_pages).
+
+iter_ranges() is the streaming form for PDFs too big to hold as text: fixed-size ranges
+are yielded in page order, with only a few extracted ahead on the pool, so memory holds a
+bounded number of ranges however long the document is.
+
+Workers only import this module (fitz / PyPDF2), never pipeline.py.
+"""
+
+import math
+import os
+from collections import deque
+from typing import Iterator, List, Optional, Tuple
+
+from ingestion import cpu_pool
+
+ENGINES = ("fitz", "pypdf2")
+
+
+def page_count(path: str, engine: str = "fitz") -> int:
+    if engine == "fitz":
+        import fitz  # pymupdf
+        with fitz.open(path) as doc:
+            return doc.page_count
+    from PyPDF2 import PdfReader
+    return len(PdfReader(path).pages)
+
+
+def extract_range(path: str, start: int, stop: int, engine: str = "fitz") -> List[Optional[str]]:
+    """
+    Texts of pages [start, stop). With fitz every page yields a string; with PyPDF2 a page
+    whose extraction raised yields None (the sequential code skipped those pages).
+    """
+    if engine == "fitz":
+        import fitz  # pymupdf
+        with fitz.open(path) as doc:
+            return [doc[i].get_text("text") for i in range(start, min(stop, doc.page_count))]
+    from PyPDF2 import PdfReader
+    reader = PdfReader(path)
+    out: List[Optional[str]] = []
+    for i in range(start, min(stop, len(reader.pages))):
+        try:
+            out.append(reader.pages[i].extract_text() or "")
+        except Exception:
+            out.append(None)
+    return out
+
+
+def extract_pages(path: str, engine: str = "fitz", processes: Optional[int] = None,
+                  min_parallel_pages: int = 64, min_pages_per_task: int = 16) -> List[Optional[str]]:
+    """
+    Text of every page in order. Documents with at least min_parallel_pages pages are split
+    into one range per worker (never smaller than min_pages_per_task) when processes > 1;
+    min_parallel_pages=0 sends even one-range documents to the pool.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"unknown PDF engine: {engine}")
+    processes = processes if processes is not None else (os.cpu_count() or 1)
+    total = page_count(path, engine)
+    if processes <= 1 or total < min_parallel_pages:
+        return extract_range(path, 0, total, engine)
+
+    per_task = max(min_pages_per_task, math.ceil(total / processes))
+    tasks = [(start, cpu_pool.submit(processes, extract_range, path, start, start + per_task, engine))
+             for start in range(0, total, per_task)]
+    pages: List[Optional[str]] = []
+    for start, (pool, fut) in tasks:  # submission order == page order
+        pages.extend(cpu_pool.result(processes, pool, fut, extract_range, path, start, start + per_task, engine))
+    return pages
+
+
+def page_count_any(path: str) -> int:
+    try:
+        return page_count(path, "fitz")
+    except Exception:
+        return page_count(path, "pypdf2")
+
+
+def extract_range_any(path: str, start: int, stop: int) -> List[Optional[str]]:
+    """extract_range() with fitz, falling back to PyPDF2 for this range only."""
+    try:
+        return extract_range(path, start, stop, "fitz")
+    except Exception:
+        return extract_range(path, start, stop, "pypdf2")
+
+
+def iter_ranges(path: str, total: int, pages_per_range: int, start_page: int = 0,
+                processes: Optional[int] = None) -> Iterator[Tuple[int, int, List[Optional[str]]]]:
+    """
+    (start, stop, page texts) for [start_page, total) in ranges of pages_per_range, in order.
+    With processes > 1 up to `processes` ranges are extracted ahead on the pool while the
+    caller works on the current one.
+    """
+    processes = processes if processes is not None else (os.cpu_count() or 1)
+    starts = range(start_page, total, max(1, pages_per_range))
+    if processes <= 1:
+        for start in starts:
+            stop = min(start + pages_per_range, total)
+            yield start, stop, extract_range_any(path, start, stop)
+        return
+    pending: deque = deque()
+    try:
+        for start in starts:
+            stop = min(start + pages_per_range, total)
+            pending.append((start, stop, *cpu_pool.submit(processes, extract_range_any, path, start, stop)))
+            if len(pending) > processes:
+                first, last, pool, fut = pending.popleft()
+                yield first, last, cpu_pool.result(processes, pool, fut, extract_range_any, path, first, last)
+        while pending:
+            first, last, pool, fut = pending.popleft()
+            yield first, last, cpu_pool.result(processes, pool, fut, extract_range_any, path, first, last)
+    finally:
+        for _, _, _, fut in pending:  # the caller stopped early
+            fut.cancel()
@@ -0,0 +1,86 @@
+"""
+probe.py — one HEAD probe per URL, cached
+
+A probe records what the pipeline needs to route and fetch a URL: the final URL after
+redirects, content type, content length and the validators (ETag / Last-Modified).
+Results are cached in process for the run and can be persisted to a JSON file so the
+next run can classify URLs without probing them again. Persisted entries expire after
+a TTL, and the HTTP status is not persisted: a 304 only means something relative to the
+validators we sent on that run. Neither is a probe without a content type (a 304 HEAD
+usually carries none): cached that way, a PDF served from an extension-less URL would take
+the HTML path on the next run instead of being probed again.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+PROBE_FIELDS = ("ok", "final_url", "content_type", "content_length", "etag", "last_modified", "probed_at")
+
+
+def probe_from_response(url: str, resp) -> Dict:
+    """
+    Probe dict from a HEAD response (or None when the HEAD failed). "ok" is False when the
+    HEAD errored or got a 4xx/5xx (many servers reject HEAD), so its headers can't be trusted.
+    """
+    if resp is None:
+        return {"url": url, "status": None, "ok": False, "final_url": None, "content_type": "",
+                "content_length": None, "etag": None, "last_modified": None, "probed_at": time.time()}
+    length = resp.headers.get("Content-Length")
+    return {
+        "url": url,
+        "status": resp.status_code,
+        "ok": resp.status_code < 400,
+        "final_url": resp.url or url,
+        "content_type": (resp.headers.get("Content-Type") or "").lower(),
+        "content_length": int(length) if length and length.isdigit() else None,
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+        "probed_at": time.time(),
+    }
+
+
+class ProbeCache:
+    """Thread-safe URL -> probe cache, optionally loaded from / saved to a JSON file."""
+
+    def __init__(self, path: Optional[str] = None, ttl_seconds: float = 24 * 3600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._probes: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                saved = json.load(f)
+        except Exception as e:
+            print(f"Probe cache {self.path} unreadable, starting empty: {e}")
+            return
+        cutoff = time.time() - self.ttl_seconds
+        for url, probe in saved.items():
+            if (probe.get("probed_at") or 0) >= cutoff:
+                # status is per-run (see module docstring)
+                self._probes[url] = {"url": url, "status": None, **probe}
+
+    def get(self, url: str) -> Optional[Dict]:
+        with self._lock:
+            return self._probes.get(url)
+
+    def put(self, url: str, probe: Dict):
+        with self._lock:
+            self._probes[url] = probe
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = {url: {k: p.get(k) for k in PROBE_FIELDS}
+                    for url, p in self._probes.items() if p.get("ok") and p.get("content_type")}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
@@ -0,0 +1,206 @@
+"""
+source_snapshot.py — what the URL source listed last run, for incremental runs
+
+One row per (source, URL) with the row's optional "last modified" and "priority" columns as
+the sheet had them. Each run diffs the current rows against it:
+- new: not listed before (or listed, removed and now back); ingested first
+- changed: the row's last-modified value differs
+- unchanged: left to the conditional re-crawl, or skipped entirely with --skip-unchanged
+- removed: no longer listed; marked removed_at and queued until --prune-removed deletes
+  their chunks
+
+A chunk is stored once, under the first URL that produced it; later URLs with the same
+chunk_hash skip it. document_chunk_sources records those other URLs, so pruning the owner
+can send them back for re-ingestion instead of silently losing the chunk.
+"""
+
+import re
+from typing import Container, Dict, Iterable, List, Optional, Tuple
+
+SOURCE_SNAPSHOT_DDL = """
+CREATE TABLE IF NOT EXISTS source_snapshot (
+  source TEXT NOT NULL,
+  source_url TEXT NOT NULL,
+  row_modified TEXT,
+  priority TEXT,
+  first_seen_at TIMESTAMPTZ DEFAULT now(),
+  last_seen_at TIMESTAMPTZ,
+  removed_at TIMESTAMPTZ,
+  PRIMARY KEY (source, source_url)
+);
+CREATE TABLE IF NOT EXISTS document_chunk_sources (
+  chunk_hash TEXT NOT NULL,
+  source_url TEXT NOT NULL,
+  PRIMARY KEY (chunk_hash, source_url)
+);
+"""
+
+MODIFIED_HEADERS = ("last modified", "last_modified", "modified", "updated", "last updated")
+PRIORITY_HEADERS = ("priority",)
+
+
+def rows_from_values(values: List[List[str]]) -> List[Dict]:
+    """
+    Sheet values -> [{url, modified, priority}]. URLs are the first column; with a header row
+    (first cell starting with "url") the modified / priority columns are found by name.
+    """
+    if not values:
+        return []
+    modified_col = priority_col = None
+    if values[0] and values[0][0].lower().strip().startswith("url"):
+        header = [h.lower().strip() for h in values[0]]
+        modified_col = next((i for i, h in enumerate(header) if h in MODIFIED_HEADERS), None)
+        priority_col = next((i for i, h in enumerate(header) if h in PRIORITY_HEADERS), None)
+        values = values[1:]
+
+    def cell(row, col):
+        return row[col].strip() or None if col is not None and col < len(row) else None
+
+    rows, seen = [], set()
+    for row in values:
+        url = row[0].strip() if row else ""
+        if url and url not in seen:
+            seen.add(url)
+            rows.append({"url": url, "modified": cell(row, modified_col), "priority": cell(row, priority_col)})
+    return rows
+
+
+def _priority_key(row: Dict):
+    # "1", "P1", "p 2": lower numbers first; rows without a priority keep their order, last
+    m = re.search(r"\d+(\.\d+)?", row.get("priority") or "")
+    return (0, float(m.group())) if m else (1, 0.0)
+
+
+def ensure_table(conn):
+    with conn.cursor() as cur:
+        cur.execute(SOURCE_SNAPSHOT_DDL)
+    conn.commit()
+
+
+def record_chunk_sources(cur, pairs: Iterable[Tuple[str, str]]):
+    """
+    Insert (chunk_hash, source_url) pairs for chunks a URL skipped because they were already
+    stored (inside the caller's transaction).
+    """
+    from psycopg2.extras import execute_values
+
+    pairs = sorted(set(pairs))  # key order, like the documents insert: no deadlocks between writers
+    if pairs:
+        execute_values(cur, "INSERT INTO document_chunk_sources (chunk_hash, source_url) VALUES %s "
+                            "ON CONFLICT DO NOTHING", pairs)
+
+
+def load(conn, source: str) -> Dict[str, Dict]:
+    """{url: {modified, priority, removed}} as of the last run of this source."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT source_url, row_modified, priority, removed_at IS NOT NULL FROM source_snapshot "
+                    "WHERE source = %s", (source,))
+        rows = cur.fetchall()
+    conn.commit()
+    return {r[0]: {"modified": r[1], "priority": r[2], "removed": r[3]} for r in rows}
+
+
+def diff(rows: List[Dict], snapshot: Dict[str, Dict]) -> Dict[str, List]:
+    """{"new", "changed", "unchanged": [row], "removed": [url]}, each group in priority order."""
+    out = {"new": [], "changed": [], "unchanged": [], "removed": []}
+    listed = set()
+    for row in rows:
+        listed.add(row["url"])
+        prev = snapshot.get(row["url"])
+        if prev is None or prev["removed"]:
+            out["new"].append(row)
+        elif (row.get("modified") or None) != prev["modified"]:
+            out["changed"].append(row)
+        else:
+            out["unchanged"].append(row)
+    for group in ("new", "changed", "unchanged"):
+        out[group].sort(key=_priority_key)
+    out["removed"] = [url for url, prev in snapshot.items() if url not in listed and not prev["removed"]]
+    return out
+
+
+def save(conn, source: str, rows: List[Dict], removed: List[str]):
+    """Record this run's rows and mark removed URLs (queued for prune_removed)."""
+    from psycopg2.extras import execute_values
+
+    with conn.cursor() as cur:
+        if rows:
+            execute_values(
+                cur,
+                """
+                INSERT INTO source_snapshot (source, source_url, row_modified, priority, last_seen_at)
+                VALUES %s
+                ON CONFLICT (source, source_url) DO UPDATE SET
+                  row_modified = EXCLUDED.row_modified,
+                  priority = EXCLUDED.priority,
+                  last_seen_at = now(),
+                  removed_at = NULL
+                """,
+                [(source, r["url"], r.get("modified"), r.get("priority")) for r in rows],
+                template="(%s, %s, %s, %s, now())",
+            )
+        if removed:
+            cur.execute("UPDATE source_snapshot SET removed_at = now() WHERE source = %s AND source_url = ANY(%s)",
+                        (source, removed))
+    conn.commit()
+
+
+def pending_removals(conn, source: Optional[str] = None) -> List[str]:
+    """Removed URLs not still listed by any source (those keep their chunks)."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT DISTINCT s.source_url FROM source_snapshot s
+            WHERE s.removed_at IS NOT NULL AND (%s IS NULL OR s.source = %s)
+              AND NOT EXISTS (SELECT 1 FROM source_snapshot l
+                              WHERE l.source_url = s.source_url AND l.removed_at IS NULL)
+            """,
+            (source, source),
+        )
+        urls = [r[0] for r in cur.fetchall()]
+    conn.commit()
+    return urls
+
+
+def unchanged_to_crawl(unchanged: List[Dict], known: Container[str]) -> List[Dict]:
+    """
+    --skip-unchanged: the unchanged rows still worth crawling, i.e. URLs with no crawl state
+    (never processed successfully, or sent back for re-ingestion by prune_removed).
+    """
+    return [r for r in unchanged if r["url"] not in known]
+
+
+def prune_removed(conn, urls: List[str]) -> Tuple[Dict[str, int], List[str]]:
+    """
+    Delete removed URLs' chunks, near-duplicate links, large-document rows and crawl state in
+    one transaction. Other URLs that relied on a deleted chunk (linked to it as a near-duplicate,
+    or skipped it as an exact duplicate, see document_chunk_sources) lose that content, so their
+    crawl state is dropped to re-ingest them.
+
+    Returns (counts, URLs whose crawl state was deleted). Callers holding crawl state in
+    memory must forget those URLs too, or a URL that is crawled again in the same run sends
+    its old validators, gets a 304 / same content hash, and is never re-ingested.
+    """
+    counts = {"urls": len(urls)}
+    if not urls:
+        return counts, []
+    removed = set(urls)
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM documents WHERE source_url = ANY(%s) RETURNING chunk_hash", (urls,))
+        hashes = [r[0] for r in cur.fetchall()]
+        counts["chunks"] = len(hashes)
+        cur.execute("DELETE FROM document_duplicates WHERE source_url = ANY(%s) OR canonical_chunk_hash = ANY(%s) "
+                    "RETURNING chunk_hash, source_url", (urls, hashes))
+        links = cur.fetchall()
+        counts["links"] = len(links)
+        # a removed URL's linked chunk hashes also counted as stored for URLs that came later
+        hashes += [h for h, url in links if url in removed]
+        cur.execute("DELETE FROM document_chunk_sources WHERE source_url = ANY(%s) OR chunk_hash = ANY(%s) "
+                    "RETURNING source_url", (urls, hashes))
+        orphaned = sorted(({url for _, url in links} | {r[0] for r in cur.fetchall()}) - removed)
+        cur.execute("DELETE FROM documents_large WHERE source_url = ANY(%s)", (urls,))
+        cur.execute("DELETE FROM crawl_state WHERE source_url = ANY(%s)", (urls + orphaned,))
+        counts["reingest"] = len(orphaned)
+        cur.execute("DELETE FROM source_snapshot WHERE source_url = ANY(%s) AND removed_at IS NOT NULL", (urls,))
+    conn.commit()
+    return counts, urls + orphaned
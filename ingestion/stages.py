@@ -0,0 +1,196 @@
+"""
+stages.py — bounded-queue stage runner for the ingestion pipeline
+
+A Stage owns a bounded inbox queue and a pool of worker threads. Each worker takes an
+item, runs `fn(item)` (a generator or an iterable of outputs; empty = item finished
+here) and pushes every output into the next stage's inbox. Because every inbox is
+bounded, a slow stage blocks the ones upstream of it instead of letting work pile up
+in memory, and each stage runs at its own concurrency, so the wall-clock time tends to
+the slowest stage rather than the sum of all of them.
+
+A BatchSink is the terminal stage: a thread that groups incoming items and hands them
+to `flush(items)` once they reach `max_size` (by `size_of`) or have waited `max_wait`
+seconds, which is what a Postgres writer wants. With workers > 1 there is one such
+thread (and inbox) per worker, flushing concurrently; `key(item)` picks the worker, so
+items with the same key are always flushed by the same thread, in the order they came.
+
+Shutdown: close() on the first stage; when the last worker of a stage exits it closes
+the next stage, so join() on the last stage returns once everything has drained.
+"""
+
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+_STOP = object()
+
+
+class Stage:
+    def __init__(self, name: str, fn: Callable, workers: int, next_stage=None,
+                 maxsize: int = 16, on_error: Optional[Callable] = None):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.next_stage = next_stage
+        self.on_error = on_error
+        self.inbox: queue.Queue = queue.Queue(maxsize=maxsize)
+        self.stats: Dict[str, float] = {"items": 0, "outputs": 0, "errors": 0, "busy_seconds": 0.0, "max_queue": 0}
+        self._lock = threading.Lock()
+        self._alive = 0
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        self._alive = self.workers
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def put(self, item):
+        self.inbox.put(item)
+        depth = self.inbox.qsize()
+        if depth > self.stats["max_queue"]:
+            with self._lock:
+                self.stats["max_queue"] = max(self.stats["max_queue"], depth)
+
+    def close(self):
+        for _ in range(self.workers):
+            self.inbox.put(_STOP)
+
+    def join(self):
+        for t in self._threads:
+            t.join()
+
+    def _run(self):
+        while True:
+            item = self.inbox.get()
+            if item is _STOP:
+                break
+            started = time.perf_counter()
+            outputs = errors = 0
+            try:
+                for out in self.fn(item) or ():
+                    # time spent blocked downstream isn't this stage's work
+                    busy = time.perf_counter() - started
+                    if self.next_stage is not None:
+                        self.next_stage.put(out)
+                    outputs += 1
+                    started = time.perf_counter() - busy
+            except Exception as e:
+                errors = 1
+                if self.on_error is not None:
+                    self.on_error(item, e)
+                else:
+                    print(f"[{self.name}] unhandled error: {e}")
+            with self._lock:
+                self.stats["items"] += 1
+                self.stats["outputs"] += outputs
+                self.stats["errors"] += errors
+                self.stats["busy_seconds"] += time.perf_counter() - started
+        with self._lock:
+            self._alive -= 1
+            last = self._alive == 0
+        if last and self.next_stage is not None:
+            self.next_stage.close()
+
+
+class BatchSink:
+    def __init__(self, name: str, flush: Callable[[List], None], max_size: int = 500, max_wait: float = 2.0,
+                 size_of: Callable = lambda item: 1, maxsize: int = 16, on_error: Optional[Callable] = None,
+                 workers: int = 1, key: Optional[Callable] = None):
+        self.name = name
+        self.flush = flush
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self.size_of = size_of
+        self.on_error = on_error
+        self.workers = max(1, workers)
+        self.key = key
+        self.inboxes: List[queue.Queue] = [queue.Queue(maxsize=maxsize) for _ in range(self.workers)]
+        self.stats: Dict[str, float] = {"items": 0, "flushes": 0, "busy_seconds": 0.0, "max_queue": 0}
+        self._lock = threading.Lock()
+        self._next = 0
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        for i, inbox in enumerate(self.inboxes):
+            name = self.name if self.workers == 1 else f"{self.name}-{i}"
+            t = threading.Thread(target=self._run, args=(inbox,), name=name, daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def put(self, item):
+        if self.workers == 1:
+            inbox = self.inboxes[0]
+        elif self.key is not None:
+            inbox = self.inboxes[hash(self.key(item)) % self.workers]
+        else:
+            with self._lock:
+                self._next = (self._next + 1) % self.workers
+                inbox = self.inboxes[self._next]
+        inbox.put(item)
+        depth = inbox.qsize()
+        if depth > self.stats["max_queue"]:
+            with self._lock:
+                self.stats["max_queue"] = max(self.stats["max_queue"], depth)
+
+    def close(self):
+        for inbox in self.inboxes:
+            inbox.put(_STOP)
+
+    def join(self):
+        for t in self._threads:
+            t.join()
+
+    def _flush(self, items: List):
+        if not items:
+            return
+        started = time.perf_counter()
+        try:
+            self.flush(items)
+        except Exception as e:  # flush() is expected to isolate per-item failures itself
+            print(f"[{self.name}] flush failed: {e}")
+            if self.on_error is not None:
+                self.on_error(items, e)
+        with self._lock:
+            self.stats["flushes"] += 1
+            self.stats["items"] += len(items)
+            self.stats["busy_seconds"] += time.perf_counter() - started
+
+    def _run(self, inbox: queue.Queue):
+        pending: List = []
+        size = 0
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = inbox.get(timeout=timeout)
+            except queue.Empty:
+                self._flush(pending)
+                pending, size, deadline = [], 0, None
+                continue
+            if item is _STOP:
+                self._flush(pending)
+                return
+            pending.append(item)
+            size += self.size_of(item)
+            if deadline is None:
+                deadline = time.monotonic() + self.max_wait
+            if size >= self.max_size:
+                self._flush(pending)
+                pending, size, deadline = [], 0, None
+
+
+def run_stages(stages: Iterable, items: Iterable):
+    """Start every stage, feed `items` into the first one, and wait for the pipeline to drain."""
+    stages = list(stages)
+    for stage in stages:
+        stage.start()
+    for item in items:
+        stages[0].put(item)
+    stages[0].close()
+    for stage in stages:
+        stage.join()
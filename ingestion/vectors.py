@@ -0,0 +1,108 @@
+"""
+vectors.py — compact pgvector serialization shared by the ingestion scripts
+
+psycopg2 only sends parameters as text, so a 1536-dim embedding used to travel as ~20 KB
+of decimal digits that Python had to format and Postgres had to parse. Instead rows are
+streamed with COPY ... FROM STDIN WITH (FORMAT BINARY) into a temp staging table:
+vectors go over the wire in pgvector's binary format (int16 dim, int16 unused, float32
+big-endian values), packed straight from an array('f') with no per-float formatting.
+
+Staging tables use `text` for every non-vector column (a text field's binary form is
+just its UTF-8 bytes); callers cast to the real column types in their INSERT ... SELECT.
+Staged vectors are always float32 `vector`s; pgvector's assignment cast stores them into
+`halfvec` columns too (see scripts/migrate_embeddings.py).
+"""
+
+import math
+import re
+import struct
+import sys
+from array import array
+from io import BytesIO
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+PGCOPY_TRAILER = struct.pack(">h", -1)
+_NULL_FIELD = struct.pack(">i", -1)
+
+VECTOR_TYPES = (list, tuple, array)
+STORAGE_TYPES = ("vector", "halfvec")  # float32 / float16; pgvector has no int8 vector type
+
+
+def pack_float32(values) -> bytes:
+    """Big-endian float32 buffer for a sequence of floats."""
+    arr = values if isinstance(values, array) and values.typecode == "f" else array("f", values)
+    if sys.byteorder == "little":
+        arr = array("f", arr)  # don't byteswap the caller's array in place
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def encode_vector(values) -> bytes:
+    """pgvector binary representation of one vector (what vector_recv expects)."""
+    return struct.pack(">HH", len(values), 0) + pack_float32(values)
+
+
+def decode_vector(buf: bytes) -> List[float]:
+    dim, _ = struct.unpack_from(">HH", buf)
+    arr = array("f", buf[4:4 + 4 * dim])
+    if sys.byteorder == "little":
+        arr.byteswap()
+    return arr.tolist()
+
+
+def _encode_field(value) -> bytes:
+    if value is None:
+        return _NULL_FIELD
+    if isinstance(value, VECTOR_TYPES):
+        data = encode_vector(value)
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        data = bytes(value)
+    else:
+        data = str(value).encode("utf-8")
+    return struct.pack(">i", len(data)) + data
+
+
+def binary_copy_buffer(rows: Iterable[Sequence]) -> BytesIO:
+    """
+    Build a COPY BINARY payload. Lists/tuples/array('f') are encoded as pgvector values,
+    None as NULL, everything else as text (the staging column must be `text`).
+    """
+    buf = BytesIO()
+    buf.write(PGCOPY_HEADER)
+    for row in rows:
+        buf.write(struct.pack(">h", len(row)))
+        for value in row:
+            buf.write(_encode_field(value))
+    buf.write(PGCOPY_TRAILER)
+    buf.seek(0)
+    return buf
+
+
+def copy_rows(cur, table: str, columns: Sequence[str], rows: Iterable[Sequence]):
+    """COPY rows into `table` (usually a temp staging table) using the binary format."""
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT BINARY)"
+    cur.copy_expert(sql, binary_copy_buffer(rows))
+
+
+def shorten(values: Sequence[float], dimensions: int) -> List[float]:
+    """First `dimensions` values, L2-normalized: what text-embedding-3 returns for dimensions=N."""
+    head = list(values[:dimensions])
+    norm = math.sqrt(sum(v * v for v in head)) or 1.0
+    return [v / norm for v in head]
+
+
+def column_type(conn, table: str, column: str) -> Tuple[Optional[str], Optional[int]]:
+    """(type name, declared dimensions) of a vector column, e.g. ("halfvec", 512); (None, None) if missing."""
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+            "WHERE attrelid = to_regclass(%s) AND attname = %s AND NOT attisdropped",
+            (table, column),
+        )
+        row = cur.fetchone()
+    conn.commit()
+    if not row:
+        return None, None
+    m = re.match(r"(\w+)(?:\((\d+)\))?", row[0].rsplit(".", 1)[-1])  # "public.vector(1536)" off search_path
+    return m.group(1), int(m.group(2)) if m.group(2) else None
@@ -3,6 +3,31 @@ import OpenAI from "openai";
 import { sql } from "@vercel/postgres";
 import openai from "../openaiClient.js";
 
+/**
+ * Embedding storage, matching scripts/migrate_embeddings.py and the ingestion scripts:
+ * EMBEDDING_DIMENSIONS (default 1536, the model's native size) and
+ * EMBEDDING_STORAGE ("vector" = float32, "halfvec" = float16).
+ */
+export const EMBEDDING_DIMENSIONS = parseInt(process.env.EMBEDDING_DIMENSIONS || "1536", 10);
+export const EMBEDDING_STORAGE = process.env.EMBEDDING_STORAGE === "halfvec" ? "halfvec" : "vector";
+
+/**
+ * vectorSearch(table, column, embedding, selectList, limit)
+ * ORDER BY column <=> query, with the query cast to the stored type so an ANN index applies.
+ * Identifiers come from our own code, never from user input.
+ */
+export async function vectorSearch(table, column, embedding, selectList, limit) {
+  const embLiteral = "[" + embedding.join(",") + "]";
+  const resp = await sql.query(
+    `SELECT ${selectList}, (${column} <=> $1::${EMBEDDING_STORAGE}) AS distance
+     FROM ${table}
+     ORDER BY ${column} <=> $1::${EMBEDDING_STORAGE}
+     LIMIT $2`,
+    [embLiteral, limit]
+  );
+  return resp.rows || [];
+}
+
 /**
  * createQueryEmbedding(text)
  */
@@ -10,6 +35,8 @@ export async function createQueryEmbedding(text) {
   const resp = await openai.embeddings.create({
     model: "text-embedding-3-small",
     input: text,
+    // shortened (and re-normalized) by the API to match the stored vectors
+    ...(EMBEDDING_DIMENSIONS !== 1536 ? { dimensions: EMBEDDING_DIMENSIONS } : {}),
   });
   return resp?.data?.[0]?.embedding || null;
 }
@@ -52,15 +79,11 @@ export async function retrieveCandidates(refinedQuery, opts = { limit: 40 }) {
 
   // 2) If we have an embedding, try pgvector ordering
   if (qEmb) {
-    const embLiteral = "[" + qEmb.join(",") + "]";
     try {
-      const resp = await sql`
-        SELECT id, content, source_title, source_url, source_file, embedding
-        FROM documents
-        ORDER BY embedding <=> ${embLiteral}::vector
-        LIMIT ${limit}
-      `;
-      const rows = resp.rows || [];
+      const rows = await vectorSearch(
+        "documents", "embedding", qEmb,
+        "id, content, source_title, source_url, source_file, embedding", limit
+      );
       if (rows.length > 0) return rows;
       // if empty, fall through to keyword search
     } catch (err) {
@@ -1,8 +1,7 @@
 // lib/rag/searchGold.js
 // Golden Answers search using dual embeddings (question + answer)
 
-import { sql } from "@vercel/postgres";
-import { createQueryEmbedding } from "./retriever.js";
+import { createQueryEmbedding, vectorSearch } from "./retriever.js";
 
 /**
  * Search gold_answers table using question embeddings
@@ -12,22 +11,10 @@ import { createQueryEmbedding } from "./retriever.js";
  */
 export async function searchGoldByQuestion(embedding, limit = 5) {
   try {
-    const embLiteral = "[" + embedding.join(",") + "]";
-    const resp = await sql`
-      SELECT 
-        id, 
-        question, 
-        gold_answer, 
-        sources,
-        human_confidence, 
-        verified_by,
-        last_verified,
-        (question_embedding <=> ${embLiteral}::vector) as distance
-      FROM public.gold_answers
-      ORDER BY distance ASC
-      LIMIT ${limit}
-    `;
-    return resp.rows || [];
+    return await vectorSearch(
+      "public.gold_answers", "question_embedding", embedding,
+      "id, question, gold_answer, sources, human_confidence, verified_by, last_verified", limit
+    );
   } catch (err) {
     console.warn("[searchGold] Question search failed:", err?.message || err);
     return [];
@@ -42,22 +29,10 @@ export async function searchGoldByQuestion(embedding, limit = 5) {
  */
 export async function searchGoldByAnswer(embedding, limit = 5) {
   try {
-    const embLiteral = "[" + embedding.join(",") + "]";
-    const resp = await sql`
-      SELECT 
-        id, 
-        question, 
-        gold_answer, 
-        sources,
-        human_confidence, 
-        verified_by,
-        last_verified,
-        (answer_embedding <=> ${embLiteral}::vector) as distance
-      FROM public.gold_answers
-      ORDER BY distance ASC
-      LIMIT ${limit}
-    `;
-    return resp.rows || [];
+    return await vectorSearch(
+      "public.gold_answers", "answer_embedding", embedding,
+      "id, question, gold_answer, sources, human_confidence, verified_by, last_verified", limit
+    );
   } catch (err) {
     console.warn("[searchGold] Answer search failed:", err?.message || err);
     return [];
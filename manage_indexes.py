@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+manage_indexes.py — pgvector ANN indexes for the tables the chat app searches
+
+Commands (default: every column in ingestion.indexes.TARGETS, or --target table.column):
+- status   rows, table size and each ANN index's method, size and validity
+- create   build missing indexes concurrently (HNSW unless --method ivfflat); build parameters and
+           maintenance_work_mem come from the row count, or --m / --ef-construction / --lists
+- drop     drop the indexes concurrently (before a large bulk load; pipeline.py --bulk-load does
+           drop + rebuild + ANALYZE by itself)
+- rebuild  drop and create again with parameters for the current row count
+- analyze  ANALYZE the tables so the planner has fresh statistics after ingestion
+Index build time and size are printed for every index built.
+
+Usage:
+  python manage_indexes.py status
+  python manage_indexes.py create
+  python manage_indexes.py rebuild --target documents.embedding --method ivfflat
+  python manage_indexes.py analyze
+
+Environment variables:
+  POSTGRES_URL                  - Neon PostgreSQL connection string
+  INDEX_MAINTENANCE_WORK_MEM_MB - cap on the build's maintenance_work_mem (default 1024)
+  INDEX_PARALLEL_WORKERS        - max_parallel_maintenance_workers for builds (default 2)
+"""
+
+import argparse
+import json
+import os
+
+import psycopg2
+
+from ingestion import indexes
+
+
+def _mb(n: int) -> str:
+    return f"{n / 2 ** 20:.1f} MB"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("status", "create", "drop", "rebuild", "analyze"))
+    parser.add_argument("--target", action="append",
+                        help="[schema.]table.column to manage (repeatable; default: documents and gold_answers embeddings)")
+    parser.add_argument("--method", choices=indexes.METHODS, default="hnsw")
+    parser.add_argument("--m", type=int, help="HNSW m (default: from the row count)")
+    parser.add_argument("--ef-construction", type=int, help="HNSW ef_construction (default: from the row count)")
+    parser.add_argument("--lists", type=int, help="IVFFlat lists (default: from the row count)")
+    parser.add_argument("--blocking", action="store_true",
+                        help="plain CREATE/DROP INDEX (faster, but locks out writes; for maintenance windows)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    return parser.parse_args(argv)
+
+
+def _params(args):
+    if args.method == "ivfflat":
+        return {"lists": args.lists} if args.lists else None
+    if args.m or args.ef_construction:
+        params = indexes.build_params("hnsw", 0)
+        params.update({k: v for k, v in (("m", args.m), ("ef_construction", args.ef_construction)) if v})
+        return params
+    return None
+
+
+def _report_built(result, as_json):
+    if as_json:
+        print(json.dumps(result))
+    else:
+        params = ", ".join(f"{k}={v}" for k, v in result["params"].items())
+        print(f"  built {result['name']} ({result['method']}: {params}) over {result['rows']} rows "
+              f"in {result['seconds']:.1f}s, {_mb(result['bytes'])} "
+              f"(maintenance_work_mem {result['maintenance_work_mem_mb']} MB)")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not os.getenv("POSTGRES_URL"):
+        raise SystemExit("Set POSTGRES_URL")
+    targets = [tuple(t.rsplit(".", 1)) for t in args.target] if args.target else indexes.TARGETS
+    if any(len(t) != 2 for t in targets):
+        raise SystemExit("--target must look like table.column")
+    concurrently = not args.blocking
+
+    conn = psycopg2.connect(os.getenv("POSTGRES_URL"))
+    try:
+        if args.command == "analyze":
+            timings = indexes.analyze(conn, [table for table, _ in targets])
+            print(json.dumps(timings) if args.json else
+                  "\n".join(f"  analyzed {t} in {s:.2f}s" for t, s in timings.items()))
+            return
+        if args.command == "status":
+            rows = indexes.status(conn, targets)
+            if args.json:
+                print(json.dumps(rows, indent=2))
+            for row in [] if args.json else rows:
+                print(f"{row['table']}.{row['column']} {row['type']}: {row['rows']} rows, table {_mb(row['table_bytes'])}")
+                for idx in row["indexes"] or [{"name": None}]:
+                    if idx["name"] is None:
+                        print("  no ANN index: searches scan every vector (run: manage_indexes.py create)")
+                    else:
+                        print(f"  {idx['name']} {idx['method']} {_mb(idx['bytes'])}"
+                              f"{'' if idx['valid'] else ' INVALID (interrupted build; create drops and rebuilds it)'}")
+            return
+        for table, column in targets:
+            print(f"{table}.{column}:")
+            if args.command in ("drop", "rebuild"):
+                for idx in indexes.drop_indexes(conn, table, column, concurrently=concurrently):
+                    print(f"  dropped {idx['name']} ({_mb(idx['bytes'])})")
+            if args.command in ("create", "rebuild"):
+                result = indexes.create_index(conn, table, column, args.method, _params(args),
+                                              concurrently=concurrently)
+                if result:
+                    _report_built(result, args.json)
+                    if result["method"] == "ivfflat" and result["rows"] < indexes.IVFFLAT_MIN_ROWS:
+                        print(f"  note: IVFFlat over {result['rows']} rows has poor centroids; "
+                              "rebuild once the table is larger, or use HNSW")
+                else:
+                    print("  already indexed (or no such column)")
+        if args.command in ("create", "rebuild"):
+            indexes.analyze(conn, [table for table, _ in targets])
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,15 +3,40 @@
 pipeline.py — robust production ingestion pipeline
 
 Features:
-- Reads source URLs from a Google Sheet (first column)
+- Reads source URLs from a Google Sheet (first column), or a plain file with --urls-file
+- Diffs the source against its snapshot from the last run: new rows run first, then rows whose optional
+  "last modified" column changed; --skip-unchanged skips the rest, removed rows are queued for --prune-removed
+- --local DIR|MANIFEST ingests .txt/.md/.pdf files from disk (mmap reads, no HTTP), keyed local:///path;
+  files whose mtime/size or content hash are unchanged since the last run are skipped
 - Detects URL type: PDF, Google Doc, or webpage
-- For PDFs: checks content-length via HEAD. If >= 100 MB, records in documents_large and skips embedding.
-- Extracts text with PyMuPDF (fitz) -> fallback PyPDF2
-- Scrapes HTML using requests + BeautifulSoup
-- Reads Google Docs via Google Docs API
-- Chunks text, creates embeddings (OpenAI), writes to `documents` table with embedding::vector
+- Probes each URL once (HEAD, cached; optionally persisted with --probe-cache) for type, size and validators
+- PDFs of MAX_PDF_STORE_MB (100 MB) or more are streamed: PDF_STREAM_PAGES pages are extracted at a time,
+  chunked across page boundaries (same chunks as a whole-text pass), embedded and written before later
+  ranges, with a run-journal checkpoint per range so --resume continues mid-document; only PDFs over
+  MAX_PDF_STREAM_MB (known from the probe's content-length or the download) go to documents_large unembedded
+- Streams PDFs to a temp file (aborting past the size cap) and extracts text with PyMuPDF (fitz) -> fallback PyPDF2,
+  splitting large PDFs' page ranges across a process pool (PDF_EXTRACT_PROCESSES)
+- Scrapes HTML using requests + a streaming lxml extractor (BeautifulSoup fallback), parsed on the same process pool
+- Reads Google Docs via Google Docs API (paragraphs and tables) on the fetch threads; Drive folder URLs
+  expand to their docs, and docs whose Drive modifiedTime is unchanged are skipped (batched Drive lookups)
+- Chunks text, creates embeddings (OpenAI; EMBEDDING_DIMENSIONS to shorten them), bulk-writes to `documents` via binary COPY (pgvector wire format)
 - Defensive handling so no undefined variables are used
-- Retries and logging
+- Retries and logging; per-host concurrency / rate limits (HOST_MAX_CONCURRENCY, HOST_RPS, HOST_LIMITS)
+  that back off on 429s, with per-host error and latency stats at the end of the run
+- Runs as stages joined by bounded queues: fetch threads (--workers) -> extraction process pool
+  (--extract-workers) -> embedding workers (--embed-workers) -> batching Postgres writers (--writers, each
+  URL always on the same writer; --write-batch-rows rows per commit); per-URL errors are isolated
+- Database connections come from a shared pool (ingestion/db.py): connects are retried while a Neon
+  compute wakes up, dropped connections are replaced and a failed write is retried on a fresh one
+- Conditional re-crawl: ETag / Last-Modified / content hash per URL in `crawl_state`; unchanged pages are skipped
+- Checkpoints every URL's stage in a local run journal; --resume continues an interrupted run
+- Near-duplicate chunks (64-bit SimHash, NEAR_DUP_MAX_DISTANCE bits apart) of a chunk already stored for
+  another URL are linked in `document_duplicates` instead of embedded (--backfill-simhash for older rows)
+- Per-URL phase timings (probe, download, extract, chunk, dedupe, embed, insert), bytes, chunk and
+  retry counters in a JSON-lines run log, an optional Prometheus textfile (--prom-file) and a
+  slowest-URLs report
+- ANALYZEs the tables it wrote after each run; --bulk-load drops the documents.embedding ANN index for the
+  load and rebuilds it afterwards, sized for the new row count (see manage_indexes.py)
 """
 
 import os
@@ -19,23 +44,28 @@ import json
 import time
 import hashlib
 import math
-from io import BytesIO
+import argparse
+import tempfile
+import threading
 from urllib.parse import urlparse
-from typing import List, Dict, Optional
+from typing import List, Dict, Iterable, Optional
 
 import requests
 from requests.adapters import HTTPAdapter, Retry
-from bs4 import BeautifulSoup
 import gspread
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
 
-import openai
-import psycopg2
-
-# PDF libs
-import fitz  # pymupdf
-from PyPDF2 import PdfReader
+from ingestion import (cpu_pool, crawl_state, db, gdocs, html_extract, indexes, local_source, neardup,
+                       pdf_extract, source_snapshot, vectors)
+from ingestion.chunking import ChunkedText, StreamChunker
+from ingestion.embed_cache import EmbeddingCache
+from ingestion.embeddings import EmbeddingScheduler
+from ingestion.hosts import THROTTLE_STATUSES, HostLimiter, interleave_by_host, parse_host_limits
+from ingestion.journal import RunJournal
+from ingestion.metrics import RunMetrics, count, timed
+from ingestion.probe import ProbeCache, probe_from_response
+from ingestion.stages import BatchSink, Stage, run_stages
 
 # ---- Config - environment variables ----
 POSTGRES_URL = os.getenv("POSTGRES_URL")
@@ -43,27 +73,59 @@ GOOGLE_SHEET_ID = os.getenv("GOOGLE_SHEET_ID")
 GOOGLE_APPLICATION_CREDENTIALS_JSON = os.getenv("GOOGLE_APPLICATION_CREDENTIALS_JSON")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-if not all([POSTGRES_URL, GOOGLE_SHEET_ID, GOOGLE_APPLICATION_CREDENTIALS_JSON, OPENAI_API_KEY]):
-    raise SystemExit("Missing env var: POSTGRES_URL, GOOGLE_SHEET_ID, GOOGLE_APPLICATION_CREDENTIALS_JSON, or OPENAI_API_KEY")
-
-openai.api_key = OPENAI_API_KEY
-
 EMBEDDING_MODEL = "text-embedding-3-small"
-VECTOR_DIMENSION = 1536
+VECTOR_DIMENSION = int(os.getenv("EMBEDDING_DIMENSIONS", "1536"))  # < 1536 asks the API for shortened vectors
 CHUNK_SIZE_WORDS = 400  # Increased from 300 for better context
 CHUNK_OVERLAP = 80      # Increased from 50 for better continuity
-BATCH_SIZE = 100
-MAX_PDF_STORE_MB = 100  # If PDF size >= this, store metadata in documents_large and skip embedding
+BATCH_SIZE = 100  # chunks per write/commit; the embedder splits them into requests by token budget
+EMBED_RPM = float(os.getenv("EMBED_RPM", "3000"))            # requests/minute for our OpenAI tier
+EMBED_TPM = float(os.getenv("EMBED_TPM", "1000000"))         # tokens/minute for our OpenAI tier
+EMBED_MAX_IN_FLIGHT = int(os.getenv("EMBED_MAX_IN_FLIGHT", "4"))
+EMBED_REQUEST_TOKENS = int(os.getenv("EMBED_REQUEST_TOKENS", "60000"))  # token budget per embeddings request
+# local embedding cache shared with scripts/ingest_md_to_neon.py; EMBED_CACHE_DIR="" disables it
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "embeddings"))
+EMBED_CACHE_MAX_MB = int(os.getenv("EMBED_CACHE_MAX_MB", "2048"))
+MAX_PDF_STORE_MB = 100  # PDFs this size or larger are streamed range by range instead of extracted whole
+MAX_PDF_STREAM_MB = int(os.getenv("MAX_PDF_STREAM_MB", "2048"))  # above this, documents_large only (0 = no streaming)
+PDF_MAX_MB = max(MAX_PDF_STORE_MB, MAX_PDF_STREAM_MB)  # download / file size cap
+PDF_STREAM_PAGES = int(os.getenv("PDF_STREAM_PAGES", "32"))  # pages per streamed range (text held in memory per range)
 MIN_TEXT_WORDS = 20  # skip very small extractions
 REQUEST_TIMEOUT = 20
 HEAD_TIMEOUT = 8
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024  # streamed PDF downloads are written to disk in pieces this size
+DOWNLOAD_SPOOL_DIR = os.getenv("DOWNLOAD_SPOOL_DIR") or None  # temp dir for PDF downloads (default: system temp)
+PDF_EXTRACT_PROCESSES = int(os.getenv("PDF_EXTRACT_PROCESSES", str(os.cpu_count() or 1)))  # PDF/HTML parsing pool; 1 = in-process
+PDF_PARALLEL_MIN_PAGES = 0  # 0 = every PDF is parsed on the pool, off the pipeline threads
+PROBE_CACHE_TTL_HOURS = float(os.getenv("PROBE_CACHE_TTL_HOURS", "24"))  # persisted probes older than this are re-probed
+RUN_JOURNAL_PATH = os.getenv("RUN_JOURNAL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "runs", "journal.sqlite"))
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "8"))  # fetch threads (URLs downloaded concurrently)
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "4"))  # documents chunked and embedded concurrently
+STAGE_QUEUE_SIZE = int(os.getenv("STAGE_QUEUE_SIZE", "16"))  # items buffered between stages (backpressure)
+WRITE_BATCH_ROWS = int(os.getenv("WRITE_BATCH_ROWS", "500"))  # rows per COPY/commit in the writer stage
+DB_WRITERS = int(os.getenv("DB_WRITERS", "2"))  # writer threads flushing concurrently, one connection each
+WRITE_FLUSH_SECONDS = float(os.getenv("WRITE_FLUSH_SECONDS", "2"))  # writer flushes a partial batch after this
+HOST_MAX_CONCURRENCY = int(os.getenv("HOST_MAX_CONCURRENCY", "4"))  # concurrent requests per host
+HOST_RPS = float(os.getenv("HOST_RPS", "4"))  # request starts per second per host (0 = unpaced)
+HOST_LIMITS = os.getenv("HOST_LIMITS", "")  # per-host overrides, e.g. "www.uscis.gov=2/1.5" (concurrency/rps)
+HOST_POOLS = int(os.getenv("HOST_POOLS", "32"))  # hosts whose keep-alive pools are kept open
+HOST_THROTTLE_RETRIES = 3  # 429 retries, paced by the host limiter instead of urllib3 backoff
+NEAR_DUP_MAX_DISTANCE = int(os.getenv("NEAR_DUP_MAX_DISTANCE", "3"))  # SimHash bits; -1 = embed near-duplicates too
 
 # ---- Requests session with retries ----
-session = requests.Session()
-retries = Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
-adapter = HTTPAdapter(max_retries=retries)
-session.mount("https://", adapter)
-session.mount("http://", adapter)
+# Built in main(), not at import: cpu_pool's spawn workers re-import this script as
+# __mp_main__ and must not open sessions, caches or check the environment.
+host_limiter: Optional[HostLimiter] = None
+session: Optional[requests.Session] = None
+
+def make_session(limiter: HostLimiter) -> requests.Session:
+    s = requests.Session()
+    retries = Retry(total=3, backoff_factor=1, status_forcelist=[500, 502, 504])
+    # a host never has more requests open than its limit, so that is all the keep-alive pool needs
+    adapter = HTTPAdapter(max_retries=retries, pool_connections=HOST_POOLS, pool_maxsize=limiter.max_concurrency())
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
 DEFAULT_HEADERS = {"User-Agent": "ImmigrationRAGBot/1.0 (+https://yourdomain.example)"}
 
 # ---- Helpers ----
@@ -76,158 +138,266 @@ def get_google_creds():
     ]
     return Credentials.from_service_account_info(info, scopes=scopes)
 
-def sheet_urls_from_sheet():
+def sheet_rows_from_sheet() -> List[Dict]:
+    """[{url, modified, priority}]: URLs from the first column, plus "last modified"/"priority" columns if headed."""
     creds = get_google_creds()
     gc = gspread.authorize(creds)
     sh = gc.open_by_key(GOOGLE_SHEET_ID)
     ws = sh.sheet1
-    vals = ws.col_values(1)
-    # skip header if present
-    if vals and vals[0].lower().strip().startswith("url"):
-        vals = vals[1:]
-    return [v.strip() for v in vals if v and v.strip()]
+    return source_snapshot.rows_from_values(ws.get_all_values())
+
+def host_request(method: str, url: str, **kwargs) -> requests.Response:
+    """session.request() inside the host's concurrency/rate limits; 429/503 are retried after the host's pause."""
+    for attempt in range(HOST_THROTTLE_RETRIES + 1):
+        with host_limiter.request(url):
+            started = time.monotonic()
+            try:
+                resp = session.request(method, url, **kwargs)
+            except Exception:
+                host_limiter.record(url, None, time.monotonic() - started)
+                raise
+        # retries urllib3 already did inside session.request (5xx, connection errors)
+        history = getattr(getattr(resp.raw, "retries", None), "history", None) or ()
+        host_limiter.record(url, resp.status_code, time.monotonic() - started, resp.headers.get("Retry-After"),
+                            retries=len(history) + (1 if attempt else 0))
+        if resp.status_code not in THROTTLE_STATUSES or attempt == HOST_THROTTLE_RETRIES:
+            return resp
+        resp.close()
+
+def urls_from_file(path: str) -> List[str]:
+    """One URL per line; blank lines and # comments are ignored (--urls-file, used by the benchmarks)."""
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
 
-def safe_head(url: str, timeout=HEAD_TIMEOUT) -> Optional[requests.Response]:
+def safe_head(url: str, timeout=HEAD_TIMEOUT, state: Optional[Dict] = None) -> Optional[requests.Response]:
+    # state: crawl_state row for the URL -> conditional request (server may answer 304)
+    headers = {**DEFAULT_HEADERS, **crawl_state.conditional_headers(state)}
     try:
-        return session.head(url, headers=DEFAULT_HEADERS, allow_redirects=True, timeout=timeout)
+        return host_request("HEAD", url, headers=headers, allow_redirects=True, timeout=timeout)
     except Exception:
         return None
 
-def safe_get(url: str, timeout=REQUEST_TIMEOUT) -> Optional[requests.Response]:
+def safe_get(url: str, timeout=REQUEST_TIMEOUT, state: Optional[Dict] = None, stream: bool = False) -> Optional[requests.Response]:
+    headers = {**DEFAULT_HEADERS, **crawl_state.conditional_headers(state)}
     try:
-        return session.get(url, headers=DEFAULT_HEADERS, allow_redirects=True, timeout=timeout)
+        return host_request("GET", url, headers=headers, allow_redirects=True, timeout=timeout, stream=stream)
     except Exception:
         return None
 
-def get_content_length(url: str) -> Optional[int]:
-    h = safe_head(url)
-    if not h:
-        return None
-    cl = h.headers.get("Content-Length") or h.headers.get("content-length")
-    if cl:
-        try:
-            return int(cl)
-        except Exception:
-            return None
-    return None
+def probe_url(url: str, state: Optional[Dict] = None) -> Dict:
+    """
+    Single HEAD probe per URL (final URL, content type/length, validators), cached for the
+    run and optionally across runs (--probe-cache). Handlers read it instead of re-probing.
+    """
+    cached = _probe_cache.get(url)
+    if cached:
+        return cached
+    probe = probe_from_response(url, safe_head(url, state=state))
+    _probe_cache.put(url, probe)
+    return probe
 
-def chunk_text(text: str, chunk_size=CHUNK_SIZE_WORDS, overlap=CHUNK_OVERLAP) -> List[str]:
-    words = text.split()
-    if not words:
-        return []
-    step = max(1, chunk_size - overlap)
-    out = []
-    for i in range(0, len(words), step):
-        chunk = " ".join(words[i:i+chunk_size])
-        if chunk.strip():
-            out.append(chunk)
-    return out
-
-def create_embeddings_with_retry(batch: List[str], retries=3):
-    for attempt in range(retries):
-        try:
-            resp = openai.embeddings.create(model=EMBEDDING_MODEL, input=batch)
-            # validate dimension
-            emb = resp.data[0].embedding
-            if len(emb) != VECTOR_DIMENSION:
-                raise RuntimeError("embedding dim mismatch")
-            return resp
-        except Exception as e:
-            if attempt < retries - 1:
-                time.sleep(2 ** attempt)
-                continue
-            raise
+def chunk_text(text: str, chunk_size=CHUNK_SIZE_WORDS, overlap=CHUNK_OVERLAP) -> ChunkedText:
+    """
+    Overlapping word windows of `text`, lazily sliced from one normalised copy (see
+    ingestion/chunking.py). Iterates to the same strings the old split/join list did;
+    use list(chunk_text(...)) if a real list is needed.
+    """
+    return ChunkedText(text, chunk_size, overlap)
+
+# One scheduler for the whole process (created in main()): packs chunks into requests by token
+# budget, keeps EMBED_MAX_IN_FLIGHT requests going and paces them by the account's RPM/TPM limits.
+embedder: Optional[EmbeddingScheduler] = None
+
+def make_embedder() -> EmbeddingScheduler:
+    return EmbeddingScheduler(
+        EMBEDDING_MODEL, VECTOR_DIMENSION,
+        requests_per_minute=EMBED_RPM, tokens_per_minute=EMBED_TPM,
+        max_in_flight=EMBED_MAX_IN_FLIGHT, max_request_tokens=EMBED_REQUEST_TOKENS,
+        api_key=OPENAI_API_KEY,
+        cache=EmbeddingCache(EMBED_CACHE_DIR, EMBED_CACHE_MAX_MB * 1024 * 1024) if EMBED_CACHE_DIR else None,
+    )
 
 # ---- Content extraction routines ----
 def read_google_doc(service, doc_id: str) -> Dict:
     try:
         doc = service.documents().get(documentId=doc_id, fields="title,body").execute()
         title = doc.get("title", "Untitled Google Doc")
-        content = []
-        for el in doc.get("body", {}).get("content", []):
-            if "paragraph" in el:
-                for e in el["paragraph"].get("elements", []):
-                    tr = e.get("textRun", {}).get("content")
-                    if tr:
-                        content.append(tr)
-        full = "".join(content).strip()
-        return {"title": title, "text": full}
+        return {"title": title, "text": gdocs.doc_text(doc)}
     except Exception as e:
         return {"title": None, "text": "", "note": f"google-doc-read-failed: {e}"}
 
-def scrape_url_html(url: str) -> Dict:
-    resp = safe_get(url)
+def expand_google_sources(urls: List[str]) -> List[str]:
+    """
+    Replace Drive folder URLs with the Google Docs inside them and record every doc's Drive
+    modifiedTime in _gdoc_modified (folder listings carry it; other docs are looked up in
+    batches of 100), so fetch_stage can skip unchanged docs without calling the Docs API.
+    """
+    if not any(gdocs.folder_id(u) or gdocs.doc_id(u) for u in urls):
+        return urls
+    drive = build("drive", "v3", credentials=get_google_creds())
+    out = []
+    for url in urls:
+        folder = gdocs.folder_id(url)
+        if not folder:
+            out.append(url)
+            continue
+        try:
+            docs = gdocs.list_folder(drive, folder)
+        except Exception as e:
+            print(f"Drive folder {url} could not be listed, skipping: {e}")
+            continue
+        print(f"Drive folder {url}: {len(docs)} Google Docs")
+        for d in docs:
+            _gdoc_modified[d["id"]] = d["modifiedTime"]
+            out.append(gdocs.doc_url(d["id"]))
+    todo = [gdocs.doc_id(u) for u in out if gdocs.doc_id(u) and gdocs.doc_id(u) not in _gdoc_modified]
+    try:
+        _gdoc_modified.update(gdocs.modified_times(drive, todo))
+    except Exception as e:
+        print(f"Drive modifiedTime lookup failed ({e}); unchanged docs are detected by content hash only")
+    return list(dict.fromkeys(out))
+
+def _unchanged(resp, raw: bytes, state: Optional[Dict]) -> Optional[Dict]:
+    """not_modified result if the server said 304 or the body hashes to what we ingested last time."""
+    if resp.status_code == 304:
+        return {"not_modified": True, "note": "http-304"}
+    digest = crawl_state.content_hash(raw)
+    if state and state.get("content_hash") == digest:
+        return {"not_modified": True, "note": "content-unchanged",
+                "validators": {**crawl_state.validators_from_response(resp), "content_hash": digest}}
+    return None
+
+def fetch_html(url: str, state: Optional[Dict] = None, probe: Optional[Dict] = None) -> Dict:
+    """
+    GET a page for later parsing. Returns {"html", "validators"}, or {"not_modified"} /
+    {"title": None, "text": "", "note"} when there is nothing to parse.
+    """
+    if probe and probe.get("ok") and probe.get("content_type") and "text/html" not in probe["content_type"]:
+        # the HEAD already told us this isn't a page; don't download it
+        return {"title": None, "text": "", "note": f"not-html:{probe['content_type']}"}
+    resp = safe_get((probe or {}).get("final_url") or url, state=state)
     if not resp or resp.status_code >= 400:
         return {"title": None, "text": "", "note": f"http-status-{resp.status_code if resp else 'no-response'}"}
+    unchanged = _unchanged(resp, resp.content, state)
+    if unchanged:
+        return {**unchanged, "bytes": len(resp.content)}
+    validators = {**crawl_state.validators_from_response(resp), "content_hash": crawl_state.content_hash(resp.content)}
     ctype = resp.headers.get("Content-Type", "").lower()
     if "text/html" not in ctype:
-        return {"title": None, "text": "", "note": f"not-html:{ctype}"}
-    soup = BeautifulSoup(resp.text, "html.parser")
-    title = (soup.title.string.strip() if soup.title and soup.title.string else urlparse(url).netloc)
-    # try to find main content containers
-    main = soup.select_one("article, div.main-content, div.content, div#main, div[role='main']")
-    if main:
-        for bad in main.select("nav, header, footer, script, style, .sidebar, .nav, .cookie-consent, .cookie-banner"):
-            bad.decompose()
-        text = main.get_text(separator="\n", strip=True)
-        if not text or len(text.split()) < MIN_TEXT_WORDS:
-            # fallback to all text
-            text = soup.get_text(separator="\n", strip=True)
-    else:
-        text = soup.get_text(separator="\n", strip=True)
-    if not text or len(text.split()) < MIN_TEXT_WORDS:
-        return {"title": title, "text": "", "note": "extracted text too small"}
-    return {"title": title, "text": text}
-
-def read_pdf_from_url(url: str, max_mb_store_in_db: int = MAX_PDF_STORE_MB) -> Dict:
-    # Check server-provided size first
-    size = get_content_length(url)
-    if size and size >= max_mb_store_in_db * 1024 * 1024:
-        return {"too_large": True, "file_size_bytes": size}
-    resp = safe_get(url, timeout=60)
-    if not resp or resp.status_code >= 400:
-        return {"title": None, "text": "", "note": f"pdf-download-failed: status {resp.status_code if resp else 'no-response'}"}
-    content_bytes = resp.content
-    size = size or len(content_bytes)
-    if size >= max_mb_store_in_db * 1024 * 1024:
+        return {"title": None, "text": "", "note": f"not-html:{ctype}", "validators": validators, "bytes": len(resp.content)}
+    return {"html": resp.text, "validators": validators, "bytes": len(resp.content)}
+
+def parse_html(fetched: Dict, url: str) -> Dict:
+    """Extract the text of a fetch_html() result on the extraction process pool."""
+    extracted = cpu_pool.run(PDF_EXTRACT_PROCESSES, html_extract.extract_html, fetched["html"], url, MIN_TEXT_WORDS)
+    return {**extracted, "validators": fetched["validators"]}
+
+def scrape_url_html(url: str, state: Optional[Dict] = None, probe: Optional[Dict] = None) -> Dict:
+    fetched = fetch_html(url, state=state, probe=probe)
+    return parse_html(fetched, url) if "html" in fetched else fetched
+
+def download_to_file(url: str, max_bytes: int, state: Optional[Dict] = None, suffix: str = ".pdf") -> Dict:
+    """
+    Stream a download to a temp file in DOWNLOAD_CHUNK_BYTES pieces, hashing as we go, and
+    abort as soon as the body crosses max_bytes (even without a Content-Length). Peak
+    memory is one chunk regardless of file size. Returns {"path", "size", "validators"}
+    or {"not_modified"} / {"too_large", "file_size_bytes"} / {"note"}. The caller deletes path.
+    """
+    # keep the host's slot until the body is read, not just the headers
+    with host_limiter.hold(url):
+        resp = safe_get(url, timeout=60, state=state, stream=True)
+        if not resp or resp.status_code >= 400:
+            if resp is not None:
+                resp.close()
+            return {"note": f"download-failed: status {resp.status_code if resp else 'no-response'}"}
+        try:
+            if resp.status_code == 304:
+                return {"not_modified": True, "note": "http-304"}
+            declared = resp.headers.get("Content-Length")
+            if declared and declared.isdigit() and int(declared) >= max_bytes:
+                return {"too_large": True, "file_size_bytes": int(declared)}
+            digest = hashlib.sha256()
+            size = 0
+            fd, path = tempfile.mkstemp(suffix=suffix, dir=DOWNLOAD_SPOOL_DIR)
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    for piece in resp.iter_content(chunk_size=DOWNLOAD_CHUNK_BYTES):
+                        if not piece:
+                            continue
+                        size += len(piece)
+                        if size >= max_bytes:
+                            os.unlink(path)
+                            return {"too_large": True, "file_size_bytes": size}
+                        digest.update(piece)
+                        f.write(piece)
+            except Exception:
+                if os.path.exists(path):
+                    os.unlink(path)
+                raise
+            validators = {**crawl_state.validators_from_response(resp), "content_hash": digest.hexdigest()}
+            if state and state.get("content_hash") == validators["content_hash"]:
+                os.unlink(path)
+                return {"not_modified": True, "note": "content-unchanged", "validators": validators}
+            return {"path": path, "size": size, "validators": validators}
+        finally:
+            resp.close()
+
+def fetch_pdf(url: str, max_mb_store_in_db: int = MAX_PDF_STORE_MB, state: Optional[Dict] = None,
+              probe: Optional[Dict] = None) -> Dict:
+    """Download a PDF to a temp file: download_to_file()'s result, or a note when there's no file."""
+    max_bytes = max_mb_store_in_db * 1024 * 1024
+    # Check server-provided size first (from the URL's probe, no extra HEAD)
+    probe = probe or probe_url(url, state=state)
+    size = probe.get("content_length") if probe.get("ok") else None
+    if size and size >= max_bytes:
         return {"too_large": True, "file_size_bytes": size}
+    download = download_to_file(probe.get("final_url") or url, max_bytes, state=state)
+    if download.get("not_modified") or download.get("too_large") or download.get("path"):
+        return download
+    return {"title": None, "text": "", "note": f"pdf-{download.get('note')}"}
+
+def read_pdf_from_url(url: str, max_mb_store_in_db: int = MAX_PDF_STORE_MB, state: Optional[Dict] = None,
+                      probe: Optional[Dict] = None) -> Dict:
+    download = fetch_pdf(url, max_mb_store_in_db, state=state, probe=probe)
+    if not download.get("path"):
+        return download
+    title = os.path.basename(urlparse(url).path) or "pdf"
+    try:
+        return extract_pdf_file(download["path"], title, download["validators"])
+    finally:
+        os.unlink(download["path"])
 
-    # Try PyMuPDF (fitz)
+def extract_pdf_file(path: str, title: str, validators: Optional[Dict] = None) -> Dict:
+    """Extract text from a PDF on disk: PyMuPDF (fitz) first, PyPDF2 as fallback."""
+    # Try PyMuPDF (fitz); large documents are split across the PDF process pool
     try:
-        doc = fitz.open(stream=content_bytes, filetype="pdf")
-        pages = []
-        for p in doc:
-            t = p.get_text("text")
-            if t:
-                pages.append(t)
+        pages = [t for t in pdf_extract.extract_pages(path, "fitz", processes=PDF_EXTRACT_PROCESSES,
+                                                      min_parallel_pages=PDF_PARALLEL_MIN_PAGES) if t]
         full = "\n".join(pages).strip()
-        title = os.path.basename(urlparse(url).path) or "pdf"
         if not full or len(full.split()) < MIN_TEXT_WORDS:
-            return {"title": title, "text": "", "note": "extracted text too small (fitz)"}
-        return {"title": title, "text": full}
+            return {"title": title, "text": "", "note": "extracted text too small (fitz)", "validators": validators}
+        return {"title": title, "text": full, "validators": validators}
     except Exception as e_fitz:
         # fallback to PyPDF2
         try:
-            pdf_file = BytesIO(content_bytes)
-            reader = PdfReader(pdf_file)
-            pages = []
-            for p in reader.pages:
-                try:
-                    t = p.extract_text() or ""
-                    pages.append(t)
-                except Exception:
-                    continue
+            # pages whose extraction raised come back as None and are skipped
+            pages = [t for t in pdf_extract.extract_pages(path, "pypdf2", processes=PDF_EXTRACT_PROCESSES,
+                                                          min_parallel_pages=PDF_PARALLEL_MIN_PAGES) if t is not None]
             full = "\n".join(pages).strip()
-            title = os.path.basename(urlparse(url).path) or "pdf"
             if not full or len(full.split()) < MIN_TEXT_WORDS:
-                return {"title": title, "text": "", "note": "extracted text too small (pypdf2)"}
-            return {"title": title, "text": full}
+                return {"title": title, "text": "", "note": "extracted text too small (pypdf2)", "validators": validators}
+            return {"title": title, "text": full, "validators": validators}
         except Exception as e_pypdf2:
             return {"title": None, "text": "", "note": f"pdf-parse-failed: {e_fitz} / {e_pypdf2}"}
 
 # ---- DB helpers ----
+# opened in main(), sized for the run's threads. Stage work goes through _db.run(): a connection
+# Neon dropped while idle is replaced and the call retried, and a failed call is rolled back.
+_db: Optional[db.Pool] = None
+
 def get_conn():
-    return psycopg2.connect(POSTGRES_URL)
+    """A pooled connection; return it with _db.putconn() (or use _db.connection() / _db.run())."""
+    return _db.getconn()
 
 def insert_large_document(conn, url, title, source_type, file_size_bytes, note=None):
     with conn.cursor() as cur:
@@ -241,112 +411,728 @@ def insert_large_document(conn, url, title, source_type, file_size_bytes, note=N
         )
     conn.commit()
 
-def insert_chunks_into_db(conn, title, url, source_type, chunks: List[str], domain: str):
-    # batches and inserts embeddings
-    for i in range(0, len(chunks), BATCH_SIZE):
-        batch = chunks[i:i+BATCH_SIZE]
-        resp = create_embeddings_with_retry(batch)
-        embeddings = [d.embedding for d in resp.data]
-        with conn.cursor() as cur:
-            for j, chunk in enumerate(batch):
-                if not chunk or len(chunk.strip()) == 0:
-                    continue
-                try:
-                    embedding = embeddings[j]
-                except Exception:
-                    print("  - missing embedding for chunk, skipping")
-                    continue
-                chunk_hash = hashlib.sha1(chunk.encode("utf-8")).hexdigest()
-                vector_literal = "[" + ",".join(map(str, embedding)) + "]"
-                cur.execute(
-                    """
-                    INSERT INTO documents
-                      (source_title, source_url, source_type, content, chunk_hash, embedding, scraped_at, source_domain)
-                    VALUES (%s, %s, %s, %s, %s, %s::vector, now(), %s)
-                    ON CONFLICT DO NOTHING
-                    """,
-                    (title, url, source_type, chunk, chunk_hash, vector_literal, domain)
-                )
-        conn.commit()
+def clear_large_document(conn, url):
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM documents_large WHERE source_url = %s", (url,))
+    conn.commit()
+
+STAGING_COLUMNS = ("source_title", "source_url", "source_type", "content", "chunk_hash", "embedding", "source_domain",
+                   "content_simhash")
+
+def write_document_rows(conn, rows: List[tuple], links: Iterable[tuple] = (), shared: Iterable[tuple] = ()):
+    """
+    Bulk insert (title, url, source_type, content, chunk_hash, embedding, domain, simhash) tuples.
+    Rows are binary-COPY'd into a temp staging table (embeddings as packed float32, see
+    ingestion/vectors.py) and merged with the same ON CONFLICT semantics as before.
+    Near-duplicate links (neardup.LINK_COLUMNS tuples) and (chunk_hash, url) pairs of exact
+    duplicates stored under another URL (see source_snapshot.prune_removed) are written in the
+    same transaction.
+    """
+    with conn.cursor() as cur:
+        neardup.record_links(cur, links)
+        source_snapshot.record_chunk_sources(cur, shared)
+        if not rows:
+            return
+        cur.execute(
+            """
+            CREATE TEMP TABLE IF NOT EXISTS documents_staging (
+              source_title TEXT, source_url TEXT, source_type TEXT, content TEXT,
+              chunk_hash TEXT, embedding vector, source_domain TEXT, content_simhash TEXT
+            ) ON COMMIT DELETE ROWS
+            """
+        )
+        vectors.copy_rows(cur, "documents_staging", STAGING_COLUMNS, rows)
+        # chunk_hash order: concurrent writers inserting the same chunks take their locks in
+        # the same order instead of deadlocking
+        cur.execute(
+            """
+            INSERT INTO documents
+              (source_title, source_url, source_type, content, chunk_hash, embedding, scraped_at, source_domain,
+               content_simhash)
+            SELECT source_title, source_url, source_type, content, chunk_hash, embedding, now(), source_domain,
+                   content_simhash::bigint
+            FROM documents_staging
+            ORDER BY chunk_hash
+            ON CONFLICT DO NOTHING
+            """
+        )
+        # the staging rows are also dropped on commit; clear now in case more batches share this transaction
+        cur.execute("TRUNCATE documents_staging")
+
+def chunk_hash_of(chunk: str) -> str:
+    return hashlib.sha1(chunk.encode("utf-8")).hexdigest()
+
+def existing_chunk_hashes(conn, hashes: List[str]) -> Dict[str, str]:
+    """
+    {chunk_hash: source_url} for those of these chunk hashes already stored in `documents` or
+    linked as near-duplicates (one query).
+    """
+    if not hashes:
+        return {}
+    with conn.cursor() as cur:
+        cur.execute("SELECT chunk_hash, source_url FROM documents WHERE chunk_hash = ANY(%s) "
+                    "UNION SELECT chunk_hash, source_url FROM document_duplicates WHERE chunk_hash = ANY(%s)",
+                    (hashes, hashes))
+        return dict(cur.fetchall())
+
+def _shared_item(job: Dict, existing: Dict[str, str]) -> Optional[Dict]:
+    """Writer item recording the stored chunks this URL skipped that belong to other URLs."""
+    shared = [(h, job["url"]) for h, owner in existing.items() if owner != job["url"]]
+    return {"job": job, "rows": [], "links": [], "shared": shared} if shared else None
+
+def _iter_new_batches(chunks: Iterable[str], skip_hashes: set, batch_size: int):
+    """Yield lists of (chunk_hash, chunk) not in skip_hashes, at most batch_size long."""
+    seen = set(skip_hashes)
+    batch = []
+    for chunk in chunks:
+        if not chunk or len(chunk.strip()) == 0:
+            continue
+        h = chunk_hash_of(chunk)
+        # also drops chunks repeated within this document
+        if h in seen:
+            continue
+        seen.add(h)
+        batch.append((h, chunk))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def embed_batch(url: str, batch: List[tuple], journal: Optional[RunJournal] = None) -> Dict[str, List[float]]:
+    """
+    chunk_hash -> vector for a batch of (chunk_hash, chunk). With a run journal, vectors
+    left over from an interrupted run are reused instead of re-embedded, and fresh ones are
+    checkpointed until the writer has committed them.
+    """
+    hashes = [h for h, _ in batch]
+    vecs = journal.load_pending(hashes) if journal else {}
+    todo = [(h, c) for h, c in batch if h not in vecs]
+    if todo:
+        fresh = embedder.embed([c for _, c in todo])
+        if journal:
+            journal.save_pending(url, [h for h, _ in todo], fresh)
+            journal.mark(url, "embedded")
+        vecs.update(zip((h for h, _ in todo), fresh))
+    return vecs
 
 # ---- Main pipeline ----
-def main():
-    print("--- Starting safe ingestion pipeline ---")
-    urls = sheet_urls_from_sheet()
-    print(f"Found {len(urls)} URLs in sheet.")
+# Each URL is a job dict flowing through four stages joined by bounded queues
+# (ingestion/stages.py): fetch (I/O threads) -> extract (threads feeding the process
+# pool) -> embed (chunk, dedupe, embed) -> write (one batching Postgres writer). A job
+# that finishes early (unchanged, too large, no text, error) is closed by _finish()
+# in whichever stage decides it; inserted jobs are closed by the writer after commit.
+_crawl_states: Dict[str, Dict] = {}  # source_url -> crawl_state row, loaded once per run
+_gdoc_modified: Dict[str, str] = {}  # Google Doc id -> Drive modifiedTime, looked up once per run
+_probe_cache = ProbeCache()  # replaced in main() when --probe-cache is given
+_journal: Optional[RunJournal] = None  # per-URL stage checkpoints, opened in main()
+_thread_state = threading.local()
+_print_lock = threading.Lock()
+_counts: Dict[str, int] = {}  # URL results by status
+_metrics = RunMetrics()  # per-URL timings/counters; replaced in main() with one that writes the run log
+_write_failed: Dict[str, str] = {}  # url -> write error, until its done marker closes the job
+_near_dups: Optional[neardup.NearDupIndex] = None  # SimHash bands of stored chunks, loaded in main()
 
-    # build docs service for google docs reading
-    creds = get_google_creds()
-    docs_service = build("docs", "v1", credentials=creds)
+def _worker_docs_service():
+    """Per-thread Google Docs service; the underlying httplib2 transport isn't thread-safe."""
+    service = getattr(_thread_state, "docs_service", None)
+    if service is None:
+        service = build("docs", "v1", credentials=get_google_creds())
+        _thread_state.docs_service = service
+    return service
 
-    conn = get_conn()
-    try:
-        for url in urls:
-            if not url:
-                continue
-            print(f"\nProcessing: {url}")
-            parsed = urlparse(url)
-            domain = parsed.netloc.lower() if parsed.netloc else None
-            lower = url.lower()
+def _mark(url: str, stage: str, detail: Optional[str] = None):
+    if _journal is not None:
+        _journal.mark(url, stage, detail)
+
+def _record_processed(conn, url: str, extracted: Dict, status: str, ingested: bool = False):
+    validators = extracted.get("validators")
+    if validators:
+        crawl_state.record_processed(conn, url, status, ingested=ingested, **validators)
+
+def _new_job(url: str) -> Dict:
+    parsed = urlparse(url)
+    return {
+        "url": url,
+        "path": parsed.path,
+        "domain": parsed.netloc.lower() if parsed.netloc else None,
+        "state": _crawl_states.get(url),
+        "source_type": "WEBPAGE",
+        "log": [f"\nProcessing: {url}"],
+        "timings": {},   # phase -> seconds (ingestion/metrics.py)
+        "counters": {},
+    }
+
+def _finish(job: Dict, status: str):
+    """Close a job: "inserted", "unchanged", "large", "skipped" or "error"."""
+    # checkpoint: written/done URLs are skipped by --resume, errors are retried
+    _mark(job["url"], {"inserted": "written", "error": "error"}.get(status, "done"), status)
+    if job.get("streamed") and status != "error" and _journal is not None:
+        _journal.clear_checkpoint(job["url"])
+    elapsed = time.perf_counter() - job.get("started", time.perf_counter())
+    _metrics.url_done(job["url"], status, job["timings"], job["counters"], elapsed)
+    # print each URL's log as one block so concurrent workers don't interleave
+    with _print_lock:
+        _counts[status] = _counts.get(status, 0) + 1
+        print("\n".join(job["log"]), flush=True)
+
+def _fail(job: Dict, e: Exception):
+    """Stage error handler: one bad URL never stops the run."""
+    job["log"].append(f"  - ERROR processing {job['url']}: {e}")
+    _finish(job, "error")
+
+def _finish_unchanged(job: Dict, extracted: Dict):
+    job["log"].append(f"  - Unchanged since last crawl ({extracted.get('note')}), skipping.")
+    if extracted.get("validators"):
+        _db.run(lambda conn: _record_processed(conn, job["url"], extracted, "unchanged"))
+    else:
+        _db.run(lambda conn: crawl_state.record_checked(conn, job["url"], "unchanged"))
+    _finish(job, "unchanged")
+
+def _fetch_local(job: Dict):
+    """fetch_stage for local:// files: stat/read from disk, no probe or HTTP."""
+    url, log = job["url"], job["log"].append
+    job["source_type"] = "PDF" if url.lower().endswith(".pdf") else "TEXT"
+    with timed(job["timings"], "download"):
+        fetched = local_source.read_local(url, state=job["state"])
+    if fetched.get("not_modified"):
+        _finish_unchanged(job, fetched)
+        return
+    count(job["counters"], "bytes_read", fetched["size"])
+    if "text" not in fetched:
+        if fetched["size"] >= PDF_MAX_MB * 1024 * 1024:
+            log(f"  - PDF too large ({fetched['size']}). Storing metadata and skipping.")
+            _db.run(lambda conn: insert_large_document(conn, url, os.path.basename(job["path"]), "PDF",
+                                                       fetched["size"], note="auto-stored-large"))
+            _finish(job, "large")
+            return
+        job["fetched"] = fetched
+    elif not fetched["text"].strip():
+        log(f"  - No usable text, note={fetched.get('note') or 'blank file'}")
+        _db.run(lambda conn: _record_processed(conn, url, fetched, "no-text"))
+        _finish(job, "skipped")
+        return
+    else:
+        job["extracted"] = {"title": os.path.basename(job["path"]), "text": fetched["text"],
+                            "validators": fetched["validators"]}
+    yield job
 
-            extracted = None
-            source_type = "WEBPAGE"
+def fetch_stage(job: Dict):
+    """I/O: probe, then download the PDF / GET the page / read the Google Doc."""
+    url, state, log, timings = job["url"], job["state"], job["log"].append, job["timings"]
+    job["started"] = time.perf_counter()
+    if local_source.is_local(url):
+        yield from _fetch_local(job)
+        return
+    lower = url.lower()
+    is_google_doc = "/document/d/" in lower or lower.startswith("https://docs.google.com")
+    modified = _gdoc_modified.get(gdocs.doc_id(url)) if is_google_doc else None
+    if modified and state and state.get("last_modified") == modified:
+        _finish_unchanged(job, {"not_modified": True, "note": "drive-modifiedTime-unchanged"})
+        return
+    # Google Docs are read through the Docs API; everything else gets one HEAD probe
+    with timed(timings, "probe"):
+        probe = None if is_google_doc else probe_url(url, state=state)
+    _mark(url, "probed")
+    if probe and probe.get("status") == 304:
+        _finish_unchanged(job, {"not_modified": True, "note": "http-304 (head)"})
+        return
 
+    if is_google_doc:
+        job["source_type"] = "GOOGLE_DOC"
+        doc_id = gdocs.doc_id(url)
+        if not doc_id:
+            log("  - Google doc URL didn't match expected pattern, skipping.")
+            _finish(job, "skipped")
+            return
+        with timed(timings, "download"):
+            extracted = read_google_doc(_worker_docs_service(), doc_id)
+        if not extracted.get("text"):
+            log(f"  - No usable google doc text, note={extracted.get('note')}")
+            _finish(job, "skipped")
+            return
+        # the Docs API has no validators: Drive's modifiedTime (checked above) and a hash of the extracted text
+        extracted["validators"] = {"content_hash": crawl_state.content_hash(extracted["text"]), "last_modified": modified}
+        if state and state.get("content_hash") == extracted["validators"]["content_hash"]:
+            _finish_unchanged(job, {"not_modified": True, "note": "content-unchanged", "validators": extracted["validators"]})
+            return
+        job["extracted"] = extracted
+    elif lower.endswith(".pdf") or "application/pdf" in probe.get("content_type", ""):
+        job["source_type"] = "PDF"
+        with timed(timings, "download"):
+            fetched = fetch_pdf(url, PDF_MAX_MB, state=state, probe=probe)
+        if fetched.get("too_large"):
+            log(f"  - PDF too large ({fetched.get('file_size_bytes')}). Storing metadata and skipping.")
+            _db.run(lambda conn: insert_large_document(conn, url, os.path.basename(job["path"]) or url, "PDF",
+                                                       fetched.get("file_size_bytes"), note="auto-stored-large"))
+            _finish(job, "large")
+            return
+        job["fetched"] = fetched
+    else:
+        with timed(timings, "download"):
+            job["fetched"] = fetch_html(url, state=state, probe=probe)
+
+    fetched = job.get("fetched", {})
+    count(job["counters"], "bytes_downloaded", fetched.get("bytes") or fetched.get("size") or 0)
+    if fetched.get("not_modified"):
+        _finish_unchanged(job, fetched)
+        return
+    if not job.get("extracted") and not fetched.get("path") and not fetched.get("html"):
+        log(f"  - No usable {'PDF' if job['source_type'] == 'PDF' else 'HTML'} text, note={fetched.get('note')}")
+        _db.run(lambda conn: _record_processed(conn, url, fetched, "no-text"))
+        _finish(job, "skipped")
+        return
+    yield job
+
+def extract_stage(job: Dict):
+    """CPU: parse the downloaded PDF / HTML on the extraction process pool."""
+    fetched = job.pop("fetched", None)
+    if fetched and fetched.get("path") and fetched["size"] >= MAX_PDF_STORE_MB * 1024 * 1024:
+        # too big to hold as text: the embed stage extracts it range by range (and deletes the download)
+        job["extracted"] = {"title": os.path.basename(job["path"]) or "pdf", "stream_path": fetched["path"],
+                            "size": fetched["size"], "validators": fetched["validators"]}
+        job["streamed"] = True
+        yield job
+        return
+    with timed(job["timings"], "extract"):
+        if fetched and fetched.get("path"):
             try:
-                if lower.endswith(".pdf") or "application/pdf" in (safe_head(url).headers.get("Content-Type", "") if safe_head(url) else ""):
-                    source_type = "PDF"
-                    extracted = read_pdf_from_url(url)
-                    if extracted.get("too_large"):
-                        print(f"  - PDF too large ({extracted.get('file_size_bytes')}). Storing metadata and skipping.")
-                        insert_large_document(conn, url, os.path.basename(parsed.path) or url, source_type, extracted.get("file_size_bytes"), note="auto-stored-large")
-                        continue
-                    if not extracted.get("text"):
-                        print(f"  - No usable PDF text, note={extracted.get('note')}")
-                        continue
-                elif "/document/d/" in lower or lower.startswith("https://docs.google.com"):
-                    source_type = "GOOGLE_DOC"
-                    # extract doc id
-                    import re
-                    m = re.search(r"/document/d/([a-zA-Z0-9\-_]+)", url)
-                    if m:
-                        docid = m.group(1)
-                        extracted = read_google_doc(docs_service, docid)
-                        if not extracted.get("text"):
-                            print(f"  - No usable google doc text, note={extracted.get('note')}")
-                            continue
-                    else:
-                        print("  - Google doc URL didn't match expected pattern, skipping.")
-                        continue
+                job["extracted"] = extract_pdf_file(fetched["path"], os.path.basename(job["path"]) or "pdf", fetched["validators"])
+            finally:
+                if not local_source.is_local(job["url"]):  # downloads are temp files; local PDFs are the source
+                    os.unlink(fetched["path"])
+        elif fetched:
+            job["extracted"] = parse_html(fetched, job["url"])
+    extracted = job["extracted"]
+    if not extracted.get("text"):
+        job["log"].append(f"  - No usable {'PDF' if job['source_type'] == 'PDF' else 'HTML'} text, note={extracted.get('note')}")
+        _db.run(lambda conn: _record_processed(conn, job["url"], extracted, "no-text"))
+        _finish(job, "skipped")
+        return
+    _mark(job["url"], "extracted")
+    yield job
+
+def _embed_new_chunks(job: Dict, title: str, batches: Iterable[List[tuple]], stats: Dict[str, int]):
+    """Link near-duplicates and embed the rest of each (chunk_hash, chunk) batch; yields writer items."""
+    url, timings = job["url"], job["timings"]
+    batches = iter(batches)
+    while True:
+        with timed(timings, "chunk"):  # chunks are produced lazily, batch by batch
+            batch = next(batches, None)
+        if batch is None:
+            return
+        # near-duplicates of a chunk stored for another URL are linked to it instead of embedded
+        with timed(timings, "dedupe"):
+            simhashes, links, todo = {}, [], []
+            for h, chunk in batch:
+                simhashes[h] = neardup.simhash(chunk)
+                # the index only holds committed chunks: write_stage adds these once they are
+                match = _near_dups.match(simhashes[h], url) if _near_dups is not None else None
+                if match:
+                    links.append((h, match[0], url, title, job["source_type"], job["domain"], match[1]))
                 else:
-                    # HTML scrape
-                    source_type = "WEBPAGE"
-                    extracted = scrape_url_html(url)
-                    if not extracted.get("text"):
-                        print(f"  - No usable HTML text, note={extracted.get('note')}")
-                        continue
-
-                content = extracted.get("text", "")
-                title = extracted.get("title") or (os.path.basename(parsed.path) or domain)
-                if not content or len(content.split()) < MIN_TEXT_WORDS:
-                    print("  - Extracted text too small, skipping.")
-                    continue
-
-                chunks = chunk_text(content)
-                if not chunks:
-                    print("  - chunking produced no chunks, skipping.")
-                    continue
-
-                print(f"  - chunks: {len(chunks)}  (title: {title})")
-                insert_chunks_into_db(conn, title, url, source_type, chunks, domain)
-                print(f"  - Successfully inserted chunks for {url}")
-
-            except Exception as e:
-                print(f"  - ERROR processing {url}: {e}")
-                # continue to next URL
-                continue
+                    todo.append((h, chunk))
+        stats["new"] += len(todo)
+        stats["near"] += len(links)
+        vecs = {}
+        if todo:
+            with timed(timings, "embed"):
+                vecs = embed_batch(url, todo, journal=_journal)
+        rows = [(title, url, job["source_type"], chunk, h, vecs[h], job["domain"], neardup.to_signed(simhashes[h]))
+                for h, chunk in todo]
+        yield {"job": job, "rows": rows, "links": links}
+
+def _embed_stream(job: Dict):
+    """
+    embed_stage for PDFs of MAX_PDF_STORE_MB or more: PDF_STREAM_PAGES pages at a time are
+    extracted on the pool, chunked (the chunker carries words across ranges), deduped and
+    embedded before later ranges are read, so memory holds a few ranges, not the document.
+    Each range's rows are followed by a checkpoint item that the writer saves to the run
+    journal once they are committed; --resume picks the document up from there.
+    """
+    url, extracted, log = job["url"], job["extracted"], job["log"].append
+    timings, counters = job["timings"], job["counters"]
+    path, title = extracted.pop("stream_path"), extracted["title"]
+    content_hash = extracted["validators"].get("content_hash")
+    chunker = StreamChunker(CHUNK_SIZE_WORDS, CHUNK_OVERLAP)
+    stats, produced = {"new": 0, "near": 0}, 0
+    try:
+        with timed(timings, "extract"):
+            total = pdf_extract.page_count_any(path)
+        start_page = 0
+        saved = _journal.load_checkpoint(url, content_hash) if _journal is not None else None
+        if saved and saved["next_page"] <= total:
+            start_page = saved["next_page"]
+            chunker.restore(saved["carry"], saved["word_count"])
+            log(f"  - resuming at page {start_page} of {total} (run journal checkpoint)")
+        log(f"  - streaming {total} pages ({extracted['size']} bytes), {PDF_STREAM_PAGES} pages per range")
+        ranges = pdf_extract.iter_ranges(path, total, PDF_STREAM_PAGES, start_page, processes=PDF_EXTRACT_PROCESSES)
+        try:
+            while True:
+                with timed(timings, "extract"):
+                    got = next(ranges, None)
+                with timed(timings, "chunk"):
+                    if got is None:
+                        # a document under MIN_TEXT_WORDS never filled a chunk; its tail is dropped too
+                        chunks = chunker.finish() if chunker.word_count >= MIN_TEXT_WORDS else []
+                    else:
+                        count(counters, "pages_extracted", got[1] - got[0])
+                        chunks = [c for text in got[2] if text for c in chunker.feed(text)]
+                    hashes = list({chunk_hash_of(c) for c in chunks if c and c.strip()})
+                produced += len(chunks)
+                with timed(timings, "dedupe"):
+                    existing = _db.run(lambda conn: existing_chunk_hashes(conn, hashes))
+                    shared = _shared_item(job, existing)
+                if shared:
+                    yield shared
+                # repeats are only dropped within a range; the writer's ON CONFLICT catches the rest
+                yield from _embed_new_chunks(job, title, _iter_new_batches(chunks, existing, BATCH_SIZE), stats)
+                if got is None:
+                    break
+                yield {"job": job, "rows": [], "links": [],
+                       "checkpoint": {"content_hash": content_hash, "next_page": got[1],
+                                      "carry": chunker.carry(), "word_count": chunker.word_count}}
+                _mark(url, "chunked", f"pages {got[1]}/{total}")
+        finally:
+            ranges.close()
+    finally:
+        if not local_source.is_local(url):  # the download; local PDFs are the source
+            os.unlink(path)
+    if chunker.word_count < MIN_TEXT_WORDS:
+        log(f"  - Extracted text too small ({chunker.word_count} words in {total} pages), skipping.")
+        _db.run(lambda conn: _record_processed(conn, url, extracted, "no-text"))
+        _finish(job, "skipped")
+        return
+    count(counters, "chunks_produced", produced)
+    count(counters, "chunks_new", stats["new"])
+    count(counters, "chunks_near_duplicate", stats["near"])
+    count(counters, "chunks_skipped", produced - stats["new"] - stats["near"])
+    log(f"  - chunks: {produced}  (title: {title}); embedded {stats['new']} new, "
+        f"{stats['near']} near-duplicates linked")
+    yield {"job": job, "done": True}
 
+def embed_stage(job: Dict):
+    """Chunk, skip chunks already stored, embed the rest; yields row batches then a done marker."""
+    url, extracted, log = job["url"], job["extracted"], job["log"].append
+    timings, counters = job["timings"], job["counters"]
+    if extracted.get("stream_path"):
+        yield from _embed_stream(job)
+        return
+    title = extracted.get("title") or (os.path.basename(job["path"]) or job["domain"])
+    chunks = chunk_text(extracted.pop("text", "") or "")
+    if chunks.word_count < MIN_TEXT_WORDS:
+        log("  - Extracted text too small, skipping.")
+        _db.run(lambda conn: _record_processed(conn, url, extracted, "no-text"))
+        _finish(job, "skipped")
+        return
+    if not chunks:
+        log("  - chunking produced no chunks, skipping.")
+        _finish(job, "skipped")
+        return
+
+    _mark(url, "chunked")
+    log(f"  - chunks: {len(chunks)}  (title: {title})")
+    # hashes up front, one lookup: only chunks not stored yet are sent to the embeddings API.
+    # chunks is re-iterable, so at most one batch of chunk strings is alive at a time.
+    with timed(timings, "chunk"):
+        hashes = list({chunk_hash_of(c) for c in chunks if c and c.strip()})
+    with timed(timings, "dedupe"):
+        existing = _db.run(lambda conn: existing_chunk_hashes(conn, hashes))
+        shared = _shared_item(job, existing)
+    if shared:
+        yield shared
+    stats = {"new": 0, "near": 0}
+    yield from _embed_new_chunks(job, title, _iter_new_batches(chunks, existing, BATCH_SIZE), stats)
+    new_count, near_count = stats["new"], stats["near"]
+    count(counters, "chunks_produced", len(chunks))
+    count(counters, "chunks_new", new_count)
+    count(counters, "chunks_near_duplicate", near_count)
+    count(counters, "chunks_skipped", len(chunks) - new_count - near_count)  # already stored or repeated in the document
+    if existing or near_count:
+        log(f"  - {len(existing)} chunks already stored, {near_count} near-duplicates linked, embedded {new_count} new")
+    yield {"job": job, "done": True}
+
+def write_stage(items: List[Dict]):
+    """
+    Writer flush: every row batch in one COPY + commit, then close the documents whose done
+    marker arrived. A dropped connection or deadlock is retried on a fresh connection; if the
+    combined write still fails it is retried document by document, so one bad document only
+    fails itself. A URL always goes to the same writer thread, so its rows precede its marker.
+    """
+    by_url: Dict[str, List[tuple]] = {}
+    links_by_url: Dict[str, List[tuple]] = {}
+    shared_by_url: Dict[str, List[tuple]] = {}
+    for item in items:
+        if "rows" in item and item["job"]["url"] not in _write_failed:
+            by_url.setdefault(item["job"]["url"], []).extend(item["rows"])
+            links_by_url.setdefault(item["job"]["url"], []).extend(item["links"])
+            shared_by_url.setdefault(item["job"]["url"], []).extend(item.get("shared", ()))
+    started = time.perf_counter()
+    try:
+        _db.run(lambda conn: write_document_rows(conn, [r for rows in by_url.values() for r in rows],
+                                                 [link for links in links_by_url.values() for link in links],
+                                                 [pair for pairs in shared_by_url.values() for pair in pairs]))
+    except Exception as e:
+        print(f"[write] batch of {len(by_url)} documents failed ({e}); retrying one by one", flush=True)
+        for url, rows in by_url.items():
+            try:
+                _db.run(lambda conn: write_document_rows(conn, rows, links_by_url[url], shared_by_url[url]))
+            except Exception as e_doc:
+                _write_failed[url] = str(e_doc)
+    if _near_dups is not None:  # committed now: later chunks from other URLs may link to these
+        _near_dups.add_many((neardup.from_signed(r[7]), r[4], url)
+                            for url, rows in by_url.items() if url not in _write_failed for r in rows)
+    # the shared COPY + commit is charged to each document by its share of the rows
+    elapsed = time.perf_counter() - started
+    total_rows = sum(len(rows) + len(links_by_url[url]) for url, rows in by_url.items()) or 1
+    for item in items:
+        job = item["job"]
+        url = job["url"]
+        if "rows" in item:
+            share = (len(item["rows"]) + len(item["links"])) / total_rows
+            job["timings"]["insert"] = job["timings"].get("insert", 0.0) + elapsed * share
+            if _journal is not None and url not in _write_failed:
+                _journal.clear_pending([r[4] for r in item["rows"]])
+                if item.get("checkpoint"):  # a streamed range is committed up to here
+                    _journal.save_checkpoint(url, **item["checkpoint"])
+            continue
+        if url in _write_failed:
+            job["log"].append(f"  - ERROR writing chunks for {url}: {_write_failed.pop(url)}")
+            _finish(job, "error")
+            continue
+        def record(conn):
+            _record_processed(conn, url, job["extracted"], "ingested", ingested=True)
+            if job.get("streamed"):  # recorded as too large by earlier runs; searchable now
+                clear_large_document(conn, url)
+        try:
+            with timed(job["timings"], "insert"):
+                _db.run(record)
+        except Exception as e:
+            job["log"].append(f"  - crawl_state update failed: {e}")
+        job["log"].append(f"  - Successfully inserted chunks for {url}")
+        _finish(job, "inserted")
+
+def _fail_writes(items: List[Dict], e: Exception):
+    for item in items:
+        if "done" in item:
+            _fail(item["job"], e)
+
+def plan_urls(conn, source: str, rows: List[Dict], skip_unchanged: bool = False, prune: bool = False) -> List[str]:
+    """Diff the source against its last snapshot: new rows first, then changed ones, then unchanged (or none)."""
+    source_snapshot.ensure_table(conn)
+    diff = source_snapshot.diff(rows, source_snapshot.load(conn, source))
+    source_snapshot.save(conn, source, rows, diff["removed"])
+    queued = source_snapshot.pending_removals(conn, source)
+    if queued and prune:
+        counts, cleared = source_snapshot.prune_removed(conn, queued)
+        for url in cleared:  # crawled from scratch if listed this run (no stale validators / content hash)
+            _crawl_states.pop(url, None)
+        print("Pruned removed URLs:", json.dumps(counts))
+    unchanged = diff["unchanged"]
+    if skip_unchanged:
+        # a URL never processed successfully has no crawl_state row: retried even if its row didn't change
+        unchanged = source_snapshot.unchanged_to_crawl(unchanged, _crawl_states)
+    skipped = len(diff["unchanged"]) - len(unchanged)
+    print(f"Source diff: {len(diff['new'])} new, {len(diff['changed'])} changed, {len(diff['unchanged'])} unchanged"
+          f"{f' ({skipped} skipped)' if skip_unchanged else ''}, {len(diff['removed'])} removed")
+    if queued and not prune:
+        print(f"{len(queued)} removed URLs queued for deletion; run with --prune-removed to delete their chunks")
+    # each group is spread across hosts on its own, so new URLs stay ahead of the rest
+    return [u for group in (diff["new"], diff["changed"], unchanged) for u in interleave_by_host(r["url"] for r in group)]
+
+# tables the writer touches; ANALYZEd after a run that wrote anything
+WRITTEN_TABLES = ("documents", "document_duplicates", "documents_large", "crawl_state")
+
+def finish_indexes(dropped: Optional[List[Dict]], wrote: bool):
+    """
+    After a run: rebuild the ANN index dropped for --bulk-load (HNSW if there was none) and
+    refresh planner statistics. Runs even when the run failed, so the index is never left missing.
+    """
+    if dropped is None and not wrote:
+        return
+    conn = get_conn()
+    try:
+        if dropped is not None:
+            for built in indexes.recreate(conn, "documents", "embedding", dropped or [{"method": "hnsw"}]):
+                print(f"Rebuilt {built['name']} over {built['rows']} rows in {built['seconds']:.1f}s "
+                      f"({built['bytes'] / 2 ** 20:.1f} MB, {json.dumps(built['params'])})")
+        print("ANALYZE:", json.dumps(indexes.analyze(conn, WRITTEN_TABLES)))
+    except Exception as e:
+        print(f"Index maintenance failed ({e}); run: python manage_indexes.py create && python manage_indexes.py analyze")
+    finally:
+        _db.putconn(conn)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest Google Sheet URLs into the documents table.")
+    parser.add_argument("--workers", type=int, default=PIPELINE_WORKERS,
+                        help="fetch threads: URLs downloaded concurrently (env PIPELINE_WORKERS, default %(default)s)")
+    parser.add_argument("--extract-workers", type=int, default=PDF_EXTRACT_PROCESSES,
+                        help="PDF/HTML parsing processes (env PDF_EXTRACT_PROCESSES, default %(default)s; 1 = in-process)")
+    parser.add_argument("--embed-workers", type=int, default=EMBED_WORKERS,
+                        help="documents chunked and embedded concurrently (env EMBED_WORKERS, default %(default)s)")
+    parser.add_argument("--writers", type=int, default=DB_WRITERS,
+                        help="Postgres writer threads flushing concurrently (env DB_WRITERS, default %(default)s)")
+    parser.add_argument("--write-batch-rows", type=int, default=WRITE_BATCH_ROWS,
+                        help="rows per writer COPY + commit (env WRITE_BATCH_ROWS, default %(default)s)")
+    parser.add_argument("--urls-file", default=os.getenv("PIPELINE_URLS_FILE"),
+                        help="read URLs from this file (one per line) instead of the Google Sheet (env PIPELINE_URLS_FILE)")
+    parser.add_argument("--local", default=os.getenv("PIPELINE_LOCAL_SOURCE"),
+                        help="ingest .txt/.md/.pdf files from this directory, or a manifest listing one path per line "
+                             "(env PIPELINE_LOCAL_SOURCE)")
+    parser.add_argument("--skip-unchanged", action="store_true",
+                        help="only ingest rows that are new or whose \"last modified\" column changed since the last run "
+                             "(plus URLs that never completed); unchanged rows aren't even re-crawled")
+    parser.add_argument("--prune-removed", action="store_true",
+                        help="delete the chunks of URLs removed from the source (otherwise they are only queued)")
+    parser.add_argument("--force", action="store_true",
+                        help="ignore crawl_state and re-ingest every URL even if unchanged")
+    parser.add_argument("--probe-cache", default=os.getenv("PROBE_CACHE_PATH"),
+                        help="JSON file persisting HEAD probe results between runs (env PROBE_CACHE_PATH)")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue the last unfinished run: skip URLs it already wrote, reuse its pending embeddings")
+    parser.add_argument("--journal", default=RUN_JOURNAL_PATH,
+                        help="sqlite run journal used for checkpoints and --resume (env RUN_JOURNAL_PATH)")
+    parser.add_argument("--metrics-log", default=os.getenv("METRICS_LOG"),
+                        help="JSON-lines run log: one line per URL with phase timings (env METRICS_LOG, "
+                             "default run-<id>.jsonl next to the journal)")
+    parser.add_argument("--prom-file", default=os.getenv("PROM_TEXTFILE"),
+                        help="write a Prometheus textfile summary of the run here (env PROM_TEXTFILE)")
+    parser.add_argument("--backfill-simhash", action="store_true",
+                        help="compute SimHash fingerprints for stored chunks that predate near-duplicate detection")
+    parser.add_argument("--bulk-load", action="store_true", default=os.getenv("PIPELINE_BULK_LOAD") == "1",
+                        help="drop the documents.embedding ANN index during the run and rebuild it at the end "
+                             "(faster large loads; searches scan meanwhile) (env PIPELINE_BULK_LOAD=1)")
+    parser.add_argument("--slowest", type=int, default=10, help="report the N slowest URLs at the end (default %(default)s)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    global _probe_cache, _journal, _metrics, _near_dups, _db, PDF_EXTRACT_PROCESSES
+    global host_limiter, session, embedder
+    args = parse_args(argv)
+    if not all([POSTGRES_URL, OPENAI_API_KEY]):
+        raise SystemExit("Missing env var: POSTGRES_URL or OPENAI_API_KEY")
+    # per-host concurrency + rate; 429s slow the host down instead of sleeping in Retry
+    host_limiter = HostLimiter(HOST_MAX_CONCURRENCY, HOST_RPS, overrides=parse_host_limits(HOST_LIMITS))
+    session = make_session(host_limiter)
+    embedder = make_embedder()
+    workers = max(1, args.workers)
+    PDF_EXTRACT_PROCESSES = max(1, args.extract_workers)
+    _probe_cache = ProbeCache(args.probe_cache, ttl_seconds=PROBE_CACHE_TTL_HOURS * 3600)
+    print("--- Starting safe ingestion pipeline ---")
+    if args.local:
+        rows, source = [{"url": u} for u in local_source.local_urls(args.local)], f"local:{os.path.abspath(args.local)}"
+    elif args.urls_file:
+        rows, source = [{"url": u} for u in urls_from_file(args.urls_file)], f"file:{os.path.abspath(args.urls_file)}"
+    else:
+        if not (GOOGLE_SHEET_ID and GOOGLE_APPLICATION_CREDENTIALS_JSON):
+            raise SystemExit("Missing env var: GOOGLE_SHEET_ID or GOOGLE_APPLICATION_CREDENTIALS_JSON "
+                             "(or pass --urls-file / --local)")
+        rows, source = sheet_rows_from_sheet(), f"sheet:{GOOGLE_SHEET_ID}"
+    if not args.local and GOOGLE_APPLICATION_CREDENTIALS_JSON:
+        by_url = {r["url"]: r for r in rows}
+        rows = [by_url.get(u, {"url": u}) for u in expand_google_sources(list(by_url))]
+    writers = max(1, args.writers)
+    print(f"Found {len(rows)} URLs in {source.split(':')[0]}. Workers: fetch {workers}, extract {PDF_EXTRACT_PROCESSES}, "
+          f"embed {args.embed_workers}, write {writers}")
+
+    # every stage thread may hold a connection, plus main's / finish_indexes'
+    _db = db.Pool(POSTGRES_URL, maxconn=workers + PDF_EXTRACT_PROCESSES + args.embed_workers + writers + 1)
+
+    conn = get_conn()
+    try:
+        storage, dims = vectors.column_type(conn, "documents", "embedding")
+        if dims and dims != VECTOR_DIMENSION:
+            raise SystemExit(f"documents.embedding is {storage}({dims}) but EMBEDDING_DIMENSIONS={VECTOR_DIMENSION}; "
+                             f"set it to {dims} or migrate with scripts/migrate_embeddings.py")
+        crawl_state.ensure_table(conn)
+        _crawl_states.clear()
+        if not args.force:
+            _crawl_states.update(crawl_state.load_all(conn))
+        print(f"Crawl state: {len(_crawl_states)} known URLs{' (ignored, --force)' if args.force else ''}")
+        neardup.ensure_schema(conn)
+        # before the near-duplicate index is loaded, so pruned chunks aren't in it
+        urls = plan_urls(conn, source, rows, skip_unchanged=args.skip_unchanged, prune=args.prune_removed)
+        if args.backfill_simhash:
+            print(f"Backfilled SimHash for {neardup.backfill(conn)} stored chunks")
+        _near_dups = None
+        if NEAR_DUP_MAX_DISTANCE >= 0:
+            _near_dups = neardup.NearDupIndex(NEAR_DUP_MAX_DISTANCE)
+            started = time.perf_counter()
+            loaded = neardup.load_index(conn, _near_dups)
+            missing = neardup.count_missing(conn)
+            print(f"Near-duplicate index: {loaded} stored chunks in {time.perf_counter() - started:.1f}s, "
+                  f"max distance {NEAR_DUP_MAX_DISTANCE}"
+                  + (f" ({missing} without a fingerprint; run with --backfill-simhash)" if missing else ""))
+        dropped = None
+        if args.bulk_load and urls:
+            dropped = indexes.drop_indexes(conn, "documents", "embedding")
+            print(f"Bulk load: dropped {len(dropped)} ANN index(es) on documents.embedding; rebuilt after the run")
+        elif not any(idx["valid"] for idx in indexes.list_indexes(conn, "documents", "embedding")):
+            print("No ANN index on documents.embedding: searches scan every vector "
+                  "(python manage_indexes.py create, or --bulk-load)")
+    finally:
+        _db.putconn(conn)
+
+    _journal = RunJournal(args.journal)
+    run_id = _journal.start_run(source, resume=args.resume)
+    if _journal.resumed:
+        done = _journal.completed_urls()
+        urls = [u for u in urls if u not in done]
+        print(f"Resuming run {run_id}: {len(done)} URLs already complete, {len(urls)} remaining")
+    elif args.resume:
+        print(f"No unfinished run to resume; started run {run_id}")
+    metrics_log = args.metrics_log or os.path.join(os.path.dirname(os.path.abspath(args.journal)), f"run-{run_id}.jsonl")
+    _metrics = RunMetrics(metrics_log, keep_slowest=max(1, args.slowest))
+    _metrics.event("run_start", run_id=run_id, source=source, urls=len(urls), workers=workers,
+                   extract_workers=PDF_EXTRACT_PROCESSES, embed_workers=args.embed_workers, writers=writers)
+
+    _counts.clear()
+    writer = BatchSink("write", write_stage, max_size=max(1, args.write_batch_rows), max_wait=WRITE_FLUSH_SECONDS,
+                       size_of=lambda item: len(item.get("rows", ())), maxsize=STAGE_QUEUE_SIZE,
+                       on_error=_fail_writes, workers=writers, key=lambda item: item["job"]["url"])
+    embed = Stage("embed", embed_stage, args.embed_workers, writer, maxsize=STAGE_QUEUE_SIZE, on_error=_fail)
+    # extract threads mostly wait on the process pool; one per process keeps it busy
+    extract = Stage("extract", extract_stage, PDF_EXTRACT_PROCESSES, embed, maxsize=STAGE_QUEUE_SIZE, on_error=_fail)
+    fetch = Stage("fetch", fetch_stage, workers, extract, maxsize=STAGE_QUEUE_SIZE, on_error=_fail)
+    stages = [fetch, extract, embed, writer]
+    try:
+        run_stages(stages, map(_new_job, urls))
+        if _counts.get("error", 0) == 0:
+            _journal.finish()
+        else:
+            # finish() drops pending embeddings and stream checkpoints; keep them for the retry
+            print(f"{_counts['error']} URL(s) failed; run {run_id} stays open — "
+                  f"rerun with --resume to retry them")
     finally:
-        conn.close()
+        cpu_pool.shutdown()
+        embedder.close()
+        finish_indexes(dropped, wrote=_counts.get("inserted", 0) > 0)
+        _db.closeall()
+        stage_stats = {st.name: {k: round(v, 2) for k, v in st.stats.items()} for st in stages}
+        host_stats = host_limiter.report()
+        print("Stages:", json.dumps(stage_stats))
+        print("Embeddings:", json.dumps(embedder.stats, sort_keys=True))
+        print("DB pool:", json.dumps(_db.stats, sort_keys=True))
+        print("Hosts:")
+        for host, row in sorted(host_stats.items(), key=lambda kv: -kv[1]["requests"]):
+            print(f"  {host}: {json.dumps(row)}")
+        _metrics.add_counters({f"embed_{k}": v for k, v in embedder.stats.items()})
+        _metrics.add_counters({f"http_{k}": sum(row[k] for row in host_stats.values())
+                               for k in ("requests", "errors", "throttled", "retries")})
+        summary = _metrics.summary()
+        _metrics.event("run_end", stages=stage_stats, hosts=host_stats, **summary)
+        _metrics.close()
+        if args.prom_file:
+            _metrics.write_prometheus(args.prom_file)
+        print("Phases:", json.dumps(summary["phases"]))
+        print(f"Slowest {args.slowest} URLs:")
+        for row in _metrics.slowest(args.slowest):
+            phases = ", ".join(f"{k} {v:.2f}s" for k, v in list(row["timings"].items())[:3])
+            print(f"  {row['elapsed_s']:8.2f}s  {row['status']:<9} {row['url']}  ({phases})")
+        print(f"Run log: {metrics_log}")
+        _probe_cache.save()
+        _journal.close()
+        print("URL results:", json.dumps(_counts, sort_keys=True))
         print("Pipeline finished:", time.strftime("%Y-%m-%dT%H:%M:%S"))
 
 if __name__ == "__main__":
@@ -11,58 +11,97 @@ Usage:
 Environment variables:
   OPENAI_API_KEY - OpenAI API key
   POSTGRES_URL - Neon PostgreSQL connection string
+  EMBED_CACHE_DIR - local embedding cache (default .cache/embeddings, "" to disable)
+  DB_RETRIES / DB_RETRY_BACKOFF - reconnect attempts and backoff (see ingestion/db.py)
 """
 
 import os
+import sys
 import json
-import time
 from pathlib import Path
 import frontmatter
-import psycopg2
-from psycopg2.extras import execute_values
-import openai
+
+# shared ingestion helpers live at the repo root (ingestion/)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from ingestion import db, indexes, vectors
+from ingestion.embed_cache import EmbeddingCache
+from ingestion.embeddings import EmbeddingScheduler
 
 # Environment variables
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 NEON_DATABASE_URL = os.getenv("POSTGRES_URL")
 EMBED_MODEL = "text-embedding-3-small"
+EMBED_DIMENSION = int(os.getenv("EMBEDDING_DIMENSIONS", "1536"))  # must match pipeline.py and the retriever
+# local embedding cache shared with pipeline.py; EMBED_CACHE_DIR="" disables it
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", str(Path(__file__).resolve().parent.parent / ".cache" / "embeddings"))
+EMBED_CACHE_MAX_MB = int(os.getenv("EMBED_CACHE_MAX_MB", "2048"))
 MD_DIR = Path("kb/questions")
 
 if not OPENAI_API_KEY or not NEON_DATABASE_URL:
     raise SystemExit("❌ Error: Set OPENAI_API_KEY and POSTGRES_URL env vars")
 
-# Initialize OpenAI client
-openai.api_key = OPENAI_API_KEY
+# Shared embedding scheduler (same model as RAG system): packs texts into requests,
+# keeps several in flight and paces them by the RPM/TPM limits instead of fixed sleeps
+embedder = EmbeddingScheduler(
+    EMBED_MODEL, EMBED_DIMENSION,
+    requests_per_minute=float(os.getenv("EMBED_RPM", "3000")),
+    tokens_per_minute=float(os.getenv("EMBED_TPM", "1000000")),
+    max_in_flight=int(os.getenv("EMBED_MAX_IN_FLIGHT", "4")),
+    api_key=OPENAI_API_KEY,
+    cache=EmbeddingCache(EMBED_CACHE_DIR, EMBED_CACHE_MAX_MB * 1024 * 1024) if EMBED_CACHE_DIR else None,
+)
 
 
-def embed_text(text: str):
+def embed_rows(rows):
     """
-    Create embedding using OpenAI API (same model as RAG system).
-    Returns list of floats (1536 dimensions for text-embedding-3-small).
+    Fill qemb/aemb for every row with one scheduled batch (questions and answers together).
+    If the batch fails, fall back to per-row embedding so one bad file doesn't sink the rest.
+    Returns the rows that have both embeddings.
     """
+    texts = [t for row in rows for t in (row["question"], row["gold_answer"])]
     try:
-        resp = openai.embeddings.create(model=EMBED_MODEL, input=text)
-        return resp.data[0].embedding
+        embeddings = embedder.embed(texts)
+        for i, row in enumerate(rows):
+            row["qemb"], row["aemb"] = embeddings[2 * i], embeddings[2 * i + 1]
+        return rows
     except Exception as e:
-        print(f"❌ Embedding failed: {e}")
-        raise
+        print(f"⚠️  Batch embedding failed ({e}); retrying file by file")
+    ok = []
+    for row in rows:
+        try:
+            row["qemb"], row["aemb"] = embedder.embed([row["question"], row["gold_answer"]])
+            ok.append(row)
+        except Exception as e:
+            print(f"  ❌ Embedding failed for {row['id']}: {e}")
+    return ok
+
+
+STAGING_COLUMNS = ("id", "question", "gold_answer", "gold_claims", "sources",
+                   "qemb", "aemb", "human_confidence", "verified_by", "last_verified")
 
 
 def upsert_gold(conn, row):
     """
     Upsert a gold answer into the database.
     On conflict (duplicate id), updates all fields and increments version.
+    Embeddings are sent in pgvector's binary format via a COPY into a temp staging table.
+    """
+    staging_sql = """
+    CREATE TEMP TABLE IF NOT EXISTS gold_answers_staging (
+      id TEXT, question TEXT, gold_answer TEXT, gold_claims TEXT, sources TEXT,
+      qemb vector, aemb vector, human_confidence TEXT, verified_by TEXT, last_verified TEXT
+    ) ON COMMIT DELETE ROWS
     """
     sql = """
     INSERT INTO public.gold_answers
       (id, question, gold_answer, gold_claims, sources, 
        question_embedding, answer_embedding, 
        human_confidence, verified_by, last_verified, created_at, updated_at)
-    VALUES (
-      %(id)s, %(question)s, %(gold_answer)s, %(gold_claims)s, %(sources)s,
-      %(qemb)s::vector, %(aemb)s::vector,
-      %(human_confidence)s, %(verified_by)s, %(last_verified)s, now(), now()
-    )
+    SELECT
+      id, question, gold_answer, gold_claims::jsonb, sources::jsonb,
+      qemb, aemb,
+      human_confidence::float8, verified_by, last_verified::timestamp, now(), now()
+    FROM gold_answers_staging
     ON CONFLICT (id) DO UPDATE SET
       question = EXCLUDED.question,
       gold_answer = EXCLUDED.gold_answer,
@@ -77,7 +116,10 @@ def upsert_gold(conn, row):
       updated_at = now();
     """
     with conn.cursor() as cur:
-        cur.execute(sql, row)
+        cur.execute(staging_sql)
+        vectors.copy_rows(cur, "gold_answers_staging", STAGING_COLUMNS,
+                          [tuple(row[c] for c in STAGING_COLUMNS)])
+        cur.execute(sql)
     conn.commit()
 
 
@@ -131,7 +173,9 @@ def main():
     # Connect to database
     print(f"📡 Connecting to Neon PostgreSQL...")
     try:
-        conn = psycopg2.connect(NEON_DATABASE_URL)
+        # same pooled layer as pipeline.py: connects are retried while a suspended compute wakes up
+        pool = db.Pool(NEON_DATABASE_URL, maxconn=2)
+        pool.run(lambda conn: None)
         print("✅ Connected to database")
     except Exception as e:
         print(f"❌ Database connection failed: {e}")
@@ -143,12 +187,13 @@ def main():
     
     if len(md_files) == 0:
         print("⚠️  No markdown files found. Create .md files in kb/questions/")
-        conn.close()
+        pool.closeall()
         return
     
     print()
     
-    # Process each file
+    # Parse each file
+    rows = []
     for idx, md_file in enumerate(md_files, 1):
         print(f"[{idx}/{len(md_files)}] Processing: {md_file.name}")
         
@@ -186,41 +231,46 @@ def main():
             gold_claims = parse_atomic_claims(gold_answer)
             print(f"  📋 Extracted {len(gold_claims)} atomic claims")
             
-            # Compute embeddings
-            print(f"  🧮 Computing question embedding...")
-            question_embedding = embed_text(question)
-            
-            print(f"  🧮 Computing answer embedding...")
-            answer_embedding = embed_text(gold_answer)
-            
-            # Prepare row for database
-            row = {
+            # Prepare row for database (embeddings are computed for all files at once below)
+            rows.append({
                 "id": id,
                 "question": question,
                 "gold_answer": gold_answer,
                 "gold_claims": json.dumps(gold_claims),
                 "sources": json.dumps(sources),
-                "qemb": question_embedding,
-                "aemb": answer_embedding,
+                "qemb": None,
+                "aemb": None,
                 "human_confidence": human_confidence,
                 "verified_by": verified_by,
                 "last_verified": last_verified
-            }
-            
-            # Upsert to database
-            print(f"  💾 Upserting to database...")
-            upsert_gold(conn, row)
-            print(f"  ✅ Success!\n")
-            
-            # Rate limiting (OpenAI has 3000 RPM limit for embeddings)
-            time.sleep(0.2)
+            })
+            print()
             
         except Exception as e:
             print(f"  ❌ Error processing {md_file.name}: {e}\n")
             continue
     
-    # Close connection
-    conn.close()
+    # Compute question + answer embeddings for every file in one scheduled batch
+    print(f"🧮 Computing {2 * len(rows)} embeddings...")
+    rows = embed_rows(rows)
+    print(f"   {json.dumps(embedder.stats)}")
+    
+    # Upsert to database
+    for row in rows:
+        try:
+            print(f"💾 Upserting {row['id']}...")
+            # a dropped connection is retried on a fresh one (upsert_gold can safely run again)
+            pool.run(lambda conn: upsert_gold(conn, row))
+            print(f"  ✅ Success!")
+        except Exception as e:
+            print(f"  ❌ Error upserting {row['id']}: {e}")
+    embedder.close()
+    
+    # Fresh planner statistics for the gold searches (ANN indexes: python manage_indexes.py create)
+    pool.run(lambda conn: indexes.analyze(conn, ["gold_answers"]))
+    
+    # Close connections
+    pool.closeall()
     
     print("=" * 60)
     print(f"✅ Ingestion complete! Processed {len(md_files)} files.")
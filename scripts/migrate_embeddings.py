@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+migrate_embeddings.py
+- Changes how stored embeddings are kept: fewer dimensions and/or halfvec (float16) instead of vector (float32)
+- Covers documents.embedding and gold_answers.question_embedding / answer_embedding together:
+  the retriever embeds one query for both tables, so they must always match
+- No re-embedding: text-embedding-3 vectors shortened to N dimensions by the API are the first
+  N values re-normalized, so stored vectors are shortened in SQL (subvector + l2_normalize)
+- Online: a <column>_next column is backfilled in batches while the app keeps serving, then swapped in
+  under a short lock (rows written meanwhile are caught up inside it). The old column is kept as
+  <column>_full for --rollback and bench/bench_vector_storage.py until --finish drops it
+- ANN indexes are built CONCURRENTLY on <column>_next before the swap (vector_* operator classes
+  become halfvec_*, build parameters are kept); the rename carries them over, so the lock only
+  drops the old column's indexes
+
+pgvector (>= 0.7) stores vector (4 bytes/dim) and halfvec (2 bytes/dim); it has no int8 type.
+
+Usage:
+  python scripts/migrate_embeddings.py --dimensions 512 --storage halfvec          # show the plan
+  python scripts/migrate_embeddings.py --dimensions 512 --storage halfvec --apply
+  python scripts/migrate_embeddings.py --rollback     # swap the <column>_full columns back
+  python scripts/migrate_embeddings.py --finish       # drop the <column>_full columns
+Then run pipeline.py / ingest_md_to_neon.py and the app with EMBEDDING_DIMENSIONS=512 EMBEDDING_STORAGE=halfvec.
+
+Environment variables:
+  POSTGRES_URL - Neon PostgreSQL connection string
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+import psycopg2
+
+# shared ingestion helpers live at the repo root (ingestion/)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from ingestion import indexes, vectors
+
+COLUMNS = [("documents", "embedding"), ("gold_answers", "question_embedding"), ("gold_answers", "answer_embedding")]
+
+
+def pgvector_version(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+        row = cur.fetchone()
+    conn.commit()
+    return tuple(int(x) for x in re.findall(r"\d+", row[0])[:2]) if row else None
+
+
+def row_count(conn, table, column):
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT count(*) FROM {table} WHERE {column} IS NOT NULL")
+        n = cur.fetchone()[0]
+    conn.commit()
+    return n
+
+
+def index_params(definition):
+    """{param: value} from the WITH (...) of a pg_get_indexdef() definition."""
+    m = re.search(r"\bWITH \((.*)\)", definition)
+    return {k: int(v) for k, v in re.findall(r"(\w+)\s*=\s*'?(\d+)'?", m.group(1))} if m else None
+
+
+def convert_expr(column, source, target):
+    """SQL turning a `source` (type, dims) value into `target` (type, dims)."""
+    expr = column
+    if target[1] != source[1]:
+        expr = f"l2_normalize(subvector({column}, 1, {target[1]}))"
+    return f"{expr}::{target[0]}({target[1]})"
+
+
+def bytes_per_row(storage, dims):
+    return (2 if storage == "halfvec" else 4) * dims + 8
+
+
+def backfill(conn, table, column, expr, batch_size):
+    total = 0
+    while True:
+        started = time.perf_counter()
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                UPDATE {table} SET {column}_next = {expr}
+                WHERE ctid = ANY(ARRAY(SELECT ctid FROM {table}
+                                       WHERE {column}_next IS NULL AND {column} IS NOT NULL LIMIT %s))
+                """,
+                (batch_size,),
+            )
+            n = cur.rowcount
+        conn.commit()
+        if not n:
+            return total
+        total += n
+        print(f"   {table}.{column}: {total} rows backfilled ({n / (time.perf_counter() - started):.0f} rows/s)")
+
+
+def build_next_indexes(conn, table, column):
+    """
+    CREATE INDEX CONCURRENTLY on <column>_next for each ANN index the live column has (same
+    method and parameters; the operator class follows the new column's type), so the swap
+    doesn't rebuild anything under its lock.
+    """
+    for idx in indexes.list_indexes(conn, table, column):
+        try:
+            result = indexes.create_index(conn, table, f"{column}_next", idx["method"], index_params(idx["definition"]))
+        except ValueError as e:
+            raise SystemExit(f"can't index {table}.{column}_next: {e}")
+        if result:
+            print(f"   built {result['name']} in {result['seconds']:.1f}s ({result['bytes'] / 2 ** 20:.1f} MB)")
+
+
+def swap(conn, table, column, old_name, expr):
+    """
+    Rename column -> old_name and <column>_next -> column in one transaction, catching up rows
+    written since the backfill (expr is None when swapping back). The old column's indexes are
+    dropped; the ones built on <column>_next come along and get the usual names.
+    """
+    old = indexes.list_indexes(conn, table, column)
+    new = indexes.list_indexes(conn, table, f"{column}_next")
+    with conn.cursor() as cur:
+        cur.execute(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE")
+        if expr:
+            cur.execute(f"UPDATE {table} SET {column}_next = {expr} WHERE {column}_next IS NULL AND {column} IS NOT NULL")
+        for idx in old:
+            cur.execute(f"DROP INDEX {idx['name']}")
+        cur.execute(f"ALTER TABLE {table} RENAME COLUMN {column} TO {old_name}")
+        cur.execute(f"ALTER TABLE {table} RENAME COLUMN {column}_next TO {column}")
+        for idx in new:
+            cur.execute(f"ALTER INDEX {idx['name']} RENAME TO {indexes.index_name(table, column, idx['method'])}")
+    conn.commit()
+
+
+def migrate(conn, dims, storage, apply, batch_size):
+    for table, column in COLUMNS:
+        source = vectors.column_type(conn, table, column)
+        if source[0] is None:
+            print(f"- {table}.{column}: no such column, skipping")
+            continue
+        if source[1] is None:
+            raise SystemExit(f"{table}.{column} is {source[0]} without a declared dimension; "
+                             f"ALTER it to {source[0]}(N) first")
+        target = (storage, dims or source[1])
+        if target[1] > source[1]:
+            raise SystemExit(f"{table}.{column} has {source[1]} dims; can't grow to {target[1]} without re-embedding")
+        if vectors.column_type(conn, table, f"{column}_full")[0] is not None:
+            raise SystemExit(f"{table}.{column}_full exists from an earlier migration: --finish or --rollback it first")
+        n = row_count(conn, table, column)
+        expr = convert_expr(column, source, target)
+        print(f"- {table}.{column}: {source[0]}({source[1]}) -> {target[0]}({target[1]}), {n} rows, "
+              f"~{n * bytes_per_row(*source) / 2 ** 20:.1f} MB -> ~{n * bytes_per_row(*target) / 2 ** 20:.1f} MB")
+        if target == source:
+            print("   already in this format")
+            continue
+        for idx in indexes.list_indexes(conn, table, column):
+            print(f"   index to rebuild on {column}_next before the swap: {idx['definition']}")
+        if not apply:
+            continue
+        with conn.cursor() as cur:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column}_next {target[0]}({target[1]})")
+        conn.commit()
+        backfill(conn, table, column, expr, batch_size)
+        build_next_indexes(conn, table, column)
+        swap(conn, table, column, f"{column}_full", expr)
+        print(f"   swapped; previous values kept in {table}.{column}_full")
+
+
+def rollback(conn):
+    for table, column in COLUMNS:
+        if vectors.column_type(conn, table, f"{column}_next")[0] is not None:
+            # an --apply that stopped during the backfill; the live column was never touched
+            with conn.cursor() as cur:
+                cur.execute(f"ALTER TABLE {table} DROP COLUMN {column}_next")
+            conn.commit()
+            print(f"- {table}.{column}: dropped the unfinished {column}_next")
+        full = vectors.column_type(conn, table, f"{column}_full")
+        if full[0] is None:
+            continue
+        current = vectors.column_type(conn, table, column)
+        print(f"- {table}.{column}: {current[0]}({current[1]}) -> back to {full[0]}({full[1]})")
+        with conn.cursor() as cur:
+            cur.execute(f"ALTER TABLE {table} RENAME COLUMN {column}_full TO {column}_next")
+        conn.commit()
+        build_next_indexes(conn, table, column)
+        swap(conn, table, column, f"{column}_discard", None)
+        with conn.cursor() as cur:
+            cur.execute(f"ALTER TABLE {table} DROP COLUMN {column}_discard")
+            # rows written after the migration only ever had the shortened vector
+            cur.execute(f"SELECT count(*) FROM {table} WHERE {column} IS NULL")
+            missing = cur.fetchone()[0]
+        conn.commit()
+        if missing:
+            print(f"   {missing} rows written since the migration have no {table}.{column}; delete and re-ingest them")
+
+
+def finish(conn):
+    for table, column in COLUMNS:
+        if vectors.column_type(conn, table, f"{column}_full")[0] is None:
+            continue
+        with conn.cursor() as cur:
+            cur.execute(f"ALTER TABLE {table} DROP COLUMN {column}_full")
+        conn.commit()
+        print(f"- dropped {table}.{column}_full")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--dimensions", type=int, help="target dimensions (default: keep the current ones)")
+    ap.add_argument("--storage", choices=vectors.STORAGE_TYPES, default="vector")
+    ap.add_argument("--apply", action="store_true", help="run the migration (default: only print the plan)")
+    ap.add_argument("--batch-size", type=int, default=2000, help="rows per backfill transaction")
+    ap.add_argument("--rollback", action="store_true", help="restore the <column>_full columns kept by the migration")
+    ap.add_argument("--finish", action="store_true", help="drop the <column>_full columns once the new format is verified")
+    args = ap.parse_args()
+    if not os.getenv("POSTGRES_URL"):
+        raise SystemExit("Set POSTGRES_URL")
+    conn = psycopg2.connect(os.getenv("POSTGRES_URL"))
+    try:
+        version = pgvector_version(conn)
+        if version is None or version < (0, 7):
+            raise SystemExit(f"pgvector >= 0.7 is needed for halfvec / subvector / l2_normalize (found {version})")
+        if args.rollback:
+            rollback(conn)
+        elif args.finish:
+            finish(conn)
+        else:
+            migrate(conn, args.dimensions, args.storage, args.apply, args.batch_size)
+            if not args.apply:
+                print("\nDry run: re-run with --apply to migrate")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""chunking: ChunkedText / StreamChunker must produce exactly the old list-based chunks."""
+
+import random
+
+import pytest
+
+from ingestion import chunking
+from ingestion.chunking import ChunkedText, StreamChunker
+
+
+def legacy_chunks(text, chunk_size, overlap):
+    # the list-based chunker pipeline.chunk_text used before ChunkedText
+    words = text.split()
+    step = max(1, chunk_size - overlap)
+    return [" ".join(words[i:i + chunk_size]) for i in range(0, len(words), step)]
+
+
+def _pages(rng, count, max_words):
+    tokens = ["a", "bb", "ccc\n", "d  e", "f\tg", "\n\n", "héllo"]
+    return [" ".join(rng.choice(tokens) for _ in range(rng.randint(0, max_words))) for _ in range(count)]
+
+
+@pytest.mark.parametrize("chunk_size,overlap", [(5, 0), (5, 2), (50, 10), (400, 80), (3, 5)])
+def test_chunked_text_matches_legacy(chunk_size, overlap):
+    rng = random.Random(chunk_size * 100 + overlap)
+    for _ in range(30):
+        text = "\n".join(_pages(rng, rng.randint(0, 6), 300))
+        chunks = ChunkedText(text, chunk_size, overlap)
+        expected = legacy_chunks(text, chunk_size, overlap)
+        assert list(chunks) == expected
+        assert list(chunks) == expected  # re-iterable
+        assert len(chunks) == len(expected)
+        assert chunks.word_count == len(text.split())
+
+
+def test_segments_cut_only_at_whitespace():
+    text = "  ".join(f"word{i}" for i in range(500)) + "\n tail end "
+    segments = list(chunking._iter_segment_words(text, segment_chars=7))
+    assert len(segments) > 100
+    assert [w for words in segments for w in words] == text.split()
+
+
+def test_chunked_text_across_segment_boundaries():
+    # several SEGMENT_CHARS segments: windows straddle the cuts
+    rng = random.Random(3)
+    text = " ".join(f"w{rng.randint(0, 10 ** 6)}" + rng.choice([" ", "\n", "  \t"]) for _ in range(40000))
+    assert len(text) > 3 * chunking.SEGMENT_CHARS
+    assert list(ChunkedText(text, 400, 80)) == legacy_chunks(text, 400, 80)
+
+
+@pytest.mark.parametrize("text", ["", "   \n\t ", "one"])
+def test_chunked_text_small_inputs(text):
+    chunks = ChunkedText(text, 400, 80)
+    assert list(chunks) == legacy_chunks(text, 400, 80)
+    assert bool(chunks) == bool(text.split())
+
+
+def test_stream_chunker_matches_joined_text():
+    rng = random.Random(7)
+    for _ in range(100):
+        pages = _pages(rng, rng.randint(0, 8), 400)
+        size, overlap = rng.choice([(5, 1), (50, 10), (400, 80)])
+        chunker = StreamChunker(size, overlap)
+        out = [c for page in pages for c in chunker.feed(page)] + chunker.finish()
+        assert out == legacy_chunks("\n".join(pages), size, overlap)
+
+
+def test_stream_chunker_carry_and_restore():
+    # a checkpoint after any page range resumes to the same chunks as one uninterrupted pass
+    rng = random.Random(11)
+    for _ in range(100):
+        pages = _pages(rng, rng.randint(1, 8), 500)
+        size, overlap = rng.choice([(5, 2), (50, 10), (400, 80)])
+        cut = rng.randint(0, len(pages))
+        first = StreamChunker(size, overlap)
+        out = [c for page in pages[:cut] for c in first.feed(page)]
+        resumed = StreamChunker(size, overlap)
+        resumed.restore(first.carry(), first.word_count)
+        out += [c for page in pages[cut:] for c in resumed.feed(page)] + resumed.finish()
+        full = "\n".join(pages)
+        assert out == legacy_chunks(full, size, overlap)
+        assert resumed.word_count == len(full.split())
+
+
+def test_carry_is_the_unchunked_tail():
+    chunker = StreamChunker(4, 1)
+    assert chunker.feed("a b c d e f") == ["a b c d"]
+    assert chunker.carry() == "d e f"
+    assert chunker.finish() == ["d e f"]
@@ -0,0 +1,51 @@
+"""cpu_pool: a worker that dies takes down only its own task, not the pool for later ones."""
+
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from ingestion import cpu_pool
+
+
+def _square(x):
+    return x * x
+
+
+def _die_once(marker, x):
+    # stands in for a MuPDF segfault on the first attempt
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return x * x
+
+
+def _die(x):
+    os._exit(1)
+
+
+@pytest.fixture(autouse=True)
+def _fresh_pool():
+    yield
+    cpu_pool.shutdown()
+
+
+def test_run_in_process():
+    assert cpu_pool.run(1, _square, 3) == 9
+
+
+def test_worker_death_is_retried_on_a_new_pool(tmp_path):
+    assert cpu_pool.run(2, _die_once, str(tmp_path / "died"), 4) == 16
+    assert cpu_pool.run(2, _square, 5) == 25
+
+
+def test_second_death_fails_only_that_task():
+    with pytest.raises(BrokenProcessPool):
+        cpu_pool.run(2, _die, 1)
+    assert cpu_pool.run(2, _square, 6) == 36
+
+
+def test_pending_futures_survive_a_dead_worker(tmp_path):
+    marker = str(tmp_path / "died")
+    tasks = [cpu_pool.submit(2, _die_once, marker, x) for x in range(4)]
+    assert [cpu_pool.result(2, pool, fut, _die_once, marker, x) for x, (pool, fut) in enumerate(tasks)] == [0, 1, 4, 9]
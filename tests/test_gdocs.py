@@ -0,0 +1,52 @@
+"""gdocs: Google Docs body text, including tables, and URL parsing."""
+
+from ingestion import gdocs
+
+
+def _para(*runs):
+    return {"paragraph": {"elements": [{"textRun": {"content": r}} for r in runs]}}
+
+
+def _cell(*content):
+    return {"content": list(content)}
+
+
+def _table(*rows):
+    return {"table": {"tableRows": [{"tableCells": list(cells)} for cells in rows]}}
+
+
+def test_doc_text_paragraphs():
+    doc = {"body": {"content": [{"sectionBreak": {}}, _para("Filing ", "fees\n"), _para("Second line\n")]}}
+    assert gdocs.doc_text(doc) == "Filing fees\nSecond line"
+
+
+def test_doc_text_tables():
+    doc = {"body": {"content": [
+        _para("Fees\n"),
+        _table([_cell(_para("Form\n")), _cell(_para("Fee\n"))],
+               [_cell(_para("I-485\n")), _cell(_para("$1,440\n"), _para("  plus biometrics \n"))],
+               [_cell(_para("\n")), _cell()]),  # empty rows are dropped
+        _para("After the table\n"),
+    ]}}
+    assert gdocs.doc_text(doc) == "Fees\nForm | Fee\nI-485 | $1,440 plus biometrics\nAfter the table"
+
+
+def test_doc_text_nested_table_and_toc():
+    inner = _table([_cell(_para("a\n")), _cell(_para("b\n"))])
+    doc = {"body": {"content": [
+        {"tableOfContents": {"content": [_para("Contents\n")]}},
+        _table([_cell(_para("outer\n"), inner)]),
+    ]}}
+    assert gdocs.doc_text(doc) == "Contents\nouter a | b"
+
+
+def test_doc_text_empty():
+    assert gdocs.doc_text({}) == ""
+
+
+def test_ids_from_urls():
+    assert gdocs.doc_id("https://docs.google.com/document/d/1AbC-d_9/edit#heading=h.1") == "1AbC-d_9"
+    assert gdocs.doc_id("https://example.com/doc") is None
+    assert gdocs.folder_id("https://drive.google.com/drive/folders/0Fold_er?usp=sharing") == "0Fold_er"
+    assert gdocs.folder_id("https://example.com/folders/abc") is None
+    assert gdocs.doc_url("xyz") == "https://docs.google.com/document/d/xyz/edit"
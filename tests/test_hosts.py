@@ -0,0 +1,65 @@
+"""hosts: HOST_LIMITS parsing and the host helpers used to schedule fetches."""
+
+import time
+from email.utils import formatdate
+
+import pytest
+
+from ingestion import hosts
+
+
+def test_parse_host_limits():
+    spec = "www.USCIS.gov=2/1.5, travel.state.gov=4/4,example.org=3"
+    assert hosts.parse_host_limits(spec) == {
+        "www.uscis.gov": (2, 1.5),
+        "travel.state.gov": (4, 4.0),
+        "example.org": (3, 0.0),  # no rate: unpaced
+    }
+
+
+@pytest.mark.parametrize("spec", ["", None, "no-equals-sign", " , "])
+def test_parse_host_limits_ignores_empty_items(spec):
+    assert hosts.parse_host_limits(spec) == {}
+
+
+def test_parse_host_limits_rejects_bad_numbers():
+    with pytest.raises(ValueError):
+        hosts.parse_host_limits("a.gov=two/1")
+
+
+def test_parse_retry_after():
+    assert hosts.parse_retry_after("12") == 12.0
+    assert hosts.parse_retry_after("-3") == 0.0
+    assert hosts.parse_retry_after(None) is None
+    assert hosts.parse_retry_after("soon") is None
+    later = hosts.parse_retry_after(formatdate(time.time() + 60, usegmt=True))
+    assert 55 <= later <= 61
+
+
+def test_interleave_by_host_round_robins():
+    urls = ["https://a.gov/1", "https://a.gov/2", "https://a.gov/3", "https://b.gov/1", "https://c.gov/1"]
+    assert hosts.interleave_by_host(urls) == [
+        "https://a.gov/1", "https://b.gov/1", "https://c.gov/1", "https://a.gov/2", "https://a.gov/3"]
+
+
+def test_host_of():
+    assert hosts.host_of("https://WWW.USCIS.gov/forms?x=1") == "www.uscis.gov"
+
+
+def test_limiter_applies_overrides():
+    limiter = hosts.HostLimiter(4, 2.0, overrides=hosts.parse_host_limits("slow.gov=1/0.5,big.gov=8/10"))
+    assert limiter.max_concurrency() == 8
+    assert limiter._host("slow.gov").base_interval == 2.0
+    assert limiter._host("other.gov").base_interval == 0.5
+
+
+def test_throttle_slows_the_host_and_success_recovers():
+    limiter = hosts.HostLimiter(2, 4.0)
+    url = "https://a.gov/x"
+    limiter.record(url, 429, 0.1, retry_after="0")
+    host = limiter._host("a.gov")
+    assert host.interval == 0.5
+    for _ in range(50):
+        limiter.record(url, 200, 0.1)
+    assert host.interval == host.base_interval
+    assert limiter.report()["a.gov"]["throttled"] == 1
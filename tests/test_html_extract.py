@@ -0,0 +1,63 @@
+"""html_extract: the streaming lxml engine must agree with the BeautifulSoup reference."""
+
+import pytest
+
+pytest.importorskip("bs4")
+
+from ingestion import html_extract
+from ingestion.html_extract import extract_html
+
+needs_lxml = pytest.mark.skipif(html_extract.etree is None, reason="lxml not installed")
+
+WORDS = " ".join(f"word{i}" for i in range(40))
+
+PAGES = {
+    "main-content": f"""<!doctype html><html><head><title> Green card </title><script>var x = 1;</script></head>
+        <body><header><nav><a href="/">Home</a></nav></header>
+        <div class="main-content"><div class="sidebar">Related links</div><h1>Adjustment</h1>
+        <p>{WORDS} <b>bold</b> tail</p><ul><li>one</li><li>two</li></ul><!-- a comment --></div>
+        <footer>Footer text</footer></body></html>""",
+    "article-with-boilerplate": f"""<html><head><title>News &amp; updates</title><style>p {{}}</style></head>
+        <body><article><nav>Skip</nav><p>{WORDS}</p><div class="cookie-banner">We use cookies</div>
+        <p>Second &nbsp; paragraph</p><template><p>hidden</p></template></article></body></html>""",
+    "role-main": f"""<html><body><div role="main"><p>{WORDS}</p><ruby>kan<rt>rt-text</rt></ruby></div></body></html>""",
+    "short-main-falls-back": f"""<html><head><title>Fallback</title></head><body>
+        <div id="main">too short</div><p>{WORDS}</p><footer>footer words</footer></body></html>""",
+    "no-main": f"""<html><head><title>Plain</title></head><body><p>{WORDS}</p><p>more text here</p></body></html>""",
+    "too-small": """<html><head><title>Tiny</title></head><body><p>just a few words</p></body></html>""",
+    "entities-and-whitespace": f"""<html><head><title>\n Forms &amp; fees\n</title></head><body>
+        <div class="content"><p>{WORDS}</p><p>caf&eacute; &lt;tag&gt;   spaced
+        out</p><br/>line</div></body></html>""",
+    "no-title": f"""<html><body><div class="content content-wide"><p>{WORDS}</p></div></body></html>""",
+    "xml-declaration": f"""<?xml version="1.0" encoding="utf-8"?><html><head><title>XHTML</title></head>
+        <body><article><p>{WORDS}</p></article></body></html>""",
+}
+
+
+@needs_lxml
+@pytest.mark.parametrize("name", sorted(PAGES))
+def test_engines_agree(name):
+    url = "https://www.uscis.gov/page"
+    assert extract_html(PAGES[name], url, engine="lxml") == extract_html(PAGES[name], url, engine="bs4")
+
+
+def test_main_content_without_boilerplate():
+    out = extract_html(PAGES["main-content"], "https://www.uscis.gov/page", engine="bs4")
+    assert out["title"] == "Green card"
+    assert out["text"].startswith("Adjustment\nword0")
+    for boilerplate in ("Related links", "Home", "Footer text", "var x", "a comment"):
+        assert boilerplate not in out["text"]
+
+
+def test_fallbacks():
+    url = "https://www.uscis.gov/page"
+    fallback = extract_html(PAGES["short-main-falls-back"], url, engine="bs4")
+    assert "word39" in fallback["text"] and "too short" in fallback["text"]
+    assert extract_html(PAGES["no-title"], url, engine="bs4")["title"] == "www.uscis.gov"
+    tiny = extract_html(PAGES["too-small"], url, engine="bs4")
+    assert tiny == {"title": "Tiny", "text": "", "note": "extracted text too small"}
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        extract_html("<p>x</p>", "https://a", engine="regex")
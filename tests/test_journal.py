@@ -0,0 +1,99 @@
+"""journal: RunJournal stages, --resume, pending embeddings and stream checkpoints."""
+
+import pytest
+
+from ingestion.journal import RunJournal
+
+
+@pytest.fixture
+def journal_path(tmp_path):
+    return str(tmp_path / "runs" / "journal.sqlite")
+
+
+def test_resume_reopens_the_unfinished_run(journal_path):
+    journal = RunJournal(journal_path)
+    run_id = journal.start_run("sheet:1")
+    journal.mark("https://a", "written")
+    journal.mark("https://b", "done", "unchanged")
+    journal.mark("https://c", "embedded")
+    journal.mark("https://d", "error", "timeout")
+    journal.close()
+
+    resumed = RunJournal(journal_path)
+    assert resumed.start_run("sheet:1", resume=True) == run_id
+    assert resumed.resumed
+    assert resumed.completed_urls() == {"https://a", "https://b"}
+    assert resumed.stage_counts() == {"written": 1, "done": 1, "embedded": 1, "error": 1}
+    resumed.close()
+
+
+def test_resume_needs_same_source_and_unfinished_run(journal_path):
+    journal = RunJournal(journal_path)
+    first = journal.start_run("sheet:1")
+    other = journal.start_run("sheet:1", resume=False)
+    assert other != first
+    assert journal.start_run("file:urls.txt", resume=True) not in (first, other)
+    assert not journal.resumed
+    journal.start_run("sheet:1", resume=True)
+    assert journal.run_id == other  # the latest unfinished run
+    journal.finish()
+    assert journal.start_run("sheet:1", resume=True) == first
+    journal.close()
+
+
+def test_mark_rejects_unknown_stage(journal_path):
+    journal = RunJournal(journal_path)
+    journal.start_run("s")
+    with pytest.raises(ValueError):
+        journal.mark("https://a", "uploaded")
+    journal.close()
+
+
+def test_pending_embeddings(journal_path):
+    journal = RunJournal(journal_path)
+    journal.start_run("s")
+    journal.save_pending("https://a", ["h1", "h2"], [[0.5, -1.0], [2.0, 0.25]])
+    assert journal.load_pending(["h1", "h2", "h3"]) == {"h1": [0.5, -1.0], "h2": [2.0, 0.25]}
+    journal.clear_pending(["h1"])
+    assert list(journal.load_pending(["h1", "h2"])) == ["h2"]
+    journal.start_run("s")  # a new run doesn't see them
+    assert journal.load_pending(["h2"]) == {}
+    journal.close()
+
+
+def test_load_pending_in_chunks(journal_path):
+    journal = RunJournal(journal_path)
+    journal.start_run("s")
+    hashes = [f"h{i}" for i in range(1200)]
+    journal.save_pending("https://a", hashes, [[float(i)] for i in range(1200)])
+    loaded = journal.load_pending(hashes)
+    assert len(loaded) == 1200 and loaded["h999"] == [999.0]
+    journal.close()
+
+
+def test_stream_checkpoints(journal_path):
+    journal = RunJournal(journal_path)
+    run_id = journal.start_run("s")
+    journal.save_checkpoint("https://a/big.pdf", "sha-1", 64, "carried words", 12345)
+    journal.save_checkpoint("https://a/big.pdf", "sha-1", 96, "later words", 23456)
+    journal.close()
+
+    journal = RunJournal(journal_path)
+    assert journal.start_run("s", resume=True) == run_id
+    assert journal.load_checkpoint("https://a/big.pdf", "sha-1") == {
+        "next_page": 96, "carry": "later words", "word_count": 23456}
+    assert journal.load_checkpoint("https://a/big.pdf", "sha-2") is None  # the file changed
+    journal.clear_checkpoint("https://a/big.pdf")
+    assert journal.load_checkpoint("https://a/big.pdf", "sha-1") is None
+    journal.close()
+
+
+def test_finish_drops_pending_state(journal_path):
+    journal = RunJournal(journal_path)
+    journal.start_run("s")
+    journal.save_pending("https://a", ["h1"], [[1.0]])
+    journal.save_checkpoint("https://a", None, 32, "", 0)
+    journal.finish()
+    assert journal.load_pending(["h1"]) == {}
+    assert journal.load_checkpoint("https://a", None) is None
+    journal.close()
@@ -0,0 +1,57 @@
+"""local_source: local:// keys round-trip to paths, and read_local's unchanged checks."""
+
+import os
+
+import pytest
+
+from ingestion import local_source
+
+NAMES = ["plain.txt", "a#1.txt", "b%201.txt", "c?x=1.md", "d e.txt", "ü.md"]
+
+
+@pytest.mark.parametrize("name", NAMES)
+def test_local_url_round_trips(tmp_path, name):
+    path = tmp_path / name
+    path.write_text("hello", encoding="utf-8")
+    url = local_source.local_url(str(path))
+    assert local_source.is_local(url)
+    assert local_source.path_of(url) == str(path)
+    assert local_source.read_local(url)["text"] == "hello"
+
+
+def test_local_urls_walks_and_dedupes(tmp_path):
+    for name in NAMES + ["skip.csv", ".hidden.txt"]:
+        (tmp_path / name).write_text("x", encoding="utf-8")
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "doc.pdf").write_bytes(b"%PDF")
+    urls = local_source.local_urls(str(tmp_path))
+    assert sorted(os.path.basename(local_source.path_of(u)) for u in urls) == sorted(NAMES + ["doc.pdf"])
+
+    manifest = tmp_path / "list.txt"
+    manifest.write_text("# comment\na#1.txt\n\na#1.txt\nsub\n", encoding="utf-8")
+    assert [local_source.path_of(u) for u in local_source.local_urls(str(manifest))] == [
+        str(tmp_path / "a#1.txt"), str(tmp_path / "sub" / "doc.pdf")]
+
+
+def test_read_local_unchanged(tmp_path):
+    path = tmp_path / "a.md"
+    path.write_text("body", encoding="utf-8")
+    url = local_source.local_url(str(path))
+    first = local_source.read_local(url)
+    assert first["text"] == "body"
+    again = local_source.read_local(url, state=first["validators"])
+    assert again["not_modified"] and again["note"] == "mtime-unchanged"
+
+    os.utime(path, ns=(1, 1))  # same bytes, new mtime
+    touched = local_source.read_local(url, state=first["validators"])
+    assert touched["not_modified"] and touched["note"] == "content-unchanged"
+
+
+def test_read_local_pdf_and_empty(tmp_path):
+    pdf = tmp_path / "x.pdf"
+    pdf.write_bytes(b"%PDF-1.4")
+    got = local_source.read_local(local_source.local_url(str(pdf)))
+    assert got["path"] == str(pdf) and got["size"] == 8
+    empty = tmp_path / "e.txt"
+    empty.write_bytes(b"")
+    assert local_source.read_local(local_source.local_url(str(empty)))["text"] == ""
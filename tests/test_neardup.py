@@ -0,0 +1,90 @@
+"""neardup: SimHash fingerprints and the banded NearDupIndex."""
+
+import random
+
+import pytest
+
+from ingestion import neardup
+from ingestion.neardup import NearDupIndex
+
+TEXT = ("Applicants must file Form I-485 with the required fee and supporting evidence, "
+        "including a copy of the approval notice and two passport-style photographs.")
+
+
+def _flip(h, *bits):
+    for b in bits:
+        h ^= 1 << b
+    return h
+
+
+def test_simhash_is_stable_and_64_bit():
+    h = neardup.simhash(TEXT)
+    assert h == neardup.simhash(TEXT)
+    assert 0 <= h < 1 << 64
+    assert neardup.simhash(TEXT.upper()) == h  # shingles are lower-cased words
+
+
+def test_simhash_near_and_far_texts():
+    h = neardup.simhash(TEXT)
+    edited = neardup.simhash(TEXT.replace("two", "2"))
+    other = neardup.simhash("The visa bulletin lists priority dates for each preference category and country.")
+    assert neardup.hamming(h, edited) < neardup.hamming(h, other)
+    assert neardup.hamming(h, other) > 3
+
+
+def test_simhash_matches_unpacked_counting():
+    # the packed 16-bit lane accumulator must agree with a plain per-bit majority vote
+    rng = random.Random(5)
+    for _ in range(20):
+        text = " ".join(rng.choice(["visa", "form", "fee", "card", "green", "work", "permit"])
+                        for _ in range(rng.randint(0, 300)))
+        features = neardup._features(text)
+        expected = sum(1 << j for j in range(64) if 2 * sum(f >> j & 1 for f in features) > len(features))
+        assert neardup.simhash(text) == expected
+
+
+def test_signed_round_trip():
+    for h in (0, 1, (1 << 63) - 1, 1 << 63, (1 << 64) - 1):
+        s = neardup.to_signed(h)
+        assert -(1 << 63) <= s < 1 << 63
+        assert neardup.from_signed(s) == h
+
+
+@pytest.mark.parametrize("bits", [(), (0,), (3, 40), (1, 17, 63)])
+def test_index_matches_within_max_distance(bits):
+    # three flipped bits can hit three different bands; the fourth still agrees
+    index = NearDupIndex(3)
+    h = neardup.simhash(TEXT)
+    index.add(h, "canonical", "https://a.example/page")
+    assert index.match(_flip(h, *bits), "https://b.example/page") == ("canonical", len(bits))
+
+
+def test_index_ignores_distant_and_same_url_chunks():
+    index = NearDupIndex(3)
+    h = neardup.simhash(TEXT)
+    index.add(h, "canonical", "https://a.example/page")
+    assert index.match(_flip(h, 0, 20, 40, 60), "https://b.example/page") is None
+    # the same page's own chunks are edits, never duplicates
+    assert index.match(h, "https://a.example/page") is None
+
+
+def test_index_prefers_the_closest_match():
+    index = NearDupIndex(3)
+    h = neardup.simhash(TEXT)
+    index.add_many([(_flip(h, 1, 2), "far", "u1"), (_flip(h, 5), "near", "u2")])
+    assert len(index) == 2
+    assert index.match(h, "u3") == ("near", 1)
+    assert index.match(h, "u2") == ("far", 2)
+
+
+def test_match_does_not_add():
+    index = NearDupIndex(3)
+    h = neardup.simhash(TEXT)
+    assert index.match(h, "u1") is None
+    assert len(index) == 0
+    assert index.match(h, "u2") is None
+
+
+def test_max_distance_is_bounded_by_bands():
+    with pytest.raises(ValueError):
+        NearDupIndex(neardup.BANDS)
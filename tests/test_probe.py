@@ -0,0 +1,43 @@
+"""probe: probe dicts from HEAD responses and the persisted ProbeCache."""
+
+import json
+from types import SimpleNamespace
+
+from ingestion.probe import ProbeCache, probe_from_response
+
+
+def _resp(status, url="https://a.example/doc", **headers):
+    return SimpleNamespace(status_code=status, url=url, headers=headers)
+
+
+def test_probe_from_response():
+    probe = probe_from_response("https://a.example/doc", _resp(
+        200, **{"Content-Type": "Application/PDF", "Content-Length": "1024", "ETag": '"x"'}))
+    assert probe["ok"] and probe["content_type"] == "application/pdf"
+    assert probe["content_length"] == 1024 and probe["etag"] == '"x"'
+    assert not probe_from_response("u", _resp(405))["ok"]
+    failed = probe_from_response("u", None)
+    assert not failed["ok"] and failed["status"] is None and failed["content_type"] == ""
+
+
+def test_save_skips_probes_without_content_type(tmp_path):
+    path = str(tmp_path / "probes.json")
+    cache = ProbeCache(path)
+    cache.put("https://a.example/pdf", probe_from_response("https://a.example/pdf", _resp(
+        200, **{"Content-Type": "application/pdf"})))
+    cache.put("https://a.example/unchanged", probe_from_response("https://a.example/unchanged", _resp(304)))
+    cache.put("https://a.example/blocked", probe_from_response("https://a.example/blocked", _resp(403)))
+    cache.save()
+    with open(path) as f:
+        assert list(json.load(f)) == ["https://a.example/pdf"]
+
+    reloaded = ProbeCache(path)
+    assert reloaded.get("https://a.example/pdf")["content_type"] == "application/pdf"
+    assert reloaded.get("https://a.example/pdf")["status"] is None  # per-run, never persisted
+    assert reloaded.get("https://a.example/unchanged") is None
+
+
+def test_expired_probes_are_dropped(tmp_path):
+    path = tmp_path / "probes.json"
+    path.write_text(json.dumps({"u": {"ok": True, "content_type": "text/html", "probed_at": 0}}))
+    assert ProbeCache(str(path)).get("u") is None
@@ -0,0 +1,193 @@
+"""source_snapshot: the run-to-run diff, sheet parsing, and prune_removed against in-memory tables."""
+
+import re
+
+from ingestion import source_snapshot
+
+_DELETE = re.compile(r"DELETE FROM (\w+) WHERE (.+?)(?: RETURNING (.+))?$", re.S)
+
+
+class FakeCursor:
+    """Runs the DELETE ... WHERE col = ANY(%s) [OR ...] [AND col IS NOT NULL] statements prune_removed issues."""
+
+    def __init__(self, tables):
+        self.tables = tables
+        self._result = []
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=()):
+        table, where, returning = _DELETE.match(" ".join(sql.split())).groups()
+        where, _, extra = where.partition(" AND ")
+        values = iter(params)
+        tests = [(clause.split(" = ")[0], set(next(values))) for clause in where.split(" OR ")]
+        not_null = extra.split(" IS NOT NULL")[0] if extra else None
+
+        def hit(row):
+            return any(row[col] in allowed for col, allowed in tests) and (not not_null or row[not_null] is not None)
+
+        gone = [row for row in self.tables[table] if hit(row)]
+        self.tables[table] = [row for row in self.tables[table] if not hit(row)]
+        cols = [c.strip() for c in returning.split(",")] if returning else []
+        self._result = [tuple(row[c] for c in cols) for row in gone]
+        self.rowcount = len(gone)
+
+    def fetchall(self):
+        return self._result
+
+
+class FakeConn:
+    def __init__(self, **tables):
+        self.tables = {name: list(tables.get(name, [])) for name in (
+            "documents", "document_duplicates", "document_chunk_sources", "documents_large", "crawl_state",
+            "source_snapshot")}
+        self.commits = 0
+
+    def cursor(self):
+        return FakeCursor(self.tables)
+
+    def commit(self):
+        self.commits += 1
+
+
+def _row(url, modified=None, priority=None):
+    return {"url": url, "modified": modified, "priority": priority}
+
+
+def test_diff_groups_rows():
+    snapshot = {
+        "u-same": {"modified": "2024-01-01", "priority": None, "removed": False},
+        "u-edit": {"modified": "2024-01-01", "priority": None, "removed": False},
+        "u-back": {"modified": None, "priority": None, "removed": True},
+        "u-gone": {"modified": None, "priority": None, "removed": False},
+        "u-gone-before": {"modified": None, "priority": None, "removed": True},
+    }
+    rows = [_row("u-new"), _row("u-same", "2024-01-01"), _row("u-edit", "2024-02-01"), _row("u-back")]
+    diff = source_snapshot.diff(rows, snapshot)
+    assert [r["url"] for r in diff["new"]] == ["u-new", "u-back"]
+    assert [r["url"] for r in diff["changed"]] == ["u-edit"]
+    assert [r["url"] for r in diff["unchanged"]] == ["u-same"]
+    assert diff["removed"] == ["u-gone"]
+
+
+def test_diff_treats_blank_modified_as_none():
+    snapshot = {"u": {"modified": None, "priority": None, "removed": False}}
+    assert [r["url"] for r in source_snapshot.diff([_row("u", "")], snapshot)["unchanged"]] == ["u"]
+
+
+def test_diff_orders_by_priority():
+    rows = [_row("none"), _row("p2", priority="P2"), _row("p1", priority="1"), _row("p10", priority="p 10")]
+    assert [r["url"] for r in source_snapshot.diff(rows, {})["new"]] == ["p1", "p2", "p10", "none"]
+
+
+def test_rows_from_values_with_header():
+    values = [["URL", "Title", "Last Modified", "Priority"],
+              ["https://a", "A", "2024-01-01", "1"],
+              ["https://b", "B", "", ""],
+              ["https://a", "dup", "2025", "9"],
+              [""],
+              []]
+    assert source_snapshot.rows_from_values(values) == [_row("https://a", "2024-01-01", "1"), _row("https://b")]
+
+
+def test_rows_from_values_without_header():
+    assert source_snapshot.rows_from_values([[" https://a "], ["https://b", "x"]]) == [_row("https://a"),
+                                                                                       _row("https://b")]
+    assert source_snapshot.rows_from_values([]) == []
+
+
+def _doc(url, chunk_hash):
+    return {"source_url": url, "chunk_hash": chunk_hash}
+
+
+def _crawled(*urls):
+    return [{"source_url": url} for url in urls]
+
+
+def test_prune_reingests_urls_that_skipped_an_exact_duplicate():
+    # "b" listed the same chunk as "a" after it was stored, so only "a" has the documents row
+    conn = FakeConn(
+        documents=[_doc("a", "h1"), _doc("a", "h2"), _doc("b", "h3")],
+        document_chunk_sources=[{"chunk_hash": "h1", "source_url": "b"}],
+        crawl_state=_crawled("a", "b", "c"),
+        source_snapshot=[{"source_url": "a", "removed_at": "yesterday"}],
+    )
+    counts, cleared = source_snapshot.prune_removed(conn, ["a"])
+    assert counts == {"urls": 1, "chunks": 2, "links": 0, "reingest": 1}
+    assert cleared == ["a", "b"]
+    assert conn.tables["documents"] == [_doc("b", "h3")]
+    assert conn.tables["document_chunk_sources"] == []
+    assert [r["source_url"] for r in conn.tables["crawl_state"]] == ["c"]
+    assert conn.tables["source_snapshot"] == []
+    assert conn.commits == 1
+
+
+def test_prune_reingests_urls_linked_to_a_deleted_chunk():
+    conn = FakeConn(
+        documents=[_doc("a", "h1")],
+        document_duplicates=[{"chunk_hash": "n1", "canonical_chunk_hash": "h1", "source_url": "b"},
+                             {"chunk_hash": "n2", "canonical_chunk_hash": "x9", "source_url": "a"}],
+        crawl_state=_crawled("a", "b", "c"),
+    )
+    counts, cleared = source_snapshot.prune_removed(conn, ["a"])
+    assert counts["links"] == 2 and counts["reingest"] == 1
+    assert cleared == ["a", "b"]
+    assert [r["source_url"] for r in conn.tables["crawl_state"]] == ["c"]
+
+
+def test_prune_reingests_urls_that_skipped_a_removed_urls_link():
+    # "a" linked n2 to another chunk; "c" later skipped n2 because the link made it count as stored
+    conn = FakeConn(
+        document_duplicates=[{"chunk_hash": "n2", "canonical_chunk_hash": "x9", "source_url": "a"}],
+        document_chunk_sources=[{"chunk_hash": "n2", "source_url": "c"}, {"chunk_hash": "zz", "source_url": "d"}],
+        crawl_state=_crawled("a", "c", "d"),
+    )
+    source_snapshot.prune_removed(conn, ["a"])
+    assert [r["source_url"] for r in conn.tables["crawl_state"]] == ["d"]
+    assert conn.tables["document_chunk_sources"] == [{"chunk_hash": "zz", "source_url": "d"}]
+
+
+def test_prune_leaves_other_urls_alone():
+    conn = FakeConn(
+        documents=[_doc("a", "h1"), _doc("b", "h2")],
+        document_chunk_sources=[{"chunk_hash": "h2", "source_url": "c"}],
+        crawl_state=_crawled("a", "b", "c"),
+    )
+    counts, cleared = source_snapshot.prune_removed(conn, ["a"])
+    assert counts["reingest"] == 0 and cleared == ["a"]
+    assert [r["source_url"] for r in conn.tables["crawl_state"]] == ["b", "c"]
+
+
+def test_prune_nothing():
+    conn = FakeConn()
+    assert source_snapshot.prune_removed(conn, []) == ({"urls": 0}, [])
+    assert conn.commits == 0
+
+
+def test_pruned_urls_that_return_are_fully_reingested():
+    # what pipeline.plan_urls does with the result: forget the cleared URLs' in-memory crawl state
+    conn = FakeConn(
+        documents=[_doc("a", "h1")],
+        document_chunk_sources=[{"chunk_hash": "h1", "source_url": "b"}],
+        crawl_state=_crawled("a", "b", "c"),
+    )
+    states = {url: {"etag": f'"{url}"', "last_modified": "Mon, 01 Jan 2024 00:00:00 GMT", "content_hash": "old"}
+              for url in ("a", "b", "c")}
+    _, cleared = source_snapshot.prune_removed(conn, ["a"])
+    for url in cleared:
+        states.pop(url, None)
+
+    # "b" is still listed and unchanged; "a" comes back on the sheet in the same run
+    snapshot = {"b": {"modified": None, "priority": None, "removed": False},
+                "c": {"modified": None, "priority": None, "removed": False}}
+    diff = source_snapshot.diff([_row("a"), _row("b"), _row("c")], snapshot)
+    assert [r["url"] for r in diff["new"]] == ["a"]
+    assert [r["url"] for r in source_snapshot.unchanged_to_crawl(diff["unchanged"], states)] == ["b"]
+    # no validators or content hash left: a full fetch whose content can't match the old hash
+    assert states.get("a") is None and states.get("b") is None
+    assert "c" in states
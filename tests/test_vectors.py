@@ -0,0 +1,72 @@
+"""vectors: pgvector binary encoding and the COPY BINARY payload."""
+
+import math
+import struct
+from array import array
+
+import pytest
+
+from ingestion import vectors
+
+
+def test_pack_float32_is_big_endian():
+    values = [1.0, -2.5, 0.1]
+    assert vectors.pack_float32(values) == struct.pack(">3f", *values)
+
+
+def test_pack_float32_leaves_callers_array_alone():
+    arr = array("f", [1.0, 2.0, 3.0])
+    packed = vectors.pack_float32(arr)
+    assert arr.tolist() == [1.0, 2.0, 3.0]
+    assert packed == vectors.pack_float32([1.0, 2.0, 3.0])
+
+
+def test_vector_round_trip():
+    values = [0.25, -1.0, 3.5, 0.0]
+    buf = vectors.encode_vector(values)
+    assert buf[:4] == struct.pack(">HH", 4, 0)
+    assert vectors.decode_vector(buf) == values
+
+
+def test_binary_copy_buffer_layout():
+    rows = [("title", [1.0, 2.0], None, 7), ("t2", array("f", [0.5]), b"raw", "x")]
+    data = vectors.binary_copy_buffer(rows).read()
+    assert data.startswith(vectors.PGCOPY_HEADER)
+    assert data.endswith(vectors.PGCOPY_TRAILER)
+    pos, decoded = len(vectors.PGCOPY_HEADER), []
+    while True:
+        (fields,) = struct.unpack_from(">h", data, pos)
+        pos += 2
+        if fields == -1:
+            break
+        row = []
+        for _ in range(fields):
+            (length,) = struct.unpack_from(">i", data, pos)
+            pos += 4
+            row.append(None if length == -1 else data[pos:pos + length])
+            pos += max(length, 0)
+        decoded.append(row)
+    assert pos == len(data)
+    assert decoded[0] == [b"title", vectors.encode_vector([1.0, 2.0]), None, b"7"]
+    assert decoded[1] == [b"t2", vectors.encode_vector([0.5]), b"raw", b"x"]
+
+
+def test_copy_rows_sends_binary_copy():
+    class Cursor:
+        def copy_expert(self, sql, buf):
+            self.sql, self.data = sql, buf.read()
+
+    cur = Cursor()
+    vectors.copy_rows(cur, "documents_staging", ("content", "embedding"), [("a", [1.0])])
+    assert cur.sql == "COPY documents_staging (content, embedding) FROM STDIN WITH (FORMAT BINARY)"
+    assert cur.data == vectors.binary_copy_buffer([("a", [1.0])]).read()
+
+
+def test_shorten_renormalizes_the_prefix():
+    short = vectors.shorten([3.0, 4.0, 12.0], 2)
+    assert short == pytest.approx([0.6, 0.8])
+    assert math.sqrt(sum(v * v for v in short)) == pytest.approx(1.0)
+
+
+def test_shorten_zero_vector():
+    assert vectors.shorten([0.0, 0.0, 1.0], 2) == [0.0, 0.0]